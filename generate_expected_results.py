@@ -4,17 +4,18 @@
 from __future__ import annotations
 
 import argparse
-import itertools
 import json
 import subprocess
 import sys
 from pathlib import Path
 from typing import Any, Iterable
 
-# NOTE: basic loads EXPECTED_RESULTS from a file so this whole script will fail
-# if expected_results.json doesn't already exist
+# NOTE: basic doesn't load EXPECTED_RESULTS until it's used, and we don't use it here,
+# so this script works even if expected_results.json doesn't exist yet
 from test_framework import basic, regalloc
 from test_framework.basic import ROOT_DIR, TEST_DIR
+from test_framework.changes import get_changed_files
+from test_framework.manifest import HELPER, MANIFEST_NAME, build_manifest
 
 results: dict[str, dict[str, Any]] = {}
 
@@ -53,60 +54,37 @@ def main() -> None:
 
     args = parser.parse_args()
 
-    all_valid_progs = itertools.chain(
-        TEST_DIR.glob("chapter_*/valid/**/*.c"),
-        TEST_DIR.glob("chapter_19/constant_folding/**/*.c"),
-        TEST_DIR.glob("chapter_19/unreachable_code_elimination/**/*.c"),
-        TEST_DIR.glob("chapter_19/copy_propagation/**/*.c"),
-        TEST_DIR.glob("chapter_19/dead_store_elimination/**/*.c"),
-        TEST_DIR.glob("chapter_19/whole_pipeline/**/*.c"),
-        TEST_DIR.glob("chapter_20/all_types/**/*.c"),
-        TEST_DIR.glob("chapter_20/int_only/**/*.c"),
-    )
+    # re-index the test programs (rather than trusting test_manifest.json, which may be stale)
+    # and save the new manifest for the test runner. We do this before anything loads
+    # basic.MANIFEST, so get_libs, get_dependencies, etc. use the new manifest.
+    manifest = build_manifest(ROOT_DIR)
+    with open(ROOT_DIR / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        f.write(manifest.to_json())
+
+    # every program that runs, i.e. everything except invalid programs and helper libraries
+    all_valid_progs = [
+        p.path
+        for p in manifest.programs
+        if p.role != HELPER and not p.kind.startswith("invalid_")
+    ]
 
     if args.all:
         progs: Iterable[Path] = all_valid_progs
     else:
         baseline = args.since_commit or "HEAD"
-        list_changed_files = subprocess.run(
-            f"git diff {baseline} --name-only -- tests/chapter_*",
-            shell=True,
-            text=True,
-            check=True,
-            capture_output=True,
-        )
-        # also get untracked files
-        list_new_files = subprocess.run(
-            "git ls-files -o -- tests/chapter_*",
-            shell=True,
-            text=True,
-            check=True,
-            capture_output=True,
-        )
-        changed_files = (
-            list_changed_files.stdout.split() + list_new_files.stdout.split()
-        )
+        changed_files = get_changed_files(baseline)
 
-        # include each file from all_valid progs if:
-        # - it changed
-        # - it's a client and the library changed, or vice versa
-        # - it uses a library/wrapper that changed
-        # - a .h file in the same directory changed (use this as hacky shorthand for whether header for this particular file changed)
+        # include each file from all_valid progs if it depends on any changed file:
+        # - the file itself
+        # - its client or library
+        # - a library/wrapper it uses
+        # - a header it includes
         progs = []
         for p in all_valid_progs:
-            rel_path = p.relative_to(ROOT_DIR)
-            if (
-                str(rel_path) in changed_files
-                or str(rel_path).replace(".c", "_client.c") in changed_files
-                or str(rel_path).replace("_client.c", ".c") in changed_files
-                or (needs_wrapper(p) and regalloc.WRAPPER_SCRIPT in changed_files)
-                or any(lib in changed_files for lib in basic.get_libs(p))
-                or any(
-                    h
-                    for h in changed_files
-                    if Path(h).suffix == ".h" and Path(h).parent == rel_path.parent
-                )
-            ):
+            deps = basic.get_dependencies(p)
+            if needs_wrapper(p):
+                deps.append(regalloc.WRAPPER_SCRIPT)
+            if any(dep.resolve() in changed_files for dep in deps):
                 progs.append(p)
 
         # load the json file from that commit to use as baseline
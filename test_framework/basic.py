@@ -3,14 +3,60 @@
 from __future__ import annotations
 
 import difflib
+import hashlib
 import json
+import os
 import platform
+import re
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 import unittest
 from enum import Flag, auto, unique
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Sequence, Type
+from typing import (
+    AbstractSet,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+from .batch import BATCH_OPTION, run_batch
+from .cache import ResultCache
+from .lazy import Lazy, LazyMapping, LazySet, load_json
+from .manifest import (
+    CLIENT,
+    HELPER,
+    LIBRARY,
+    TestManifest,
+    TestProgram,
+    load_manifest,
+)
+from .parallel import RecordingResult
+from .parser import parse, parse_cache
+from .parser.metrics import FunctionMetrics, function_metrics
+from .server import CompilerServerPool
+from .timing import (
+    COMPILE,
+    LINK,
+    RUN,
+    LimitExceeded,
+    Phase,
+    ResourceLimits,
+    record_phase,
+    run_phase,
+    timed_out,
+)
 
 # Constants + per-test info from configuration files
 # TODO should this be in a separate module maybe?
@@ -18,32 +64,34 @@ from typing import Any, Callable, Dict, List, Optional, Sequence, Type
 ROOT_DIR = Path(__file__).parent.parent  # ROOT of test repo
 TEST_DIR = ROOT_DIR / "tests"  # directory containing all test programs
 IS_OSX = platform.system().lower() == "darwin"
-EXPECTED_RESULTS: dict[str, Any]
 
-with open(ROOT_DIR / "expected_results.json", "r", encoding="utf-8") as f:
-    EXPECTED_RESULTS = json.load(f)
+# These are loaded the first time they're used, not when this module is imported (see lazy.py)
+EXPECTED_RESULTS: Mapping[str, Any] = LazyMapping(
+    lambda: load_json(ROOT_DIR / "expected_results.json")
+)
+
+
+def load_test_info(section: str) -> Any:
+    return load_json(ROOT_DIR / "test_properties.json")[section]
 
-EXTRA_CREDIT_PROGRAMS: dict[str, List[str]]
-REQUIRES_MATHLIB: List[str]
 
-# TODO Consider handling C and assembly dependencies uniformly
-# (but remember that assembly files have different Linux/OS X variants)
-DEPENDENCIES: Dict[str, List[str]]
-ASSEMBLY_DEPENDENCIES: Dict[str, List[str]]
-with open(ROOT_DIR / "test_properties.json", "r", encoding="utf-8") as f:
-    test_info = json.load(f)
-    EXTRA_CREDIT_PROGRAMS = test_info["extra_credit_tests"]
-    REQUIRES_MATHLIB = test_info["requires_mathlib"]
-    ASSEMBLY_DEPENDENCIES = test_info["assembly_libs"]
-    DEPENDENCIES = test_info["libs"]
+EXTRA_CREDIT_PROGRAMS: Mapping[str, List[str]] = LazyMapping(
+    lambda: load_test_info("extra_credit_tests")
+)
+
+# index of every test program, including which libraries each one needs
+# (see manifest.py)
+MANIFEST: Lazy[TestManifest] = Lazy(lambda: load_manifest(ROOT_DIR.resolve()))
 
 MAC_SUFFIX = "_osx.s"
 LINUX_SUFFIX = "_linux.s"
-ASSEMBLY_LIBS = set(
-    Path(platform_specific_lib).name
-    for libs in ASSEMBLY_DEPENDENCIES.values()
-    for lib in libs
-    for platform_specific_lib in [lib + MAC_SUFFIX, lib + LINUX_SUFFIX]
+ASSEMBLY_LIBS: AbstractSet[str] = LazySet(
+    lambda: set(
+        Path(platform_specific_lib).name
+        for program in MANIFEST.value.programs
+        for lib in program.assembly_libs
+        for platform_specific_lib in [lib + MAC_SUFFIX, lib + LINUX_SUFFIX]
+    )
 )
 
 # main TestChapter class + related utilities
@@ -58,7 +106,7 @@ def get_platform_suffix() -> str:
 
 
 def get_props_key(source_file: Path) -> str:
-    """key to use in EXPECTED_RESULTS, REQUIRES_MATHLIB, EXTRA_CREDIT_PROGRAMS
+    """key to use in EXPECTED_RESULTS and EXTRA_CREDIT_PROGRAMS
     If this ends with _client.c, use corresponding lib as props key
     """
     if source_file.stem.endswith("_client"):
@@ -66,42 +114,176 @@ def get_props_key(source_file: Path) -> str:
     return str(source_file.relative_to(TEST_DIR))
 
 
+def get_manifest_entry(prog: Path) -> Optional[TestProgram]:
+    """Look up a file in MANIFEST (None if it's not a C test program or helper library)"""
+    return MANIFEST.value.get(prog.relative_to(TEST_DIR).as_posix())
+
+
 def needs_mathlib(prog: Path) -> bool:
-    key = get_props_key(prog)
-    return key in REQUIRES_MATHLIB and not IS_OSX
+    entry = get_manifest_entry(prog)
+    return entry is not None and entry.requires_mathlib and not IS_OSX
 
 
 def get_libs(prog: Path) -> List[Path]:
     """Get extra libraries this test program depends on (aside from lib/client pairs)"""
-    props_key = get_props_key(prog)
-    libs = []
-    if props_key in ASSEMBLY_DEPENDENCIES:
-        for asm_dep in ASSEMBLY_DEPENDENCIES[props_key]:
-            asm_filename = asm_dep + get_platform_suffix()
-            asm_path = TEST_DIR / asm_filename
-            libs.append(asm_path)
-    if props_key in DEPENDENCIES:
-        lib_filenames = DEPENDENCIES[props_key]
-        for l in lib_filenames:
-            lib_path = TEST_DIR / l
-            libs.append(lib_path)
+    entry = get_manifest_entry(prog)
+    if entry is None:
+        return []
+    libs = [TEST_DIR / (lib + get_platform_suffix()) for lib in entry.assembly_libs]
+    libs.extend(TEST_DIR / lib for lib in entry.libs)
     return libs
 
 
+# matches #include "foo.h" (but not #include <foo.h>)
+LOCAL_INCLUDE = re.compile(r'^\s*#\s*include\s*"([^"]+)"', flags=re.MULTILINE)
+
+
+def get_headers(source_file: Path) -> List[Path]:
+    """Get all the local header files that a source file includes, directly or indirectly"""
+    headers: List[Path] = []
+    to_visit = [source_file]
+    while to_visit:
+        current = to_visit.pop()
+        text = current.read_text(encoding="utf-8")
+        for included in LOCAL_INCLUDE.findall(text):
+            # normalize paths like chapter_18/valid/libraries/../util.h
+            header = Path(os.path.normpath(current.parent / included))
+            if header not in headers:
+                headers.append(header)
+                to_visit.append(header)
+    return headers
+
+
+def get_dependencies(program: Path) -> List[Path]:
+    """Get all the files that a test program's behavior depends on.
+
+    This includes the program itself, the other half of a library/client pair,
+    any extra libraries from test_properties.json, and all local headers these files include
+    (all recorded in MANIFEST).
+    (It doesn't include the wrapper script for register allocation tests; see TestRegAlloc.get_dependencies.)
+    """
+    entry = get_manifest_entry(program)
+    if entry is None:
+        return [program]
+    return (
+        [program]
+        + [TEST_DIR / dep for dep in entry.dependencies]
+        + get_libs(program)
+    )
+
+
+def scratch_path(source_file: Path, scratch_dir: Path) -> Path:
+    """Get the path where a copy of source_file goes in a scratch directory (see TestChapter.scratch_path)"""
+    return scratch_dir / source_file.relative_to(ROOT_DIR)
+
+
+def copy_to_scratch(source_file: Path, scratch_dir: Path) -> Path:
+    """Copy a source file, and any local headers it includes, into a scratch directory
+
+    Returns:
+        absolute path to the copy of source_file
+    """
+    for f in [source_file] + get_headers(source_file):
+        dest = scratch_path(f, scratch_dir)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(f, dest)
+    return scratch_path(source_file, scratch_dir)
+
+
 def print_stderr(proc: subprocess.CompletedProcess[str]) -> None:
     """Print out stderr of CompletedProcess if it's not empty. Intended to print assembler/linker warnings"""
     if proc.stderr:
         print(proc.stderr)
 
 
+GCC_COMPILE_OPTIONS = ["-D", "SUPPRESS_WARNINGS"]
+
+# default limit on how long each test program can run, in seconds
+DEFAULT_RUN_TIMEOUT = 10.0
+
+
+class HelperObjects:
+    """Compile each helper file (client programs, assembly and C libraries) only once per test run.
+
+    Most tests link the file under test against the same few helpers (e.g. almost every
+    chapter 20 test links against wrapper_linux.s and often util.c), so rather than passing
+    the helpers' source code to gcc on every test, we compile each one to an object file
+    the first time it's needed and link that object file into every test that uses it.
+    Objects live in a temporary directory that's deleted when the test run exits.
+
+    Objects are keyed on each helper's path and the options we compile it with;
+    assembly helpers are already platform-specific (see get_libs), so we don't need
+    the platform in the key.
+    """
+
+    def __init__(self) -> None:
+        self.objects: Dict[Tuple[Path, Tuple[str, ...]], Path] = {}
+        # protects self.objects, self.key_locks, and self.tmpdir
+        self.lock = threading.Lock()
+        # one lock per helper, so we don't compile the same helper in two threads at once
+        self.key_locks: Dict[Tuple[Path, Tuple[str, ...]], threading.Lock] = {}
+        self.tmpdir: Optional[tempfile.TemporaryDirectory[str]] = None
+
+    def get(self, source_file: Path, options: List[str]) -> Path:
+        """Get the object file for a helper, compiling it first if we haven't already
+
+        Args:
+            source_file: absolute path to a C or assembly file
+            options: options to compile it with
+
+        Returns:
+            the path to the object file
+        """
+        key = (source_file, tuple(options))
+        with self.lock:
+            if key in self.objects:
+                return self.objects[key]
+            if self.tmpdir is None:
+                self.tmpdir = tempfile.TemporaryDirectory(prefix="test_compiler_objs_")
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+            # name each object after its key, so helpers with the same name
+            # (or the same helper with different options) never share an object file
+            digest = hashlib.sha256(repr(key).encode()).hexdigest()[:16]
+            obj = Path(self.tmpdir.name) / f"{source_file.stem}_{digest}.o"
+
+        with key_lock:
+            with self.lock:
+                if key in self.objects:
+                    # another thread compiled it while we were waiting
+                    return self.objects[key]
+            try:
+                result = subprocess.run(
+                    ["gcc"] + options + ["-c", source_file, "-o", obj],
+                    check=True,
+                    text=True,
+                    capture_output=True,
+                )
+                print_stderr(result)
+            except subprocess.CalledProcessError as err:
+                raise RuntimeError(err.stderr) from err
+            with self.lock:
+                self.objects[key] = obj
+        return obj
+
+
+HELPER_OBJECTS = HelperObjects()
+
+
 def gcc_compile_and_run(
-    source_files: List[Path], options: List[str]
+    source_files: List[Path],
+    options: List[str],
+    phases: Optional[List[Phase]] = None,
+    timeout: Optional[float] = DEFAULT_RUN_TIMEOUT,
 ) -> subprocess.CompletedProcess[str]:
     """Compile input files using 'gcc' command and run the resulting executable
 
     Args:
-        source_files: list of input files - could be C, assembly, or object files
+        source_files: list of input files - could be C, assembly, or object files.
+            The first file is the one under test; the rest are helpers that don't
+            change between tests, so we compile each of them once (see HelperObjects)
         options: command-line options
+        phases (optional): list to record the link and run phases in (see timing.py)
+        timeout (optional): how long the executable can run, in seconds
 
     Returns:
         a CompletedProcess object that captures the executable's return code and output
@@ -112,11 +294,20 @@ def gcc_compile_and_run(
 
     # compile it
     try:
-        result = subprocess.run(
-            ["gcc", "-D", "SUPPRESS_WARNINGS"] + source_files + options + ["-o", exe],
+        helpers = [
+            HELPER_OBJECTS.get(f, GCC_COMPILE_OPTIONS) if f.suffix in [".c", ".s"] else f
+            for f in source_files[1:]
+        ]
+        result = run_phase(
+            LINK,
+            ["gcc"]
+            + GCC_COMPILE_OPTIONS
+            + [source_files[0]]
+            + helpers
+            + options
+            + ["-o", exe],
+            phases,
             check=True,
-            text=True,
-            capture_output=True,
         )
         # print any warnings even if it succeeded
         print_stderr(result)
@@ -126,9 +317,7 @@ def gcc_compile_and_run(
         raise RuntimeError(err.stderr) from err
 
     # run it
-    return subprocess.run(
-        [exe], check=False, text=True, capture_output=True, timeout=10.0
-    )
+    return run_phase(RUN, [exe], phases, check=False, timeout=timeout)
 
 
 def replace_stem(path: Path, new_stem: str) -> Path:
@@ -228,11 +417,238 @@ class TestChapter(unittest.TestCase):
     # expected compiler exit codes when rejecting invalid programs (None if we accept any non-zero exit code)
     error_codes: list[int]
 
+    # Per-test temporary directory. We copy each program into this directory before compiling it,
+    # so everything the compiler produces ends up here instead of next to the original source file.
+    # Tests therefore don't clobber each other's output files, and the test directory itself
+    # can be read-only.
+    scratch_dir: Path
+
+    # Each subprocess this test ran (compiling, linking, running the program) and how long it took,
+    # for reporting (see timing.py). Empty if we reused a cached result.
+    phases: List[Phase]
+
+    # True if we reused this test's result from result_cache instead of running it
+    cached: bool = False
+
+    # Cache of passing results from earlier test runs; None if caching is disabled.
+    # Shared by every test class.
+    result_cache: Optional[ResultCache] = None
+
+    # Long-lived compiler processes to send compilation requests to,
+    # or None if we should start a new process for each compilation (see server.py).
+    # Shared by every test class.
+    compiler_server: Optional[CompilerServerPool] = None
+
+    # If this is set, only run tests whose programs depend on these files
+    # (resolved absolute paths, see changes.py). Shared by every test class.
+    changed_files: Optional[AbstractSet[Path]] = None
+
+    # If this is set, the IDs of the tests we'll actually run, after filtering
+    # the suite (e.g. by --changed-only or --shard); batch mode only compiles
+    # these tests' programs. Shared by every test class.
+    selected_tests: Optional[AbstractSet[str]] = None
+
+    # True if we should try to compile all of this class's programs with a single
+    # compiler invocation when testing an intermediate stage (see batch.py)
+    use_batch: bool = False
+
+    # Results of batch compilation, keyed by absolute path to the source file
+    batch_results: Dict[Path, subprocess.CompletedProcess[str]]
+
+    # Scratch directories where we staged and batch-compiled each test's program,
+    # keyed by test method name. Each test uses its directory as its scratch_dir.
+    batch_dirs: Dict[str, Path]
+
+    # Limits on how long the compiler under test and each test program can run, in seconds
+    # (None means no limit), and on the resources the compiler can use. Shared by every test class.
+    compile_timeout: Optional[float] = None
+    run_timeout: Optional[float] = DEFAULT_RUN_TIMEOUT
+    compiler_limits: Optional[ResourceLimits] = None
+
+    # True if passing run-stage tests should record metrics about the assembly
+    # the compiler under test generated (see parser/metrics.py)
+    collect_asm_metrics: bool = False
+
+    # Metrics for each function in the program under test, keyed by function name;
+    # None if we didn't collect them
+    asm_metrics: Optional[Dict[str, FunctionMetrics]]
+
+    def run(
+        self, result: Optional[unittest.TestResult] = None
+    ) -> Optional[unittest.TestResult]:
+        """Run the test, or reuse its result from an earlier run if nothing has changed."""
+        self.phases = []
+        self.cached = False
+        self.asm_metrics = None
+        if self.result_cache is None:
+            return super().run(result)
+
+        if result is None:
+            result = self.defaultTestResult()
+
+        key = self.cache_key()
+        if self.result_cache.lookup(key):
+            # report success without running anything
+            self.cached = True
+            result.startTest(self)
+            result.addSuccess(self)
+            result.stopTest(self)
+            return result
+
+        # record the outcome so we can tell whether the test passed, then report it
+        recorded = RecordingResult()
+        super().run(recorded)
+        if recorded.wasSuccessful() and not recorded.skipped_any():
+            self.result_cache.record(key, self.id())
+        recorded.replay(self, result)
+        return result
+
+    def get_program(self) -> Path:
+        """Get the absolute path to the program this test method compiles.
+
+        We name each test method after the path to its test program, relative to test_dir,
+        (e.g. valid/foo.c becomes test_valid/foo), so we can work backwards from the name.
+        """
+        return self.program_for(self._testMethodName)
+
+    @classmethod
+    def program_for(cls, test_method_name: str) -> Path:
+        """Get the absolute path to the program that the named test method compiles"""
+        # don't use removeprefix to support Python 3.8
+        method_name = test_method_name[len("test_") :]
+        return cls.test_dir / f"{method_name}.c"
+
+    @classmethod
+    def get_dependencies(cls, program: Path) -> List[Path]:
+        """Get all the files that a test program's behavior depends on (see get_dependencies)"""
+        return get_dependencies(program)
+
+    @classmethod
+    def is_affected(cls, program: Path) -> bool:
+        """Check whether a test program depends on changed_files.
+        (Always true if we're not filtering tests by what's changed.)"""
+        if cls.changed_files is None:
+            return True
+        # (this doesn't copy the set if it's already a frozenset, as the runner makes it)
+        changed: AbstractSet[Path] = frozenset(cls.changed_files)
+        return any(dep.resolve() in changed for dep in cls.get_dependencies(program))
+
+    def cache_key(self) -> str:
+        """Compute the key for this test in result_cache"""
+        assert self.result_cache is not None  # placate mypy
+        program = self.get_program()
+        expected = EXPECTED_RESULTS.get(get_props_key(program))
+        parts = [
+            self.id(),
+            str(self.exit_stage),
+            json.dumps([str(o) for o in self.options]),
+            # optimization and register allocation tests don't set error_codes
+            json.dumps(getattr(self, "error_codes", None)),
+            json.dumps(expected, sort_keys=True),
+        ]
+        return self.result_cache.key(parts, self.get_dependencies(program))
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """If batch mode is enabled, compile every test program in this class at once"""
+        super().setUpClass()
+        cls.batch_results = {}
+        cls.batch_dirs = {}
+        if not cls.use_batch or cls.exit_stage is None:
+            return
+
+        programs = []
+        staged_files = []
+        selected: Optional[AbstractSet[str]] = (
+            None if cls.selected_tests is None else frozenset(cls.selected_tests)
+        )
+        for test_name in unittest.defaultTestLoader.getTestCaseNames(cls):
+            # same as the test's id()
+            test_id = f"{cls.__module__}.{cls.__qualname__}.{test_name}"
+            if selected is not None and test_id not in selected:
+                # we won't run this test (e.g. it's in another shard)
+                continue
+            program = cls.program_for(test_name)
+            if not cls.is_affected(program):
+                # we won't run this test
+                continue
+            scratch_dir = Path(tempfile.mkdtemp(prefix="test_compiler_"))
+            cls.batch_dirs[test_name] = scratch_dir
+            programs.append(program)
+            staged_files.append(copy_to_scratch(program, scratch_dir))
+
+        args = [cls.cc] + cls.options + [f"--{cls.exit_stage}", BATCH_OPTION]
+        results = run_batch(args, staged_files)
+        if results is None:
+            # compiler doesn't support batch mode, so each test will invoke it separately
+            # (no need to warn about this more than once)
+            TestChapter.use_batch = False
+            print(
+                f"{cls.cc} doesn't support {BATCH_OPTION}; compiling each test program separately",
+                file=sys.stderr,
+            )
+            return
+        cls.batch_results = dict(zip(programs, results))
+
+    def setUp(self) -> None:
+        """Create a scratch directory for this test's output files
+        (or use the one where we already batch-compiled this test's program)"""
+        batch_dir = self.batch_dirs.pop(self._testMethodName, None)
+        if batch_dir is not None:
+            self.scratch_dir = batch_dir
+        else:
+            self.scratch_dir = Path(tempfile.mkdtemp(prefix="test_compiler_"))
+
+    def scratch_path(self, source_file: Path) -> Path:
+        """Get the path where a copy of source_file goes in this test's scratch directory.
+
+        We mirror the layout of the test suite (relative to ROOT_DIR)
+        so relative paths in #include directives still work. The compiler under test
+        is invoked on this copy, so its diagnostics name the copy, e.g.
+        /tmp/test_compiler_XXXX/tests/chapter_1/valid/foo.c rather than
+        /path/to/tests/chapter_1/valid/foo.c; use source_path to map it back.
+        """
+        return scratch_path(source_file, self.scratch_dir)
+
+    def source_path(self, path: Path) -> Path:
+        """Inverse of scratch_path: map a file in the scratch directory back to
+        the corresponding path in the test suite. Leave paths outside the scratch directory alone."""
+        try:
+            return ROOT_DIR / path.relative_to(self.scratch_dir)
+        except ValueError:
+            return path
+
+    def stage_source(self, source_file: Path) -> Path:
+        """Copy a source file, and any local headers it includes, into the scratch directory
+
+        Returns:
+            absolute path to the copy of source_file
+        """
+        return copy_to_scratch(source_file, self.scratch_dir)
+
     def tearDown(self) -> None:
-        """Delete files produced during this test run (e.g. assembly and object files)"""
+        """Delete files produced during this test run (e.g. assembly and object files)
+
+        Everything a test produces ends up in its scratch directory, so we just delete that,
+        instead of searching the whole test directory for output files after every test.
+        """
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """After all of this class's tests have run, delete any stray files in test_dir.
+
+        This is just a safety net in case the compiler under test wrote output files somewhere
+        other than the scratch directory.
+
+        Also delete batch scratch directories for any tests that didn't run.
+        """
+        for batch_dir in getattr(cls, "batch_dirs", {}).values():
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
         garbage_files = (
             f
-            for f in self.test_dir.rglob("*")
+            for f in cls.test_dir.rglob("*")
             if not f.is_dir()
             and f.suffix not in [".c", ".h", ".md"]
             and f.name not in ASSEMBLY_LIBS
@@ -246,6 +662,9 @@ class TestChapter(unittest.TestCase):
     ) -> subprocess.CompletedProcess[str]:
         """Compile the test program (possibly up to some intermediate stage), but don't run it.
 
+        We compile a copy of the source file in the scratch directory (see stage_source),
+        so any output files end up there too.
+
         Args:
             source_file: Absolute path to source file
             cc_opt (optional): Additional command-line options to pass to compiler
@@ -259,33 +678,109 @@ class TestChapter(unittest.TestCase):
         """
         if cc_opt is None and self.exit_stage is not None:
             cc_opt = f"--{self.exit_stage}"
+            # we may have already compiled this program in batch mode during setUpClass
+            batch_result = self.batch_results.pop(source_file, None)
+            if batch_result is not None:
+                # we don't know how long this program took on its own
+                record_phase(COMPILE, batch_result, self.phases)
+                return batch_result
 
         args = [self.cc] + self.options
         if cc_opt is not None:
             args.append(cc_opt)
 
-        args.append(source_file)
+        staged_file = self.stage_source(source_file)
+        args.append(staged_file)
+
+        if self.compiler_server is not None:
+            if cc_opt == "-S":
+                output: Optional[Path] = staged_file.with_suffix(".s")
+            elif cc_opt == "-c":
+                output = staged_file.with_suffix(".o")
+            elif self.exit_stage is None:
+                output = staged_file.with_suffix("")
+            else:
+                output = None
+            start = time.perf_counter()
+            try:
+                server_result = self.compiler_server.compile(
+                    args, staged_file, self.exit_stage, output, self.compile_timeout
+                )
+            except subprocess.TimeoutExpired as exc:
+                raise timed_out(
+                    COMPILE, args, exc, self.phases, time.perf_counter() - start
+                ) from exc
+            if server_result is not None:
+                record_phase(
+                    COMPILE, server_result, self.phases, time.perf_counter() - start
+                )
+                return server_result
 
         # run the command: '{self.cc} {options} {source_file}'
-        proc = subprocess.run(args, capture_output=True, check=False, text=True)
+        proc = run_phase(
+            COMPILE,
+            args,
+            self.phases,
+            check=False,
+            timeout=self.compile_timeout,
+            limits=self.compiler_limits,
+        )
 
         return proc
 
+    def record_asm_metrics(self, program: Path) -> None:
+        """If we're collecting assembly metrics, compute them for every function in a program.
+
+        Args:
+            program: Absolute path to a C source file, which we'll compile to assembly
+                (without recording this extra compilation in self.phases),
+                or to an assembly file that we've already compiled it to
+        """
+        if not self.collect_asm_metrics:
+            return
+        if program.suffix == ".s":
+            asm_file = program
+        else:
+            staged_file = self.stage_source(program)
+            try:
+                proc = run_phase(
+                    COMPILE,
+                    [self.cc] + self.options + ["-S", staged_file],
+                    None,
+                    timeout=self.compile_timeout,
+                    limits=self.compiler_limits,
+                )
+            except LimitExceeded:
+                return
+            if proc.returncode != 0:
+                return
+            asm_file = staged_file.with_suffix(".s")
+        try:
+            functions = parse_cache.parse_file(asm_file)
+        except parse.ParseError:
+            # metrics are informational; don't fail a passing test over them
+            return
+        self.asm_metrics = {
+            name: function_metrics(fun) for name, fun in functions.items()
+        }
+
     def validate_no_output(self, source_file: Path) -> None:
         """Make sure the compiler under test didn't emit executable or assembly code.
 
         Used when compiling invalid test cases or testing intermediate stages."""
 
         # if we compiled /path/to/foo.c, look for /path/to/foo.s
-        stem = source_file.stem
-        assembly_file = source_file.parent / f"{stem}.s"
+        # (in the scratch directory, since that's where we compiled it)
+        compiled_file = self.scratch_path(source_file)
+        stem = compiled_file.stem
+        assembly_file = compiled_file.parent / f"{stem}.s"
         self.assertFalse(
             assembly_file.exists(),
             msg=f"Found assembly file {assembly_file} when testing invalid program or intermediate stage!",
         )
 
         # now look for /path/to/foo
-        executable_file = source_file.parent / stem
+        executable_file = compiled_file.parent / stem
         self.assertFalse(executable_file.exists())
 
     def validate_runs(
@@ -304,7 +799,8 @@ class TestChapter(unittest.TestCase):
         expected_retcode = expected["return_code"]
         expected_stdout = expected.get("stdout", "")
 
-        exe = actual.args[0]
+        # report the program's location in the test suite, not the scratch directory
+        exe = str(source_file.with_suffix(""))
         self.assertEqual(
             expected_retcode,
             actual.returncode,
@@ -394,12 +890,13 @@ class TestChapter(unittest.TestCase):
 
         # run the executable
         # TODO cleaner handling if executable doesn't exist? or check that it exists above?
-        exe = source_file.with_suffix("")
-        result = subprocess.run(
-            [exe], check=False, capture_output=True, text=True, timeout=10.0
+        exe = self.scratch_path(source_file).with_suffix("")
+        result = run_phase(
+            RUN, [exe], self.phases, check=False, timeout=self.run_timeout
         )
 
         self.validate_runs(source_file, result)
+        self.record_asm_metrics(source_file)
 
     def library_test_helper(
         self, file_under_test: Path, other_files: List[Path]
@@ -415,6 +912,7 @@ class TestChapter(unittest.TestCase):
                 (in optimization tests) an assembly file that we've already
                 compiled with self.cc and inspected
             other_files: Absolute paths to other files in the multi-file program
+                (these are compiled in place, since gcc puts its intermediate files elsewhere)
         """
 
         # If file_under_test is a C program, compile it with self.cc;
@@ -430,22 +928,27 @@ class TestChapter(unittest.TestCase):
             # print stderr (might have warnings we care about even if compilation succeeded)
             # TODO make this controlled by verbosity maybe?
             print_stderr(compilation_result)
-            compiled_file_under_test = file_under_test.with_suffix(".o")
+            compiled_file_under_test = self.scratch_path(file_under_test).with_suffix(
+                ".o"
+            )
             validation_key = file_under_test
         else:
             compiled_file_under_test = file_under_test
-            validation_key = file_under_test.with_suffix(".c")
+            validation_key = self.source_path(file_under_test).with_suffix(".c")
 
         # compile other files, link with object file produced by compiler under test,
         # and run resulting executable
         source_files = [compiled_file_under_test] + other_files
         options = []
-        if needs_mathlib(file_under_test) or any(needs_mathlib(f) for f in other_files):
+        if needs_mathlib(validation_key) or any(needs_mathlib(f) for f in other_files):
             options.append("-lm")
-        result = gcc_compile_and_run(source_files, options)
+        result = gcc_compile_and_run(
+            source_files, options, self.phases, self.run_timeout
+        )
 
         # validate results
         self.validate_runs(validation_key, result)
+        self.record_asm_metrics(file_under_test)
 
     def compile_client_and_run(self, client_path: Path) -> None:
         """Multi-file program test where our compiler compiles the client"""
@@ -479,6 +982,9 @@ class TestDirs:
     # valid test programs for parts I & II
     # (we'll handle part III tests differently)
     VALID = "valid"
+    # long-running programs for measuring the performance of generated code
+    # (only used by --benchmark-run, not part of the regular test run)
+    BENCHMARKS = "benchmarks"
 
 
 dirs = {
@@ -560,19 +1066,42 @@ def excluded_extra_credit(source_prog: Path, extra_credit_flags: ExtraCredit) ->
         # this isn't an extra-credit test so we shouldn't exclude it
         return False
 
-    # convert list of strings representing required extra credit features for this program
-    # to list of ExtraCredit flags
     key = get_props_key(source_prog)
+    return requires_excluded_features(EXTRA_CREDIT_PROGRAMS[key], extra_credit_flags)
 
-    features_required = (
-        ExtraCredit[str.upper(feature)] for feature in EXTRA_CREDIT_PROGRAMS[key]
-    )
 
-    # exclude this test if it requires any extra credit features that
-    # aren't included in this test run
+def requires_excluded_features(
+    features: Iterable[str], extra_credit_flags: ExtraCredit
+) -> bool:
+    """Check whether a program uses any extra credit features that aren't included in this test run
+
+    Args:
+        features: names of the extra credit features the program uses (e.g. "bitwise")
+        extra_credit_flags: extra credit features to test (specified on the command line)
+    """
+    # convert list of strings representing required extra credit features for this program
+    # to list of ExtraCredit flags
+    features_required = (ExtraCredit[str.upper(feature)] for feature in features)
     return any(f not in extra_credit_flags for f in features_required)
 
 
+def find_tests(directory: Path, extra_credit_flags: ExtraCredit) -> List[TestProgram]:
+    """Look up the test programs in a directory (and its subdirectories) in the manifest,
+    skipping helper libraries and programs that use extra credit features we're not testing
+
+    Args:
+        directory: Absolute path to a subdirectory of a chapter's test directory
+                   (e.g. /path/to/write-a-c-compiler-tests/chapter_1/valid)
+        extra_credit_flags: extra credit features to test (specified on the command line)
+    """
+    return [
+        program
+        for program in MANIFEST.value.find(directory)
+        if program.role != HELPER
+        and not requires_excluded_features(program.extra_credit, extra_credit_flags)
+    ]
+
+
 def make_invalid_test(program: Path) -> Callable[[TestChapter], None]:
     """Generate a test method for an invalid source program"""
 
@@ -644,10 +1173,8 @@ def make_invalid_tests(
     """
     tests: list[tuple[str, Callable[[TestChapter], None]]] = []
     for invalid_subdir in DIRECTORIES_BY_STAGE[stage]["invalid"]:
-        invalid_test_dir = test_dir / invalid_subdir
-        for program in invalid_test_dir.rglob("*.c"):
-            if excluded_extra_credit(program, extra_credit_flags):
-                continue
+        for entry in find_tests(test_dir / invalid_subdir, extra_credit_flags):
+            program = entry.path
 
             # derive name of test method from name of source file
             key = program.relative_to(test_dir).with_suffix("")
@@ -684,11 +1211,8 @@ def make_valid_tests(
     """
     tests: list[tuple[str, Callable[[TestChapter], None]]] = []
     for valid_subdir in DIRECTORIES_BY_STAGE[stage]["valid"]:
-        valid_testdir = test_dir / valid_subdir
-        for program in valid_testdir.rglob("*.c"):
-            if excluded_extra_credit(program, extra_credit_flags):
-                # this requires extra credit features that aren't enabled
-                continue
+        for entry in find_tests(test_dir / valid_subdir, extra_credit_flags):
+            program = entry.path
 
             # derive name of test method from name of source file
             key = program.relative_to(test_dir).with_suffix("")
@@ -697,14 +1221,13 @@ def make_valid_tests(
             test_method: Callable[[TestChapter], None]
             # test depends on the stage and whether this is a library test
             if stage == "run":
-                # all library/multi-file tests are in "library" subdirectories
-                if "libraries" not in key.parts:
-                    test_method = make_test_run(program)
-                # if it's a library test, figure out whether this is lib or client
-                elif program.stem.endswith("client"):
+                # library/multi-file tests are split into a library and a client
+                if entry.role == CLIENT:
                     test_method = make_test_client(program)
-                else:
+                elif entry.role == LIBRARY:
                     test_method = make_test_lib(program)
+                else:
+                    test_method = make_test_run(program)
             else:
                 # for stages besides "run", just test that compilation succeeds
                 test_method = make_test_valid(program)
@@ -0,0 +1,79 @@
+"""Optional protocol to compile many test programs with a single compiler invocation.
+
+When we're only testing an intermediate stage (--lex, --parse, --validate, --tacky, or --codegen),
+the framework can pass every program in a chapter to the compiler under test at once,
+instead of starting a new compiler process for each one. This only helps if your compiler
+is slow to start up. To support it, your compiler should accept a --batch option:
+
+    /path/to/your_compiler [options] --<stage> --batch
+
+and then:
+1. Read source file paths from stdin, one absolute path per line, until end of input.
+2. Process each file exactly as if it had been invoked as
+   `/path/to/your_compiler [options] --<stage> /path/to/file.c`
+   (writing any output files next to the source file, as usual).
+3. For each file, in the same order, write one line to stdout with a JSON object containing
+   that file's exit code and error output:
+       {"returncode": 0, "stderr": ""}
+   The object may also include "stdout" (which defaults to the empty string).
+4. Exit with code 0.
+
+If the compiler doesn't follow this protocol (e.g. it exits with a non-zero code or
+writes the wrong number of results), we fall back to compiling each program separately.
+"""
+
+from __future__ import annotations
+
+import json
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+BATCH_OPTION = "--batch"
+
+
+def run_batch(
+    args: Sequence[Union[str, Path]], source_files: List[Path]
+) -> Optional[List[subprocess.CompletedProcess[str]]]:
+    """Compile several source files with one compiler invocation
+
+    Args:
+        args: command to invoke the compiler in batch mode, including the --batch option
+        source_files: absolute paths of files to compile
+
+    Returns:
+        one CompletedProcess per source file, in the same order, or None if the
+        compiler doesn't support the batch protocol
+    """
+    manifest = "".join(f"{f}\n" for f in source_files)
+    try:
+        proc = subprocess.run(
+            args, input=manifest, capture_output=True, check=False, text=True
+        )
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
+
+    replies = proc.stdout.splitlines()
+    if len(replies) != len(source_files):
+        return None
+
+    results = []
+    for source_file, reply in zip(source_files, replies):
+        try:
+            status = json.loads(reply)
+            returncode = int(status["returncode"])
+        except (ValueError, TypeError, KeyError):
+            return None
+        # record the command we would have used to compile this file on its own
+        single_args = [a for a in args if a != BATCH_OPTION] + [source_file]
+        results.append(
+            subprocess.CompletedProcess(
+                single_args,
+                returncode,
+                stdout=status.get("stdout", ""),
+                stderr=status.get("stderr", ""),
+            )
+        )
+    return results
@@ -0,0 +1,473 @@
+"""Measure how long the compiler under test takes to compile each valid test program,
+or how long the benchmark programs it compiles take to run,
+and compare those measurements against an earlier baseline"""
+
+from __future__ import annotations
+
+import json
+import math
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from .basic import (
+    MANIFEST,
+    TEST_DIR,
+    TestChapter,
+    TestDirs,
+    make_test_run,
+    needs_mathlib,
+)
+from .timing import RUN, LimitExceeded, run_phase
+
+# kinds of benchmark results
+COMPILE_TIME = "compile"
+RUN_TIME = "run"
+
+# default thresholds for flagging slowdowns in compare()
+ALPHA = 0.05  # significance level
+MIN_SLOWDOWN = 0.05  # ignore slowdowns of less than 5%, even if they're significant
+
+# benchmark programs run for much longer than test programs,
+# especially when compiled without optimizations, so unless --run-timeout says otherwise,
+# we give them longer to finish
+DEFAULT_RUN_TIMEOUT = 60.0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Compute a percentile by linear interpolation between the closest ranks
+
+    Args:
+        values: non-empty list of samples
+        pct: percentile to compute, between 0 and 100
+    """
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(times: List[float]) -> Dict[str, float]:
+    return {
+        "median": statistics.median(times),
+        "p95": percentile(times, 95),
+        "min": min(times),
+        "max": max(times),
+    }
+
+
+def benchmark_program(
+    test: TestChapter, repeat: int, warmup: int, cc_opt: Optional[str]
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Compile one test's program several times (see benchmark_compile)
+
+    Returns:
+        the program's path relative to TEST_DIR and its results,
+        or None if we couldn't time it (e.g. because we compiled it in server mode,
+        or compilation exceeded the time limit)
+    """
+    program = test.get_program()
+    times = []
+    returncode = 0
+    test.setUp()
+    try:
+        for i in range(warmup + repeat):
+            test.phases = []
+            returncode = test.invoke_compiler(program, cc_opt=cc_opt).returncode
+            wall_time = test.phases[-1].wall_time
+            if i >= warmup and wall_time is not None:
+                times.append(wall_time)
+    except LimitExceeded:
+        return None
+    finally:
+        test.tearDown()
+    if not times:
+        return None
+    results: Dict[str, Any] = {"times": times, "returncode": returncode}
+    results.update(summarize(times))
+    return str(program.relative_to(TEST_DIR)), results
+
+
+def for_each_test(
+    tests: List[TestChapter],
+    benchmark: Callable[[TestChapter], Optional[Tuple[str, Dict[str, Any]]]],
+    progress: Optional[IO[str]],
+) -> Dict[str, Dict[str, Any]]:
+    """Benchmark each test's program, setting up and tearing down test classes
+    the same way the test runner does
+
+    Args:
+        tests: tests whose programs we should benchmark
+        benchmark: function to benchmark one test's program
+        progress (optional): stream to print each program's median time to
+
+    Returns:
+        results for each program, keyed by its path relative to TEST_DIR
+    """
+    programs: Dict[str, Dict[str, Any]] = {}
+    current_class: Optional[Type[TestChapter]] = None
+    try:
+        for test in tests:
+            if type(test) is not current_class:
+                if current_class is not None:
+                    current_class.tearDownClass()
+                current_class = type(test)
+                current_class.setUpClass()
+            result = benchmark(test)
+            if result is None:
+                continue
+            key, program_results = result
+            programs[key] = program_results
+            if progress is not None:
+                if "error" in program_results:
+                    print(f"  failed   {key}", file=progress, flush=True)
+                    continue
+                failed = "" if program_results["returncode"] == 0 else " (failed)"
+                print(
+                    f"{program_results['median']:8.4f}s  {key}{failed}",
+                    file=progress,
+                    flush=True,
+                )
+    finally:
+        if current_class is not None:
+            current_class.tearDownClass()
+    return programs
+
+
+def summarize_programs(
+    programs: Dict[str, Dict[str, Any]], elapsed: float
+) -> Dict[str, Any]:
+    """Summarize the per-program medians (see benchmark_compile)"""
+    medians = [p["median"] for p in programs.values() if "median" in p]
+    summary: Dict[str, Any] = {"programs": len(medians)}
+    if medians:
+        summary.update(
+            {
+                "median": statistics.median(medians),
+                "p95": percentile(medians, 95),
+                "total": sum(medians),
+                "throughput": len(medians) / sum(medians),
+                "elapsed": elapsed,
+            }
+        )
+    return summary
+
+
+def benchmark_compile(
+    tests: List[TestChapter],
+    *,
+    repeat: int,
+    warmup: int,
+    stage: str,
+    progress: Optional[IO[str]] = None,
+) -> Dict[str, Any]:
+    """Compile each test's program several times and record how long each compilation took
+
+    Args:
+        tests: tests whose programs we should compile (we only use them to find and compile
+            each program, we don't run them)
+        repeat: how many times to measure each program
+        warmup: how many times to compile each program before we start measuring
+            (e.g. to warm up the file system cache)
+        stage: stage to stop after; if "run", compile each program to assembly with -S,
+            which measures the whole compiler without the assembler and linker
+        progress (optional): stream to print each program's median compile time to
+
+    Returns:
+        JSON-serializable benchmark results:
+            {"kind": "compile", "stage": ..., "repeat": ..., "warmup": ...,
+             "programs": {path: {"times": [...], "median": ..., "p95": ..., "min": ..., "max": ...,
+                                 "returncode": ...}},
+             "summary": {"programs": ..., "median": ..., "p95": ..., "total": ..., "throughput": ...}}
+            "times" are wall-clock times in seconds; "median" and "p95" in "summary" are taken
+            over the per-program medians; "throughput" is programs per second, based on
+            the per-program medians.
+    """
+    cc_opt = "-S" if stage == "run" else None
+    start = time.perf_counter()
+    programs = for_each_test(
+        tests, lambda test: benchmark_program(test, repeat, warmup, cc_opt), progress
+    )
+    return {
+        "kind": COMPILE_TIME,
+        "stage": stage,
+        "repeat": repeat,
+        "warmup": warmup,
+        "programs": programs,
+        "summary": summarize_programs(programs, time.perf_counter() - start),
+    }
+
+
+def build_benchmark_class(
+    compiler: Path, chapter: int, options: Sequence[str]
+) -> Optional[Type[TestChapter]]:
+    """Construct a test class for one chapter's benchmark programs
+
+    Each test compiles and runs one benchmark program and validates the result,
+    like the tests in build_test_class do. These tests aren't part of the regular test run;
+    benchmark_run uses them to find, compile, and validate each program.
+
+    Args:
+        compiler: absolute path to compiler under test
+        chapter: the chapter whose benchmarks we want; each benchmark program is in the directory
+            for the earliest chapter that covers every language feature it uses
+        options: extra command-line options to pass through to compiler (e.g. optimizations)
+
+    Returns:
+        a subclass of TestChapter, or None if this chapter doesn't have any benchmarks
+    """
+    test_dir = TEST_DIR.joinpath(f"chapter_{chapter}").resolve()
+    programs = [
+        entry.path for entry in MANIFEST.value.find(test_dir / TestDirs.BENCHMARKS)
+    ]
+    if not programs:
+        return None
+
+    testclass_attrs: Dict[str, Any] = {
+        "test_dir": test_dir,
+        "cc": compiler,
+        "options": options,
+        "exit_stage": None,
+        "error_codes": [],
+    }
+    for program in programs:
+        key = program.relative_to(test_dir).with_suffix("")
+        testclass_attrs[f"test_{key}"] = make_test_run(program)
+    return type(f"BenchmarkChapter{chapter}", (TestChapter,), testclass_attrs)
+
+
+def benchmark_executable(
+    test: TestChapter, repeat: int, warmup: int
+) -> Tuple[str, Dict[str, Any]]:
+    """Compile one benchmark program, then run it several times (see benchmark_run)
+
+    Returns:
+        the program's path relative to TEST_DIR and its results
+    """
+    program = test.get_program()
+    key = str(program.relative_to(TEST_DIR))
+    times: List[float] = []
+    test.phases = []
+    test.setUp()
+    try:
+        cc_opt = "-lm" if needs_mathlib(program) else None
+        compile_result = test.invoke_compiler(program, cc_opt=cc_opt)
+        if compile_result.returncode != 0:
+            return key, {
+                "error": f"compilation failed with exit code {compile_result.returncode}:\n"
+                + compile_result.stderr
+            }
+        exe = test.scratch_path(program).with_suffix("")
+        for i in range(warmup + repeat):
+            test.phases = []
+            result = run_phase(
+                RUN, [exe], test.phases, check=False, timeout=test.run_timeout
+            )
+            # make sure the program still computes the right answer
+            try:
+                test.validate_runs(program, result)
+            except AssertionError as err:
+                return key, {"error": str(err)}
+            wall_time = test.phases[-1].wall_time
+            if i >= warmup and wall_time is not None:
+                times.append(wall_time)
+    except LimitExceeded as err:
+        return key, {"error": str(err)}
+    finally:
+        test.tearDown()
+    results: Dict[str, Any] = {"times": times, "returncode": 0}
+    results.update(summarize(times))
+    return key, results
+
+
+def benchmark_run(
+    tests: List[TestChapter],
+    *,
+    repeat: int,
+    warmup: int,
+    progress: Optional[IO[str]] = None,
+) -> Dict[str, Any]:
+    """Compile each benchmark program once, then run it several times
+    and record how long each run took
+
+    We validate every run's result against expected_results.json,
+    so a faster program that computes the wrong answer doesn't count.
+
+    Args:
+        tests: tests for the benchmark programs (see build_benchmark_class)
+        repeat: how many times to measure each program
+        warmup: how many times to run each program before we start measuring
+            (e.g. to warm up the page cache)
+        progress (optional): stream to print each program's median run time to
+
+    Returns:
+        JSON-serializable benchmark results, in the same format as benchmark_compile, except:
+            - "kind" is "run", and there's no "stage"
+            - "options" lists the options we passed to the compiler under test
+            - "errors" maps each program we couldn't compile or that computed the wrong result
+              to an error message; these programs don't appear in "programs"
+    """
+    start = time.perf_counter()
+    results = for_each_test(
+        tests, lambda test: benchmark_executable(test, repeat, warmup), progress
+    )
+    programs = {k: v for k, v in results.items() if "error" not in v}
+    errors = {k: v["error"] for k, v in results.items() if "error" in v}
+    return {
+        "kind": RUN_TIME,
+        "options": [str(opt) for opt in tests[0].options] if tests else [],
+        "repeat": repeat,
+        "warmup": warmup,
+        "programs": programs,
+        "errors": errors,
+        "summary": summarize_programs(programs, time.perf_counter() - start),
+    }
+
+
+def format_summary(results: Dict[str, Any]) -> str:
+    summary = results["summary"]
+    if results.get("kind", COMPILE_TIME) == RUN_TIME:
+        errors = results["errors"]
+        failed = f"; {len(errors)} program(s) failed" if errors else ""
+        if not summary["programs"]:
+            return f"No programs ran{failed}"
+        return (
+            f"Ran {summary['programs']} programs {results['repeat']} times each: "
+            f"median {summary['median'] * 1000:.1f}ms, p95 {summary['p95'] * 1000:.1f}ms, "
+            f"total {summary['total']:.3f}s{failed}"
+        )
+    if not summary["programs"]:
+        return "No programs compiled"
+    return (
+        f"Compiled {summary['programs']} programs {results['repeat']} times each "
+        f"(stage: {results['stage']}): "
+        f"median {summary['median'] * 1000:.1f}ms, p95 {summary['p95'] * 1000:.1f}ms, "
+        f"{summary['throughput']:.1f} programs/second"
+    )
+
+
+def mann_whitney_u(baseline: List[float], current: List[float]) -> float:
+    """One-sided Mann-Whitney U test of whether current times tend to be larger than baseline times.
+
+    Uses the normal approximation, with corrections for ties and continuity,
+    so it's only reasonably accurate with at least five samples on each side.
+
+    Returns:
+        the p-value
+    """
+    n1 = len(baseline)
+    n2 = len(current)
+    # rank all the samples together, giving tied values their average rank
+    combined = sorted([(t, 0) for t in baseline] + [(t, 1) for t in current])
+    ranks = [0.0] * len(combined)
+    tie_term = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        tied = j - i + 1
+        tie_term += tied**3 - tied
+        i = j + 1
+
+    rank_sum = sum(r for r, (_, group) in zip(ranks, combined) if group == 1)
+    u = rank_sum - n2 * (n2 + 1) / 2
+    mean = n1 * n2 / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        # every sample is identical
+        return 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    # P(Z >= z)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    *,
+    alpha: float = ALPHA,
+    min_slowdown: float = MIN_SLOWDOWN,
+) -> Tuple[List[Tuple[str, float, float]], Optional[float]]:
+    """Find programs that got significantly slower to compile (or to run)
+
+    Args:
+        baseline, current: results from benchmark_compile (or benchmark_run)
+        alpha: significance level for the Mann-Whitney U test
+        min_slowdown: only flag programs whose median time increased by at least this fraction
+
+    Returns:
+        - (program, ratio of median times, p-value) for each program that got slower,
+          slowest first
+        - the geometric mean of current/baseline median times over all programs in both results,
+          or None if there are no such programs
+    """
+    slowdowns = []
+    log_ratios = []
+    for program, current_result in current["programs"].items():
+        baseline_result = baseline["programs"].get(program)
+        if baseline_result is None:
+            continue
+        ratio = current_result["median"] / baseline_result["median"]
+        log_ratios.append(math.log(ratio))
+        if ratio < 1 + min_slowdown:
+            continue
+        p_value = mann_whitney_u(baseline_result["times"], current_result["times"])
+        if p_value < alpha:
+            slowdowns.append((program, ratio, p_value))
+    slowdowns.sort(key=lambda s: s[1], reverse=True)
+    geomean = math.exp(statistics.mean(log_ratios)) if log_ratios else None
+    return slowdowns, geomean
+
+
+def compare_files(baseline_path: Path, current_path: Path) -> int:
+    """Print a comparison of two benchmark result files
+
+    Returns:
+        exit code: 1 if any program got significantly slower, 0 otherwise
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(current_path, encoding="utf-8") as f:
+        current = json.load(f)
+    # results from before we recorded "kind" are all compile-time benchmarks
+    kind = current.get("kind", COMPILE_TIME)
+    if baseline.get("kind", COMPILE_TIME) != kind:
+        print(
+            "Warning: comparing compile-time benchmarks against run-time benchmarks",
+            file=sys.stderr,
+        )
+    elif kind == COMPILE_TIME and baseline["stage"] != current["stage"]:
+        print(
+            f"Warning: comparing benchmarks for different stages ({baseline['stage']} vs. {current['stage']})",
+            file=sys.stderr,
+        )
+    elif kind == RUN_TIME and baseline["options"] != current["options"]:
+        print(
+            f"Compiler options: {' '.join(baseline['options']) or '(none)'} (baseline) vs. "
+            f"{' '.join(current['options']) or '(none)'} (current)"
+        )
+    slowdowns, geomean = compare(baseline, current)
+    if geomean is None:
+        print("No programs in common")
+        return 0
+    print(f"Overall: current/baseline median {kind} time = {geomean:.3f} (geometric mean)")
+    if not slowdowns:
+        print("No significant slowdowns")
+        return 0
+    print(
+        f"{len(slowdowns)} program(s) got significantly slower (p < {ALPHA}, at least {MIN_SLOWDOWN:.0%} slower):"
+    )
+    for program, ratio, p_value in slowdowns:
+        before = baseline["programs"][program]["median"]
+        after = current["programs"][program]["median"]
+        print(
+            f"  {program}: {before * 1000:.1f}ms -> {after * 1000:.1f}ms ({ratio:.2f}x, p={p_value:.3g})"
+        )
+    return 1
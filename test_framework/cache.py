@@ -0,0 +1,91 @@
+"""Cache passing test results so we can skip tests whose inputs haven't changed"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterable
+
+FRAMEWORK_DIR = Path(__file__).parent
+
+
+def hash_file(path: Path) -> str:
+    """Get the SHA-256 hash of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_framework() -> str:
+    """Hash the test framework's own source code.
+
+    Test logic is part of every cache key; e.g. if we change the maximum number of spills
+    a register allocation test allows, we need to rerun that test.
+    """
+    digest = hashlib.sha256()
+    for src in sorted(FRAMEWORK_DIR.rglob("*.py")):
+        if "test_tests" in src.parts:
+            continue
+        digest.update(str(src.relative_to(FRAMEWORK_DIR)).encode())
+        digest.update(hash_file(src).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """An on-disk cache of passing test results.
+
+    Each entry is a small JSON file whose name is the test's cache key.
+    A cache key is a hash of everything that could change the test's outcome:
+    the compiler under test, the test framework, and whatever the test itself
+    contributes (see TestChapter.cache_key): the source files it compiles,
+    the options it passes to the compiler, the stage under test, and its expected results.
+    We only record passing results, so any test that failed last time will run again.
+    """
+
+    def __init__(self, cache_dir: Path, compiler: Path) -> None:
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # hash of everything that's shared by all tests in this run
+        self.fingerprint = hash_file(compiler) + hash_framework()
+        self.hits = 0
+        self.lock = threading.Lock()
+
+    def key(self, parts: Iterable[str], files: Iterable[Path]) -> str:
+        """Compute the cache key for a test
+
+        Args:
+            parts: strings that identify the test and its configuration
+            files: all the input files the test depends on
+        """
+        digest = hashlib.sha256(self.fingerprint.encode())
+        for p in parts:
+            digest.update(b"\0" + p.encode())
+        for f in files:
+            digest.update(b"\0" + str(f).encode() + b"\0" + hash_file(f).encode())
+        return digest.hexdigest()
+
+    def entry(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def lookup(self, key: str) -> bool:
+        """Check whether the test with this key passed in an earlier run"""
+        found = self.entry(key).exists()
+        if found:
+            with self.lock:
+                self.hits += 1
+        return found
+
+    def record(self, key: str, test_id: str) -> None:
+        """Record that the test with this key passed"""
+        # write to a temporary file and then rename it,
+        # so concurrent test runs never see a partially-written entry
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"test": test_id}, f)
+        os.replace(tmp, self.entry(key))
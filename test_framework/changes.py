@@ -0,0 +1,46 @@
+"""Find test programs affected by changes to the test suite, according to git"""
+
+from __future__ import annotations
+
+import subprocess
+from pathlib import Path
+from typing import Set
+
+from .basic import ROOT_DIR, TEST_DIR
+
+
+def get_changed_files(baseline: str = "HEAD") -> Set[Path]:
+    """Get every file in the test suite that has changed since a commit
+
+    This includes uncommitted changes and new files that haven't been added to git yet.
+
+    Args:
+        baseline: the commit to compare against
+
+    Returns:
+        absolute (resolved) paths of changed files
+
+    Raises:
+        subprocess.CalledProcessError if git fails (e.g. baseline isn't a valid commit)
+    """
+    pathspec = str(TEST_DIR.relative_to(ROOT_DIR))
+    list_changed_files = subprocess.run(
+        ["git", "diff", baseline, "--name-only", "--", pathspec],
+        cwd=ROOT_DIR,
+        text=True,
+        check=True,
+        capture_output=True,
+    )
+    # also get untracked files
+    list_new_files = subprocess.run(
+        ["git", "ls-files", "--others", "--exclude-standard", "--", pathspec],
+        cwd=ROOT_DIR,
+        text=True,
+        check=True,
+        capture_output=True,
+    )
+    return {
+        (ROOT_DIR / f).resolve()
+        for f in list_changed_files.stdout.splitlines()
+        + list_new_files.stdout.splitlines()
+    }
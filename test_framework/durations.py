@@ -0,0 +1,137 @@
+"""Remember how long each test took in earlier runs, so we can start the slowest tests first"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import statistics
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# version of the on-disk format; if it doesn't match, we ignore the file
+VERSION = 1
+
+# how much weight to give the latest duration when we update a test's estimate
+# (the rest goes to its previous estimate), to smooth out noisy timings
+SMOOTHING = 0.5
+
+
+class DurationsDB:
+    """A small JSON file that maps each test ID to an estimate of how long it takes, in seconds.
+
+    The file looks like: {"version": 1, "durations": {test ID: seconds}}
+    A missing, unreadable, or out-of-date file is treated as empty.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.durations: Dict[str, float] = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                contents = json.load(f)
+            if contents.get("version") == VERSION:
+                self.durations = {
+                    test_id: float(seconds)
+                    for test_id, seconds in contents["durations"].items()
+                }
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def get(self, test_id: str) -> Optional[float]:
+        return self.durations.get(test_id)
+
+    def record(self, test_id: str, seconds: float) -> None:
+        """Update a test's estimated duration with the time it took in this run"""
+        previous = self.durations.get(test_id)
+        if previous is not None:
+            seconds = SMOOTHING * seconds + (1 - SMOOTHING) * previous
+        self.durations[test_id] = seconds
+
+    def save(self) -> None:
+        """Write the database back to disk"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file and then rename it,
+        # so an interrupted run never leaves a partially-written database
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": VERSION,
+                    "durations": {t: round(d, 6) for t, d in self.durations.items()},
+                },
+                f,
+                indent=0,
+                sort_keys=True,
+            )
+        os.replace(tmp, self.path)
+
+    def estimate(self, test_ids: Sequence[str]) -> Tuple[List[float], int]:
+        """Estimate how long each test will take.
+
+        Tests we haven't seen before get the median of the known estimates,
+        or 0 if we don't know about any of these tests.
+
+        Returns:
+            the estimate for each test, and how many of those estimates came from earlier runs
+        """
+        known = [self.durations[t] for t in test_ids if t in self.durations]
+        default = statistics.median(known) if known else 0.0
+        return [self.durations.get(t, default) for t in test_ids], len(known)
+
+
+def longest_first(items: Sequence[T], estimates: Sequence[float]) -> List[T]:
+    """Sort items by estimated duration, longest first (ties keep their original order).
+
+    Handing tests to workers in this order is the longest-processing-time-first (LPT)
+    heuristic: the slow tests start right away, and the quick ones fill in the gaps at the end,
+    rather than one slow test starting last and keeping the other workers idle.
+    """
+    order = sorted(range(len(items)), key=lambda i: -estimates[i])
+    return [items[i] for i in order]
+
+
+def predict_makespan(estimates: Sequence[float], jobs: int) -> float:
+    """Predict how long it will take to run tests in this order on this many workers,
+    assuming each test takes exactly its estimated time.
+
+    Each test starts as soon as a worker is free, like in a ThreadPoolExecutor.
+    """
+    workers = [0.0] * max(jobs, 1)
+    for estimate in estimates:
+        # the next test goes to whichever worker finishes first
+        heapq.heapreplace(workers, workers[0] + estimate)
+    return max(workers)
+
+
+def partition(
+    test_ids: Sequence[str], estimates: Sequence[float], count: int
+) -> List[int]:
+    """Split tests into shards with roughly equal total estimated durations.
+
+    Assign each test, longest first, to the shard with the least work so far;
+    if several shards have the same amount of work, pick the one with the fewest tests.
+    Ties are broken by test ID and then by shard number, so every machine that
+    computes the partition from the same tests and estimates gets the same answer,
+    and every test ends up in exactly one shard.
+    If none of the estimates are positive (e.g. we don't have any), we treat every test
+    as taking the same time. If all the estimates are equal, this just deals the
+    tests out in round-robin order, so each shard gets about the same number.
+
+    Returns:
+        the shard number (from 0 to count - 1) for each test
+    """
+    if not any(e > 0 for e in estimates):
+        estimates = [1.0] * len(test_ids)
+    order = sorted(range(len(test_ids)), key=lambda i: (-estimates[i], test_ids[i]))
+    # (total estimated duration, number of tests, shard number) for each shard
+    shards = [(0.0, 0, shard) for shard in range(count)]
+    assignments = [0] * len(test_ids)
+    for i in order:
+        load, size, shard = shards[0]
+        assignments[i] = shard
+        heapq.heapreplace(shards, (load + max(estimates[i], 0.0), size + 1, shard))
+    return assignments
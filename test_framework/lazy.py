@@ -0,0 +1,76 @@
+"""Read-only collections that aren't loaded until they're first used.
+
+Most test runs (and anything else that imports the test framework, like --check-setup)
+only need a small part of the per-test info in expected_results.json and test_properties.json,
+or none at all, so we don't parse these files at import time.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import AbstractSet, Any, Callable, Dict, Generic, Iterator, Mapping, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+T = TypeVar("T")
+
+
+@lru_cache(maxsize=None)
+def load_json(path: Path) -> Any:
+    """Parse a JSON file (once, no matter how many lazy collections it's used by)"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Lazy(Generic[T]):
+    """Compute a value the first time it's needed"""
+
+    def __init__(self, loader: Callable[[], T]) -> None:
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.loaded = False
+        self._value: T
+
+    @property
+    def value(self) -> T:
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    self._value = self.loader()
+                    self.loaded = True
+        return self._value
+
+
+class LazyMapping(Mapping[K, V]):
+    """A read-only dictionary that isn't loaded until it's first used"""
+
+    def __init__(self, loader: Callable[[], Dict[K, V]]) -> None:
+        self.data = Lazy(loader)
+
+    def __getitem__(self, key: K) -> V:
+        return self.data.value[key]
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self.data.value)
+
+    def __len__(self) -> int:
+        return len(self.data.value)
+
+
+class LazySet(AbstractSet[T]):
+    """A read-only set that isn't loaded until it's first used"""
+
+    def __init__(self, loader: Callable[[], AbstractSet[T]]) -> None:
+        self.data = Lazy(loader)
+
+    def __contains__(self, item: object) -> bool:
+        return item in self.data.value
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.data.value)
+
+    def __len__(self) -> int:
+        return len(self.data.value)
@@ -0,0 +1,265 @@
+"""An index of every test program and its metadata (test_manifest.json)
+
+Building the test suite used to mean walking the tests/ directory several times per chapter
+and re-deriving each program's metadata from its path, test_properties.json, and its
+#include directives. The manifest records all of that once, so building the test suite
+is just a series of lookups, which matters on slow (e.g. network) file systems.
+
+The manifest is generated; after adding, removing, or renaming test programs
+(or changing test_properties.json), regenerate it:
+
+    python3 -m test_framework.manifest
+
+If the manifest is missing or was written by an incompatible version of the test framework,
+we build it in memory from the tests/ directory instead.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import warnings
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .lazy import load_json
+
+# version of the manifest format; bump this whenever TestProgram changes
+VERSION = 2
+
+MANIFEST_NAME = "test_manifest.json"
+
+# roles of test programs
+PROGRAM = "program"  # an ordinary test program
+LIBRARY = "library"  # the library half of a library test (in a libraries/ directory)
+CLIENT = "client"  # the client half of a library test (named *_client.c)
+HELPER = "helper"  # a helper library other tests link against (not a test itself)
+
+
+@dataclass(frozen=True)
+class TestProgram:
+    """A C test program and everything we need to know about it to build its test"""
+
+    # absolute path to the program
+    path: Path
+    # the chapter it belongs to
+    chapter: int
+    # the directory under chapter_N that it's in, e.g. "valid", "invalid_parse",
+    # "benchmarks", "constant_folding", "int_only", or "helper_libs"
+    kind: str
+    # PROGRAM, LIBRARY, CLIENT, or HELPER
+    role: str = PROGRAM
+    # extra credit features it uses (e.g. "bitwise"), from test_properties.json
+    extra_credit: Tuple[str, ...] = ()
+    # whether it needs to be linked with the math library on Linux, from test_properties.json
+    requires_mathlib: bool = False
+    # C libraries (relative to the tests/ directory) it's linked with,
+    # from test_properties.json
+    libs: Tuple[str, ...] = ()
+    # assembly libraries it's linked with, from test_properties.json, without the
+    # platform-specific suffix (see basic.get_libs)
+    assembly_libs: Tuple[str, ...] = ()
+    # other files (relative to the tests/ directory) that its behavior depends on,
+    # aside from its libraries: the other half of a library test,
+    # and all local headers that it, the other half, and its C libraries include
+    dependencies: Tuple[str, ...] = ()
+
+    def to_json(self, test_dir: Path) -> Dict[str, Any]:
+        """Convert to JSON, leaving out fields with default values to keep the manifest small"""
+        record: Dict[str, Any] = {
+            "path": self.path.relative_to(test_dir).as_posix(),
+            "kind": self.kind,
+        }
+        if self.role != PROGRAM:
+            record["role"] = self.role
+        if self.extra_credit:
+            record["extra_credit"] = list(self.extra_credit)
+        if self.requires_mathlib:
+            record["requires_mathlib"] = True
+        if self.libs:
+            record["libs"] = list(self.libs)
+        if self.assembly_libs:
+            record["assembly_libs"] = list(self.assembly_libs)
+        if self.dependencies:
+            record["dependencies"] = list(self.dependencies)
+        return record
+
+    @staticmethod
+    def from_json(record: Dict[str, Any], test_dir: Path) -> TestProgram:
+        relative_path = Path(record["path"])
+        return TestProgram(
+            path=test_dir / relative_path,
+            # e.g. "chapter_20" -> 20
+            chapter=int(relative_path.parts[0][len("chapter_") :]),
+            kind=record["kind"],
+            role=record.get("role", PROGRAM),
+            extra_credit=tuple(record.get("extra_credit", [])),
+            requires_mathlib=record.get("requires_mathlib", False),
+            libs=tuple(record.get("libs", [])),
+            assembly_libs=tuple(record.get("assembly_libs", [])),
+            dependencies=tuple(record.get("dependencies", [])),
+        )
+
+
+@dataclass
+class TestManifest:
+    """Every test program, indexed by chapter and kind"""
+
+    # absolute path to the tests/ directory
+    test_dir: Path
+    programs: List[TestProgram]
+    # (chapter, kind) -> programs in that directory, sorted by path
+    index: Dict[Tuple[int, str], List[TestProgram]] = field(
+        init=False, default_factory=dict
+    )
+    # path relative to test_dir, e.g. "chapter_1/valid/return_2.c" -> program
+    by_path: Dict[str, TestProgram] = field(init=False, default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.programs.sort(key=lambda p: p.path)
+        for program in self.programs:
+            self.index.setdefault((program.chapter, program.kind), []).append(program)
+            self.by_path[program.path.relative_to(self.test_dir).as_posix()] = program
+
+    def get(self, relative_path: str) -> Optional[TestProgram]:
+        """Look up a program by its path relative to the tests/ directory
+
+        Returns:
+            the program, or None if it isn't a C test program or helper library
+            (e.g. it's an assembly library)
+        """
+        return self.by_path.get(relative_path)
+
+    def find(self, directory: Path) -> List[TestProgram]:
+        """Get every program in a directory under tests/ (including its subdirectories)
+
+        Args:
+            directory: an absolute, resolved path to a chapter's test directory or
+                one of its subdirectories, e.g. /path/to/tests/chapter_1/valid
+
+        Returns:
+            the programs in that directory, sorted by path
+        """
+        parts = directory.relative_to(self.test_dir).parts
+        chapter = int(parts[0][len("chapter_") :])
+        if len(parts) == 1:
+            return [p for p in self.programs if p.chapter == chapter]
+        programs = self.index.get((chapter, parts[1]), [])
+        if len(parts) == 2:
+            return list(programs)
+        return [p for p in programs if directory in p.path.parents]
+
+    def to_json(self) -> str:
+        """Serialize the manifest, one program per line so diffs are easy to read"""
+        lines = ",\n".join(
+            json.dumps(p.to_json(self.test_dir), sort_keys=True) for p in self.programs
+        )
+        return f'{{"version": {VERSION}, "programs": [\n{lines}\n]}}\n'
+
+
+def build_manifest(root_dir: Path) -> TestManifest:
+    """Index every test program by walking the tests/ directory
+
+    Args:
+        root_dir: the root of the test suite repository, containing tests/
+            and test_properties.json
+    """
+    # basic imports this module, so import it here rather than at the top
+    from . import basic  # pylint: disable=import-outside-toplevel
+
+    test_dir = root_dir / "tests"
+    properties = load_json(root_dir / "test_properties.json")
+    programs = []
+    for path in sorted(test_dir.glob("chapter_*/*/**/*.c")):
+        relative_path = path.relative_to(test_dir)
+
+        if relative_path.parts[1] == "helper_libs":
+            role = HELPER
+        elif "libraries" in relative_path.parts:
+            role = CLIENT if path.stem.endswith("_client") else LIBRARY
+        else:
+            role = PROGRAM
+
+        # a library and its client share one entry in test_properties.json,
+        # under the library's path (see basic.get_props_key)
+        library = (
+            basic.replace_stem(path, path.stem[: -len("_client")])
+            if role == CLIENT
+            else path
+        )
+        props_key = str(library.relative_to(test_dir))
+
+        # the other files this program's behavior depends on (see basic.get_dependencies)
+        libs = properties["libs"].get(props_key, [])
+        sources = [path]
+        if role in [LIBRARY, CLIENT]:
+            if role == CLIENT:
+                other = library
+            else:
+                other = basic.replace_stem(path, path.stem + "_client")
+            if other.exists():
+                sources.append(other)
+        dependencies = list(sources[1:])
+        sources.extend(test_dir / lib for lib in libs)
+        for src in sources:
+            dependencies.extend(
+                h for h in basic.get_headers(src) if h not in dependencies
+            )
+
+        programs.append(
+            TestProgram(
+                path=path,
+                chapter=int(relative_path.parts[0][len("chapter_") :]),
+                kind=relative_path.parts[1],
+                role=role,
+                extra_credit=tuple(
+                    properties["extra_credit_tests"].get(props_key, [])
+                    if "extra_credit" in relative_path.parts
+                    else []
+                ),
+                requires_mathlib=props_key in properties["requires_mathlib"],
+                libs=tuple(libs),
+                assembly_libs=tuple(properties["assembly_libs"].get(props_key, [])),
+                dependencies=tuple(
+                    Path(os.path.relpath(d, test_dir)).as_posix() for d in dependencies
+                ),
+            )
+        )
+    return TestManifest(test_dir, programs)
+
+
+def load_manifest(root_dir: Path) -> TestManifest:
+    """Load test_manifest.json, or build the manifest from scratch if we can't use it
+
+    Args:
+        root_dir: the root of the test suite repository, containing test_manifest.json
+    """
+    test_dir = root_dir / "tests"
+    try:
+        with open(root_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            contents = json.load(f)
+    except FileNotFoundError:
+        return build_manifest(root_dir)
+    if contents.get("version") != VERSION:
+        warnings.warn(
+            f"{MANIFEST_NAME} has version {contents.get('version')}, expected {VERSION}; "
+            "indexing test programs from scratch. Regenerate it with "
+            "'python3 -m test_framework.manifest'."
+        )
+        return build_manifest(root_dir)
+    return TestManifest(
+        test_dir, [TestProgram.from_json(p, test_dir) for p in contents["programs"]]
+    )
+
+
+def main() -> None:
+    """Regenerate test_manifest.json"""
+    root_dir = Path(__file__).parent.parent
+    manifest = build_manifest(root_dir)
+    with open(root_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        f.write(manifest.to_json())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Build each optimization test and benchmark program at every cumulative optimization level,
+and measure how much each optimization improves the generated code"""
+
+from __future__ import annotations
+
+import statistics
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from . import basic, regalloc
+from .parser import asm, parse, parse_cache
+from .tacky.common import CHAPTER as TACKY_OPT_CHAPTER
+from .timing import COMPILE, LINK, RUN, LimitExceeded, Phase, run_phase
+
+# (name, compiler options) for each optimization level, from least to most optimized
+Level = Tuple[str, List[str]]
+
+
+@dataclass
+class LevelResult:
+    """Result of building and running one program at one optimization level"""
+
+    # number of instructions (not counting labels) in the generated assembly
+    instructions: int = 0
+    # number of instructions that access the stack (see regalloc.uses_stack)
+    stack_accesses: int = 0
+    # wall-clock time of each measured run, in seconds
+    times: List[float] = field(default_factory=list)
+    # why we couldn't build or run the program, if we couldn't
+    error: Optional[str] = None
+    # the executable we built, until we've finished running it
+    exe: Optional[Path] = None
+
+    def to_json(self) -> Dict[str, Any]:
+        if self.error is not None:
+            return {"error": self.error}
+        return {
+            "instructions": self.instructions,
+            "stack_accesses": self.stack_accesses,
+            "times": self.times,
+            "median": statistics.median(self.times),
+        }
+
+
+def find_programs(
+    chapter: int, extra_credit_flags: basic.ExtraCredit, int_only: bool
+) -> List[Path]:
+    """Find the programs to build: the chapter 19 (and 20) tests, and the benchmark programs
+
+    Args:
+        chapter: latest chapter under test (19 or 20)
+        extra_credit_flags: extra credit features to include
+        int_only: True if we should skip programs that use Part II features
+    """
+    test_dirs = [basic.TEST_DIR / f"chapter_{TACKY_OPT_CHAPTER}"]
+    if chapter == regalloc.CHAPTER:
+        test_dirs.extend([regalloc.TEST_DIR / "int_only", regalloc.TEST_DIR / "all_types"])
+    # Part II benchmarks are in chapters 11-18
+    benchmark_chapters = range(1, 11) if int_only else range(1, chapter + 1)
+    test_dirs.extend(
+        basic.TEST_DIR / f"chapter_{c}" / basic.TestDirs.BENCHMARKS
+        for c in benchmark_chapters
+    )
+    return [
+        entry.path
+        for test_dir in test_dirs
+        for entry in basic.find_tests(test_dir.resolve(), extra_credit_flags)
+        if not (int_only and "all_types" in entry.path.parts)
+    ]
+
+
+def get_link_args(program: Path) -> List[Path]:
+    """Get the other files we need to link with a program's assembly code"""
+    libs = basic.get_libs(program)
+    if regalloc.TEST_DIR in program.parents and program.name in regalloc.REGALLOC_TESTS:
+        libs.append(regalloc.WRAPPER_SCRIPT)
+    return libs
+
+
+def build(
+    compiler: Path, options: List[str], program: Path, scratch_dir: Path
+) -> LevelResult:
+    """Compile a program to assembly with the compiler under test, analyze the assembly,
+    then assemble and link it with gcc"""
+    staged_file = basic.copy_to_scratch(program, scratch_dir)
+    proc = run_phase(COMPILE, [compiler] + options + ["-S", staged_file], None)
+    if proc.returncode != 0:
+        return LevelResult(
+            error=f"compilation failed with exit code {proc.returncode}:\n{proc.stderr}"
+        )
+
+    asm_file = staged_file.with_suffix(".s")
+    try:
+        functions = parse_cache.parse_file(asm_file)
+    except parse.ParseError as err:
+        return LevelResult(error=f"couldn't parse assembly: {err}")
+    result = LevelResult()
+    for f in functions.values():
+        for i in f.instructions:
+            if isinstance(i, asm.Instruction):
+                result.instructions += 1
+                if regalloc.uses_stack(i):
+                    result.stack_accesses += 1
+
+    exe = asm_file.with_suffix("")
+    helpers: List[Path] = [
+        basic.HELPER_OBJECTS.get(f, basic.GCC_COMPILE_OPTIONS)
+        for f in get_link_args(program)
+    ]
+    link_options = ["-lm"] if basic.needs_mathlib(program) else []
+    link_args: List[Union[str, Path]] = ["gcc", asm_file, *helpers, *link_options]
+    proc = run_phase(LINK, link_args + ["-o", exe], None)
+    if proc.returncode != 0:
+        return LevelResult(error=f"couldn't link assembly:\n{proc.stderr}")
+    result.exe = exe
+    return result
+
+
+def measure(
+    program: Path,
+    result: LevelResult,
+    repeat: int,
+    warmup: int,
+    run_timeout: Optional[float],
+) -> None:
+    """Run a program's executable several times, recording how long each run took
+    and making sure it gives the expected result every time"""
+    assert result.exe is not None  # placate mypy
+    expected = basic.EXPECTED_RESULTS[basic.get_props_key(program)]
+    for i in range(warmup + repeat):
+        phases: List[Phase] = []
+        try:
+            proc = run_phase(RUN, [result.exe], phases, timeout=run_timeout)
+        except LimitExceeded as err:
+            result.error = str(err)
+            return
+        if proc.returncode != expected["return_code"]:
+            result.error = (
+                f"expected exit code {expected['return_code']}, got {proc.returncode}"
+            )
+            return
+        if proc.stdout != expected.get("stdout", ""):
+            result.error = "wrong output"
+            return
+        wall_time = phases[-1].wall_time
+        if i >= warmup and wall_time is not None:
+            result.times.append(wall_time)
+
+
+def optimization_matrix(
+    compiler: Path,
+    programs: List[Path],
+    levels: Sequence[Level],
+    *,
+    repeat: int,
+    warmup: int,
+    jobs: int,
+    run_timeout: Optional[float],
+) -> Dict[str, Any]:
+    """Build every program at every optimization level, then run each executable
+
+    We build the programs in parallel, then run them one at a time
+    so the timings don't interfere with each other.
+
+    Args:
+        compiler: absolute path to compiler under test
+        programs: absolute paths to programs to build
+        levels: optimization levels, from least to most optimized
+        repeat: how many times to measure each executable
+        warmup: how many times to run each executable before we start measuring
+        jobs: how many programs to build at once
+        run_timeout: how long each executable may run, in seconds (None for no limit)
+
+    Returns:
+        JSON-serializable results:
+            {"kind": "matrix", "repeat": ..., "warmup": ...,
+             "levels": [{"name": ..., "options": [...]}],
+             "programs": {path: {level name: {"instructions": ..., "stack_accesses": ...,
+                                              "times": [...], "median": ...}
+                                             or {"error": ...}}}}
+    """
+    with tempfile.TemporaryDirectory(prefix="test_compiler_matrix_") as tmp:
+        scratch_root = Path(tmp)
+        jobs_list = [
+            (program, level_idx)
+            for program in programs
+            for level_idx in range(len(levels))
+        ]
+        # every build gets its own scratch directory, since programs in the same
+        # directory share headers that copy_to_scratch would otherwise overwrite
+        # while another build is reading them
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            built = list(
+                executor.map(
+                    lambda job_idx: build(
+                        compiler,
+                        levels[jobs_list[job_idx][1]][1],
+                        jobs_list[job_idx][0],
+                        scratch_root / str(job_idx),
+                    ),
+                    range(len(jobs_list)),
+                )
+            )
+        for (program, _), result in zip(jobs_list, built):
+            if result.error is None:
+                measure(program, result, repeat, warmup, run_timeout)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for (program, level_idx), result in zip(jobs_list, built):
+        key = str(program.relative_to(basic.TEST_DIR.resolve()))
+        results.setdefault(key, {})[levels[level_idx][0]] = result.to_json()
+    return {
+        "kind": "matrix",
+        "repeat": repeat,
+        "warmup": warmup,
+        "levels": [{"name": name, "options": options} for name, options in levels],
+        "programs": results,
+    }
+
+
+def format_matrix(results: Dict[str, Any]) -> str:
+    """Format optimization matrix results as a table
+
+    For each program, show its instruction count, stack accesses, and median run time at each
+    level. Then, for each level, show the total of each metric over all the programs
+    we built at every level, and the change from the previous level.
+    """
+    level_names = [level["name"] for level in results["levels"]]
+    # (key in results, column label, how to format it)
+    metrics: List[Tuple[str, str, Callable[[Dict[str, Any]], str]]] = [
+        ("instructions", "insns", lambda r: str(r["instructions"])),
+        ("stack_accesses", "stack", lambda r: str(r["stack_accesses"])),
+        ("median", "ms", lambda r: f"{r['median'] * 1000:.2f}"),
+    ]
+    width = max([len(k) for k in results["programs"]] + [len("program")])
+    col = max(max(len(n) for n in level_names), 10)
+    header = f"{'program':<{width}}  {'':5}" + "".join(
+        f"  {n:>{col}}" for n in level_names
+    )
+    lines = [header, "-" * len(header)]
+
+    totals = {name: [0.0, 0.0, 0.0] for name in level_names}
+    failures: List[str] = []
+    for program, program_results in results["programs"].items():
+        for metric_idx, (_, label, fmt) in enumerate(metrics):
+            cells = [
+                "error" if "error" in program_results[n] else fmt(program_results[n])
+                for n in level_names
+            ]
+            name = program if metric_idx == 0 else ""
+            lines.append(
+                f"{name:<{width}}  {label:5}" + "".join(f"  {c:>{col}}" for c in cells)
+            )
+        errors = [
+            (n, program_results[n]["error"])
+            for n in level_names
+            if "error" in program_results[n]
+        ]
+        if errors:
+            failures.extend(f"{program} ({n}): {msg}" for n, msg in errors)
+            continue
+        for n in level_names:
+            for metric_idx, (key, _, _) in enumerate(metrics):
+                totals[n][metric_idx] += program_results[n][key]
+
+    lines.append("")
+    lines.append("Totals over programs built at every level (change from previous level):")
+    # totals for the previous level (empty for the first level)
+    previous: List[float] = []
+    for n in level_names:
+        current = totals[n]
+        cells = []
+        for metric_idx, (_, label, _) in enumerate(metrics):
+            value = (
+                f"{current[metric_idx] * 1000:.1f}ms"
+                if label == "ms"
+                else f"{int(current[metric_idx])} {label}"
+            )
+            if previous and previous[metric_idx]:
+                change = current[metric_idx] / previous[metric_idx] - 1
+                value += f" ({change:+.1%})"
+            cells.append(value)
+        lines.append(f"  {n:>{col}}: " + ", ".join(cells))
+        previous = current
+
+    if failures:
+        lines.append("")
+        lines.append(f"{len(failures)} build(s) failed:")
+        lines.extend(f"  {f.splitlines()[0]}" for f in failures)
+    return "\n".join(lines)
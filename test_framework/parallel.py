@@ -0,0 +1,230 @@
+"""Run tests concurrently but report their results in a deterministic order"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import TracebackType
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type, Union
+
+from .durations import DurationsDB, longest_first, predict_makespan
+
+# sys.exc_info()-style tuple describing a failure or error
+ErrInfo = Union[
+    Tuple[Type[BaseException], BaseException, TracebackType], Tuple[None, None, None]
+]
+
+
+class RecordingResult(unittest.TestResult):
+    """Record everything that happens during a test so we can replay it later.
+
+    Each test runs in a worker thread with its own RecordingResult.
+    The main thread then replays the recorded events, in the original test order,
+    on the real (not thread-safe) result object, so the report looks exactly
+    like it would if we'd run the tests one at a time.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.events: List[Tuple[str, Tuple[Any, ...]]] = []
+        # how long the test took, in seconds, and when it finished (from time.perf_counter)
+        self.elapsed: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def addSuccess(self, test: unittest.TestCase) -> None:
+        self.events.append(("addSuccess", (test,)))
+
+    def addFailure(self, test: unittest.TestCase, err: ErrInfo) -> None:
+        self.events.append(("addFailure", (test, err)))
+
+    def addError(self, test: unittest.TestCase, err: ErrInfo) -> None:
+        self.events.append(("addError", (test, err)))
+
+    def addSkip(self, test: unittest.TestCase, reason: str) -> None:
+        self.events.append(("addSkip", (test, reason)))
+
+    def addExpectedFailure(self, test: unittest.TestCase, err: ErrInfo) -> None:
+        self.events.append(("addExpectedFailure", (test, err)))
+
+    def addUnexpectedSuccess(self, test: unittest.TestCase) -> None:
+        self.events.append(("addUnexpectedSuccess", (test,)))
+
+    def addSubTest(
+        self,
+        test: unittest.TestCase,
+        subtest: unittest.TestCase,
+        err: Optional[ErrInfo],
+    ) -> None:
+        self.events.append(("addSubTest", (test, subtest, err)))
+
+    def addDuration(self, test: unittest.TestCase, elapsed: float) -> None:
+        # only called on Python 3.12+
+        self.events.append(("addDuration", (test, elapsed)))
+
+    def wasSuccessful(self) -> bool:
+        for method_name, args in self.events:
+            if method_name in ["addFailure", "addError", "addUnexpectedSuccess"]:
+                return False
+            if method_name == "addSubTest" and args[2] is not None:
+                return False
+        return True
+
+    def skipped_any(self) -> bool:
+        return any(method_name == "addSkip" for method_name, _ in self.events)
+
+    def replay(self, test: unittest.TestCase, result: unittest.TestResult) -> None:
+        """Report the recorded events for one test to another result object"""
+        result.startTest(test)
+        for method_name, args in self.events:
+            method = getattr(result, method_name, None)
+            if method is not None:  # e.g. addDuration is missing before 3.12
+                method(*args)
+        result.stopTest(test)
+
+
+def iter_tests(suite: unittest.TestSuite) -> Iterator[unittest.TestCase]:
+    """Flatten a (possibly nested) test suite into individual test cases"""
+    for t in suite:
+        if isinstance(t, unittest.TestSuite):
+            yield from iter_tests(t)
+        else:
+            yield t
+
+
+class ParallelTestSuite(unittest.TestSuite):
+    """A test suite that distributes its tests across a pool of worker threads.
+
+    Threads are fine here (rather than processes) because nearly all the work in each test
+    happens in subprocesses: the compiler under test, gcc, and the test executable.
+
+    Every test compiles its programs in its own scratch directory (see TestChapter.setUp),
+    so any two tests can safely run at the same time.
+
+    Class-level fixtures (setUpClass/tearDownClass) run in the main thread,
+    before and after all the tests.
+
+    If we're given a database of how long each test took in earlier runs, we start the
+    slowest tests first, predict how long the whole run will take (the makespan),
+    and record the new durations in the database.
+    """
+
+    def __init__(
+        self,
+        tests: unittest.TestSuite,
+        jobs: int,
+        durations: Optional[DurationsDB] = None,
+    ) -> None:
+        super().__init__(iter_tests(tests))
+        self.jobs = jobs
+        self.durations = durations
+        # how many tests had durations from earlier runs, the predicted makespan
+        # (if any of them did), and the actual makespan, all set by run()
+        self.known_durations = 0
+        self.predicted_makespan: Optional[float] = None
+        self.actual_makespan: Optional[float] = None
+        self.failfast = False
+        # set when we should stop starting new tests (e.g. because of --failfast or ctrl-C)
+        self.stop_event = threading.Event()
+
+    def run_test(self, test: unittest.TestCase) -> Optional[RecordingResult]:
+        """Run a single test and record its result.
+        Returns None if we skipped this test because the run was stopped early."""
+        if self.stop_event.is_set():
+            return None
+        test_result = RecordingResult()
+        start = time.perf_counter()
+        test(test_result)
+        test_result.finished = time.perf_counter()
+        test_result.elapsed = test_result.finished - start
+        if self.failfast and not test_result.wasSuccessful():
+            # don't wait for the main thread to replay this failure before stopping
+            self.stop_event.set()
+        return test_result
+
+    def set_up_classes(
+        self, tests: List[unittest.TestCase], result: unittest.TestResult
+    ) -> Tuple[List[unittest.TestCase], List[Type[unittest.TestCase]]]:
+        """Call setUpClass on every test class, in order.
+
+        If it fails, report an error for each of that class's tests instead of running them.
+
+        Returns:
+            the tests we should still run, and the classes that were set up successfully
+        """
+        runnable: List[unittest.TestCase] = []
+        ready: List[Type[unittest.TestCase]] = []
+        failed: Dict[Type[unittest.TestCase], ErrInfo] = {}
+        for test in tests:
+            cls = test.__class__
+            if cls not in ready and cls not in failed:
+                if getattr(cls, "__unittest_skip__", False):
+                    # TestCase.run will report each test as skipped
+                    ready.append(cls)
+                else:
+                    try:
+                        cls.setUpClass()
+                        ready.append(cls)
+                    except Exception:  # pylint: disable=broad-except
+                        failed[cls] = sys.exc_info()
+            if cls in failed:
+                result.startTest(test)
+                result.addError(test, failed[cls])
+                result.stopTest(test)
+            else:
+                runnable.append(test)
+        return runnable, ready
+
+    def run(
+        self, result: unittest.TestResult, debug: bool = False
+    ) -> unittest.TestResult:
+        self.failfast = getattr(result, "failfast", False)
+        tests = list(iter_tests(self))
+        tests, ready_classes = self.set_up_classes(tests, result)
+        schedule = list(range(len(tests)))
+        if self.durations is not None:
+            estimates, self.known_durations = self.durations.estimate(
+                [test.id() for test in tests]
+            )
+            schedule = longest_first(schedule, estimates)
+            if self.known_durations:
+                self.predicted_makespan = predict_makespan(
+                    [estimates[i] for i in schedule], self.jobs
+                )
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                start = time.perf_counter()
+                # the executor starts tests in the order we submit them
+                futures: Dict[int, Future[Optional[RecordingResult]]] = {
+                    i: executor.submit(self.run_test, tests[i]) for i in schedule
+                }
+                try:
+                    # replay results in the original order, as soon as they're available
+                    for i, test in enumerate(tests):
+                        recorded = futures[i].result()
+                        if result.shouldStop or recorded is None:
+                            # stop reporting results, like TestSuite.run does
+                            break
+                        recorded.replay(test, result)
+                        if recorded.finished is not None and recorded.elapsed is not None:
+                            self.actual_makespan = max(
+                                self.actual_makespan or 0.0, recorded.finished - start
+                            )
+                            # a cached or skipped test finishes almost instantly,
+                            # which says nothing about how long it takes to run
+                            if (
+                                self.durations is not None
+                                and not getattr(test, "cached", False)
+                                and not recorded.skipped_any()
+                            ):
+                                self.durations.record(test.id(), recorded.elapsed)
+                finally:
+                    # don't start any more tests if we're bailing out early
+                    self.stop_event.set()
+        finally:
+            for cls in ready_classes:
+                if not getattr(cls, "__unittest_skip__", False):
+                    cls.tearDownClass()
+        return result
@@ -2,9 +2,9 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import FrozenInstanceError, dataclass
 from enum import Enum, auto
-from typing import List, Optional, Union
+from typing import Any, Iterable, NoReturn, Optional, Tuple, Union
 
 
 # Operands ########################
@@ -77,18 +77,78 @@ class Operator(Enum):
 
 # Expression representing an offset from some register
 # all we do with these is compare them so we don't need a more structured representation here
-# use List here for backwards compatibility with Python 3.8
-Expr = List[Union[int, str, Operator]]
+# use Tuple here for backwards compatibility with Python 3.8
+ExprTerm = Union[int, str, Operator]
+Expr = Tuple[ExprTerm, ...]
 
 
-@dataclass
-class Memory:
+class Immutable:
+    """Base class for operands and instructions, which can't be changed once created.
+
+    That makes them hashable, so we can put them in sets and use them as dict keys.
+    Subclasses list their fields in __slots__, in the same order as their __init__
+    parameters. (Slots use less memory than a __dict__, and large assembly files have
+    hundreds of thousands of these.) __init__ sets each field with object.__setattr__,
+    and sets _hash to the hash of all the fields.
+    """
+
+    __slots__ = ("_hash",)
+    _hash: int
+
+    def fields(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setattr__(self, name: str, value: Any) -> NoReturn:
+        raise FrozenInstanceError(f"cannot assign to field '{name}'")
+
+    def __delattr__(self, name: str) -> NoReturn:
+        raise FrozenInstanceError(f"cannot delete field '{name}'")
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        assert isinstance(other, Immutable)  # placate mypy
+        # comparing hashes first makes it cheap to search a list for an instruction
+        return self._hash == other._hash and self.fields() == other.fields()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{name}={value!r}" for name, value in zip(self.__slots__, self.fields())
+        )
+        return f"{self.__class__.__name__}({fields})"
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # pickle (e.g. in the parse cache) can't set our fields directly, so recreate
+        # the object by calling its constructor
+        return (self.__class__, self.fields())
+
+
+class Memory(Immutable):
     """Memory operands (including RIP-relative, stack, indexed)"""
 
-    disp: Optional[Expr] = None
-    base: Optional[Register] = None
-    idx: Optional[Register] = None
-    scale: int = 1  # defaults to 1 if not specified
+    __slots__ = ("disp", "base", "idx", "scale")
+    disp: Optional[Expr]
+    base: Optional[Register]
+    idx: Optional[Register]
+    scale: int  # defaults to 1 if not specified
+
+    def __init__(
+        self,
+        disp: Optional[Iterable[ExprTerm]] = None,
+        base: Optional[Register] = None,
+        idx: Optional[Register] = None,
+        scale: int = 1,
+    ) -> None:
+        # accept any iterable (e.g. a list), but store a tuple so it can't change
+        disp = None if disp is None else tuple(disp)
+        object.__setattr__(self, "disp", disp)
+        object.__setattr__(self, "base", base)
+        object.__setattr__(self, "idx", idx)
+        object.__setattr__(self, "scale", scale)
+        object.__setattr__(self, "_hash", hash((disp, base, idx, scale)))
 
     def __str__(self) -> str:
         disp_str = "".join(map(str, self.disp or []))
@@ -154,12 +214,19 @@ class Opcode(Enum):
         return self.name.lower()
 
 
-@dataclass
-class Instruction:
-    """An assembly instruction consists of an opcode and a list of operands"""
+class Instruction(Immutable):
+    """An assembly instruction consists of an opcode and a tuple of operands"""
 
+    __slots__ = ("opcode", "operands")
     opcode: Opcode
-    operands: list[Operand]
+    operands: Tuple[Operand, ...]
+
+    def __init__(self, opcode: Opcode, operands: Iterable[Operand]) -> None:
+        # accept any iterable (e.g. a list), but store a tuple so it can't change
+        operands = tuple(operands)
+        object.__setattr__(self, "opcode", opcode)
+        object.__setattr__(self, "operands", operands)
+        object.__setattr__(self, "_hash", hash((opcode, operands)))
 
     def __str__(self) -> str:
         str_operands = ", ".join(map(str, self.operands))
@@ -0,0 +1,184 @@
+"""Measure how fast we can tokenize and parse large assembly files
+
+Usage:
+    python3 -m test_framework.parser.bench [--size MB] [--repeat N] [--function NAME]
+        [FILE.s ...]
+    python3 -m test_framework.parser.bench --scaling [--repeat N]
+
+Without any files, this benchmarks a synthetic assembly file of about --size megabytes,
+made up of functions like the ones our test programs compile to (named fun0, fun1, etc.).
+With --function, this also measures how long it takes to parse just that function.
+
+With --scaling, this measures how long it takes to parse a single very long statement
+(an instruction with many operands, or a directive with many arguments) as the statement
+gets longer. The time per operand should stay about the same.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from . import parse, tokenize
+
+FUNCTION_TEMPLATE = """\
+    .globl fun{i}
+    .type fun{i}, @function
+fun{i}:
+    pushq %rbp
+    movq %rsp, %rbp
+    subq $48, %rsp
+    movl %edi, -4(%rbp)
+    movl -4(%rbp), %eax
+    addl $1, %eax # increment
+    imull -8(%rbp), %eax
+    movl %eax, -12(%rbp,%rcx,4)
+    leaq .Lstr.{i}(%rip), %rdi
+    movsd .Ldbl(%rip), %xmm0
+    cmpl $10, %eax
+    jle .L{i}_end
+    movl $-2147483648, %edx
+    call fun{j}@PLT
+.L{i}_end:
+    movq %rbp, %rsp
+    popq %rbp
+    ret
+    .section .rodata
+.Lstr.{i}:
+    .asciz "hello, world\\n"
+    .text
+"""
+
+
+def synthetic_assembly(size: int) -> str:
+    """Generate about size bytes of assembly code"""
+    functions: List[str] = []
+    total = 0
+    while total < size:
+        i = len(functions)
+        function = FUNCTION_TEMPLATE.format(i=i, j=i // 2)
+        functions.append(function)
+        total += len(function)
+    return "    .text\n" + "".join(functions)
+
+
+def best_time(action: Callable[[], object], repeat: int) -> float:
+    """Run action several times and return the fastest time, in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def tokenize_file(path: Path) -> int:
+    """Tokenize a file and return the number of tokens"""
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for _ in tokenize.tokenize(f))
+
+
+def benchmark_file(path: Path, repeat: int, function: Optional[str] = None) -> str:
+    """Measure how long it takes to tokenize and parse one file (or one function in it)
+
+    Returns:
+        a line summarizing the results
+    """
+    megabytes = path.stat().st_size / 2**20
+    token_count = tokenize_file(path)
+    tokenize_time = best_time(lambda: tokenize_file(path), repeat)
+    parse_time = best_time(lambda: parse.parse_file(path), repeat)
+    summary = (
+        f"{path.name}: {megabytes:.1f} MB, {token_count} tokens\n"
+        f"  tokenize: {tokenize_time:.3f}s ({megabytes / tokenize_time:.1f} MB/s, "
+        f"{token_count / tokenize_time / 1e6:.2f}M tokens/s)\n"
+        f"  parse:    {parse_time:.3f}s ({megabytes / parse_time:.1f} MB/s)"
+    )
+    if function is not None:
+        function_time = best_time(
+            lambda: parse.parse_file(path, functions={function}), repeat
+        )
+        summary += f"\n  parse {function}: {function_time:.3f}s"
+    return summary
+
+
+# statements to parse with --scaling, each repeating one operand many times
+LONG_STATEMENTS = {
+    "instruction": ("pushq ", "8(%rbp,%rax,4)"),
+    ".quad table": (".quad ", "123"),
+}
+
+
+def benchmark_scaling(repeat: int) -> str:
+    """Measure how parse time grows with the number of operands in a statement
+
+    Returns:
+        a table with the time per operand for each kind of statement and length
+    """
+    lines = []
+    for name, (prefix, operand) in LONG_STATEMENTS.items():
+        for count in [1000, 2000, 4000, 8000, 16000]:
+            statement = prefix + ", ".join([operand] * count) + "\n"
+            seconds = best_time(
+                lambda: parse.parse_statement(
+                    tokenize.tokenize(io.StringIO(statement))
+                ),
+                repeat,
+            )
+            lines.append(
+                f"{name:<12} {count:>6} operands: {seconds:.4f}s "
+                f"({seconds / count * 1e6:.2f} us/operand)"
+            )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", type=Path, nargs="*", metavar="FILE")
+    parser.add_argument(
+        "--size",
+        type=float,
+        default=4.0,
+        metavar="MB",
+        help="Size of the synthetic assembly file to benchmark if no files are given",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        metavar="N",
+        help="Time each step N times and report the fastest",
+    )
+    parser.add_argument(
+        "--function",
+        metavar="NAME",
+        help="Also measure how long it takes to parse only this function",
+    )
+    parser.add_argument(
+        "--scaling",
+        action="store_true",
+        help="Measure how parse time grows with the number of operands in a statement",
+    )
+    args = parser.parse_args()
+
+    if args.scaling:
+        print(benchmark_scaling(args.repeat))
+        return
+
+    if args.files:
+        for path in args.files:
+            print(benchmark_file(path, args.repeat, args.function))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "synthetic.s"
+        path.write_text(synthetic_assembly(int(args.size * 2**20)), encoding="utf-8")
+        print(benchmark_file(path, args.repeat, args.function))
+
+
+if __name__ == "__main__":
+    main()
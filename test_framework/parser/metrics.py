@@ -0,0 +1,60 @@
+"""Static code-quality metrics for parsed assembly functions"""
+
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict
+
+from .asm import AssemblyFunction, Immediate, Instruction, Memory, Opcode, Register
+
+
+@dataclass
+class FunctionMetrics:
+    """Profile of one assembly function"""
+
+    # number of instructions, not counting labels
+    instructions: int = 0
+    # number of instructions with each opcode (e.g. {"mov": 12, "add": 3})
+    opcodes: Dict[str, int] = field(default_factory=dict)
+    # number of memory operands, not counting lea's source operand (which isn't accessed)
+    memory_operands: int = 0
+    # number of instructions that access the stack through RBP,
+    # i.e. spilled pseudoregisters (or, before register allocation, every variable)
+    stack_accesses: int = 0
+    pushes: int = 0
+    pops: int = 0
+    # size of the stack frame, in bytes, from the largest "sub $N, %rsp" instruction
+    frame_size: int = 0
+    # mov instructions from one register to another, which register coalescing should remove
+    reg_to_reg_movs: int = 0
+
+
+def function_metrics(fun: AssemblyFunction) -> FunctionMetrics:
+    """Compute static metrics for one assembly function"""
+    metrics = FunctionMetrics()
+    opcodes: Counter[str] = Counter()
+    for i in fun.instructions:
+        if not isinstance(i, Instruction):
+            # it's a label
+            continue
+        metrics.instructions += 1
+        opcodes[str(i.opcode)] += 1
+        if i.opcode != Opcode.LEA:
+            memory_operands = [op for op in i.operands if isinstance(op, Memory)]
+            metrics.memory_operands += len(memory_operands)
+            if any(op.base == Register.BP for op in memory_operands):
+                metrics.stack_accesses += 1
+        if i.opcode == Opcode.PUSH:
+            metrics.pushes += 1
+        elif i.opcode == Opcode.POP:
+            metrics.pops += 1
+        elif i.opcode == Opcode.SUB and i.operands[1:] == (Register.SP,):
+            if isinstance(i.operands[0], Immediate):
+                metrics.frame_size = max(metrics.frame_size, int(i.operands[0]))
+        elif i.opcode == Opcode.MOV and all(
+            isinstance(op, Register) for op in i.operands
+        ):
+            metrics.reg_to_reg_movs += 1
+    metrics.opcodes = dict(opcodes)
+    return metrics
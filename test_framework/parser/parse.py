@@ -13,11 +13,12 @@ from __future__ import annotations
 
 import re
 import sys
+from collections import deque
 from pathlib import Path
-from typing import Generator, List, Optional, Union
+from typing import Collection, Deque, Generator, List, Optional, Union
 
 from . import asm, tokenize
-from .asm import Expr, Immediate, Opcode, Operand, Operator, Register
+from .asm import Expr, ExprTerm, Immediate, Opcode, Operand, Operator, Register
 from .tokenize import Token, TokType
 
 
@@ -42,12 +43,21 @@ def is_valid_c_identifier(lbl: str) -> bool:
     return re.fullmatch(regex, lbl) is not None
 
 
-def expect_next(*, toks: List[Token], expected: TokType) -> None:
+# The parse_* functions below consume tokens from the front of a deque that holds
+# the tokens of the current statement, so consuming a token takes constant time
+# no matter how many tokens are left (unlike list.pop(0))
+Tokens = Deque[Token]
+
+# tokens that end a statement
+STATEMENT_BREAKS = frozenset([TokType.SEMICOLON, TokType.NEWLINE])
+
+
+def expect_next(*, toks: Tokens, expected: TokType) -> None:
     """Consume next token and fail if it isn't what we expect"""
-    next_tok = toks.pop(0)
+    next_tok = toks.popleft()
     if next_tok.tok_type != expected:
         raise ParseError(
-            f"Expected {expected} but found {next_tok}. Remaining tokens: {toks}"
+            f"Expected {expected} but found {next_tok}. Remaining tokens: {list(toks)}"
         )
 
 
@@ -222,7 +232,7 @@ REG_ALIASES = {
 }
 
 
-def parse_register(toks: list[Token]) -> tuple[Register, Optional[int]]:
+def parse_register(toks: Tokens) -> tuple[Register, Optional[int]]:
     """Parse register and infer its size in bytes
 
     <reg> ::= "%" <reg-alias>
@@ -230,14 +240,14 @@ def parse_register(toks: list[Token]) -> tuple[Register, Optional[int]]:
     """
 
     expect_next(toks=toks, expected=TokType.PERCENT)
-    reg_name = toks.pop(0).tok_str
+    reg_name = toks.popleft().tok_str
     try:
         return REG_ALIASES[reg_name]
     except KeyError:
         raise ParseError(f"expected register name after % but found {reg_name}")
 
 
-def parse_immediate(toks: list[Token]) -> Immediate:
+def parse_immediate(toks: Tokens) -> Immediate:
     """Parse an immediate value
 
     NOTE this won't correctly normalize signed/unsigned representations of same value
@@ -249,7 +259,7 @@ def parse_immediate(toks: list[Token]) -> Immediate:
     """
     expect_next(toks=toks, expected=TokType.DOLLAR)
 
-    next_tok = toks.pop(0)
+    next_tok = toks.popleft()
     tok_type = next_tok.tok_type
 
     if tok_type == TokType.INT:
@@ -257,7 +267,7 @@ def parse_immediate(toks: list[Token]) -> Immediate:
         return Immediate(val)
     if tok_type in [TokType.PLUS_SIGN, TokType.MINUS_SIGN]:
         # next tok should val
-        num_tok = toks.pop(0)
+        num_tok = toks.popleft()
         if num_tok.tok_type != TokType.INT:
             raise ParseError(f"bad immediate value: ${next_tok}{num_tok.tok_str}")
         val = int(num_tok.tok_str, base=0)
@@ -267,15 +277,15 @@ def parse_immediate(toks: list[Token]) -> Immediate:
     raise ParseError(f"Bad immediate value: ${next_tok}")
 
 
-def parse_expr(toks: list[Token]) -> Expr:
+def parse_expr(toks: Tokens) -> Expr:
     """Parse an expression (used as displacement in memory operand)
     NOTE: we don't normalize these, so +10(%rbp) and 10(%rbp) will NOT compare equal
 
     <expr> ::= { <symbol> | <int> | "+" | "-" }+
     """
-    expr: Expr = []
+    expr: List[ExprTerm] = []
     while True:
-        next_tok: Token = toks.pop(0)
+        next_tok: Token = toks.popleft()
         tok_typ = next_tok.tok_type
         if tok_typ == TokType.SYMBOL:
             expr.append(next_tok.tok_str)
@@ -288,13 +298,13 @@ def parse_expr(toks: list[Token]) -> Expr:
         elif tok_typ == TokType.AT:
             expr.append(Operator.AT)
         else:
-            # we didn't consume this so put it back on the list
-            toks.insert(0, next_tok)
+            # we didn't consume this so put it back
+            toks.appendleft(next_tok)
             break  # we're done
-    return expr
+    return tuple(expr)
 
 
-def parse_memory_operand(toks: List[Token]) -> tuple[Operand, Optional[int]]:
+def parse_memory_operand(toks: Tokens) -> tuple[Operand, Optional[int]]:
     """
     Parse memory operand
 
@@ -321,30 +331,31 @@ def parse_memory_operand(toks: List[Token]) -> tuple[Operand, Optional[int]]:
         base, _ = parse_register(toks)
 
     # base register must be followed by close paren or comma
-    next_tok = toks.pop(0)
+    next_tok = toks.popleft()
     if next_tok.tok_type == TokType.CLOSE_PAREN:
         # we're done, no index or scale
         return asm.Memory(disp=disp, base=base), None
     # otherwise next token must be comma
     if next_tok.tok_type != TokType.COMMA:
         raise ParseError(
-            "Unexpected token after base register in memory operand: " + str(toks)
+            "Unexpected token after base register in memory operand: "
+            + str(list(toks))
         )
 
     # now parse index and scale
     next_tok_type = toks[0].tok_type
     if next_tok_type == TokType.INT:
         # it's a scale
-        scale = int(toks.pop(0).tok_str, base=0)
+        scale = int(toks.popleft().tok_str, base=0)
     else:
         # it's an index register, possibly followed by scale
         idx, _ = parse_register(toks)
 
         # if there's a comma, consume it and check for scale
         if toks[0].tok_type == TokType.COMMA:
-            toks.pop(0)
+            toks.popleft()
             if toks[0].tok_type == TokType.INT:  # type: ignore[comparison-overlap]
-                scale = int(toks.pop(0).tok_str, base=0)
+                scale = int(toks.popleft().tok_str, base=0)
 
     expect_next(toks=toks, expected=TokType.CLOSE_PAREN)
 
@@ -369,7 +380,7 @@ def fix_immediate(op: Operand, size: Optional[int]) -> Operand:
     return op
 
 
-def parse_operand(toks: List[Token]) -> tuple[Operand, Optional[int]]:
+def parse_operand(toks: Tokens) -> tuple[Operand, Optional[int]]:
     """Parse the next operand in list of tokens
     <operand> ::= <reg> | <immediate> | <symbol>["@" <symbol>]
     """
@@ -381,13 +392,13 @@ def parse_operand(toks: List[Token]) -> tuple[Operand, Optional[int]]:
         return parse_immediate(toks), None
     if len(toks) == 1 and start_tok_type == TokType.SYMBOL:
         # it's a jump target or function name
-        target = toks.pop(0).tok_str
+        target = toks.popleft().tok_str
         return (target, None)
     if start_tok_type == TokType.STAR:
         # jump targets like *%rax (not supported in the book)
         # HACK just return the register itself as an operand,
         # since we don't analyze jump targets aside from function names
-        toks.pop(0)
+        toks.popleft()
         return parse_register(toks)
     if (
         len(toks) == 3
@@ -436,7 +447,7 @@ NON_TEXT_SECTIONS = [
 ]
 
 
-def parse_directive(tok_list: List[Token]) -> Directive:
+def parse_directive(tok_list: Tokens) -> Directive:
     """Parse a directive and figure out whether it enters the text section, exits it, or neither
 
     NOTE: unlike earlier parse_* statements, we don't need to consume these tokens.
@@ -484,11 +495,29 @@ def parse_directive(tok_list: List[Token]) -> Directive:
     return Directive()
 
 
+# parse_directive only looks at this many tokens at the start of a directive
+DIRECTIVE_HEAD_LENGTH = 4
+
+
+def skip_statement(tokens: Generator[Token, None, None]) -> None:
+    """Consume the rest of the current statement without parsing it"""
+    for tok in tokens:
+        if tok.tok_type in STATEMENT_BREAKS:
+            return
+
+
 def parse_statement(
     tokens: Generator[Token, None, None],
-) -> Union[asm.AsmItem, Directive]:
+    *,
+    skip_instructions: bool = False,
+) -> Union[asm.AsmItem, Directive, None]:
     """Parse the next instruction, label or directive
 
+    Args:
+        tokens: the token stream for the whole file
+        skip_instructions: if the next statement is an instruction, consume its tokens
+            without parsing it and return None
+
     Grammar:
     <statement> ::= <label> | <instruction> | <directive>
     <label> ::= <symbol> ":"
@@ -500,7 +529,7 @@ def parse_statement(
     # skip empty lines
     # # this will raise StopIteration if we run out of tokens
     first_token = next(tokens)
-    while first_token.tok_type in [TokType.SEMICOLON, TokType.NEWLINE]:
+    while first_token.tok_type in STATEMENT_BREAKS:
         first_token = next(tokens)
 
     # labels, instructions and directives all start with symbol token
@@ -518,21 +547,33 @@ def parse_statement(
         # note: if label is on its own line this won't consume the newline, which is fine
         return asm.Label(first_token.tok_str)
 
-    # it's a directive or instruction, collect all tokens until end of line
-    cur_line = [first_token]
-    while cur_token.tok_type not in [TokType.SEMICOLON, TokType.NEWLINE]:
-        cur_line.append(cur_token)
-        cur_token = next(tokens, nl)
-
-    if cur_line[0].tok_str.startswith("."):
+    if first_token.tok_str.startswith("."):
         # it's a directive - figure out whether it's text directive,
         # another section directive, or some other directive we don't care about
         # NOTE: we would treat floating-point values like .100 as directives
         # except that we should never see one at the start of a line
-        return parse_directive(cur_line)
+        # we only need the first few tokens of the directive; skip the rest
+        # (e.g. the contents of a big .quad table)
+        head = deque([first_token])
+        while cur_token.tok_type not in STATEMENT_BREAKS:
+            if len(head) < DIRECTIVE_HEAD_LENGTH:
+                head.append(cur_token)
+            cur_token = next(tokens, nl)
+        return parse_directive(head)
+
+    if skip_instructions:
+        if cur_token.tok_type not in STATEMENT_BREAKS:
+            skip_statement(tokens)
+        return None
+
+    # it's an instruction, collect all tokens until end of line
+    cur_line = deque([first_token])
+    while cur_token.tok_type not in STATEMENT_BREAKS:
+        cur_line.append(cur_token)
+        cur_token = next(tokens, nl)
 
     # it's an instruction
-    opcode_tok = cur_line.pop(0)
+    opcode_tok = cur_line.popleft()
     opcode, size = parse_opcode(opcode_tok.tok_str)
 
     # now parse operands
@@ -555,82 +596,119 @@ def parse_statement(
     return asm.Instruction(opcode, operands)
 
 
-def parse_file(filename: Path) -> dict[str, asm.AssemblyFunction]:
-    """Parse an assembly file"""
+def function_key(name: str) -> str:
+    """Get the name we use to look up a function: its name in the original C program
 
-    asm_functions: dict[str, asm.AssemblyFunction] = {}
+    On macOS, strip the leading underscore that's added to every C identifier.
+    """
+    if sys.platform == "darwin" and name.startswith("_"):
+        return name[1:]
+    return name
 
-    def remove_prefix(s: str, prefix: str) -> str:
-        """Backcompat-proof version of str.removeprefix"""
-        if sys.version_info >= (3, 9):
-            s.removeprefix(prefix)
-        if s.startswith(prefix):
-            return s[len(prefix) :]
-        return s
 
-    def add_fun(f: asm.AssemblyFunction) -> None:
-        if sys.platform == "darwin":
-            key = remove_prefix(f.name, "_")
-        else:
-            key = f.name
-        asm_functions[key] = f
+def parse_file(
+    filename: Path, functions: Optional[Collection[str]] = None
+) -> dict[str, asm.AssemblyFunction]:
+    """Parse an assembly file
 
+    Args:
+        filename: the assembly file to parse
+        functions: the names of the functions to parse (as they appear in the C program,
+            e.g. "target" rather than "_target" on macOS); by default, parse every function.
+            We skip over the instructions in any other function without parsing them,
+            and stop as soon as we've parsed every function we want.
+
+    Returns:
+        the parsed functions, keyed by name (as they appear in the C program)
+    """
     with open(filename, "r", encoding="utf-8") as f:
-        tokens = tokenize.tokenize(f)
-
-        # add labels and assembly instructions to current assembly function
-        # skip directives and labels outside of text section
-        current_function: Optional[asm.AssemblyFunction] = None
-        in_text_section = True
-
-        while True:
-            try:
-                asm_item = parse_statement(tokens)
-
-                if in_text_section:
-                    # use directives to track current section but don't add them to parsed function
-                    if isinstance(asm_item, Directive):
-                        if isinstance(asm_item, LeaveTextSection):
-                            # leaving the text section finishes the current function
-                            if current_function:
-                                add_fun(current_function)
-
-                            in_text_section = False
-                        # skip to next statement
-                        continue
-
-                    if isinstance(asm_item, asm.Label) and is_valid_c_identifier(
-                        asm_item
-                    ):
-                        # we've found start of a new function
-                        # NOTE: this assumes that we're not using internal labels
-                        # that could be C function names (which we shouldn't be doing,
-                        # since it's a potential naming conflict)
-                        if current_function:
-                            add_fun(current_function)
-                        current_function = asm.AssemblyFunction(
-                            name=asm_item, instructions=[]
-                        )
-
-                    elif current_function is None:
-                        if isinstance(asm_item, asm.Instruction):
-                            raise ParseError(
-                                f"instruction found outside of function: {asm_item}"
-                            )
-                        # if it's a label, fine to be outside a function;
-                        # it's just a static variable or something
-                    else:
-                        # add instruction to current function
-                        current_function.instructions.append(asm_item)
-
-                elif isinstance(asm_item, EnterTextSection):
-                    in_text_section = True
-
-                # if we're not in the text section and current statement doesn't put us back
-                # in the text section, just ignore it
-
-            except StopIteration:
-                break  # end of file
+        return parse_tokens(tokenize.tokenize(f), functions)
+
+
+def parse_tokens(
+    tokens: Generator[Token, None, None], functions: Optional[Collection[str]] = None
+) -> dict[str, asm.AssemblyFunction]:
+    """Parse a tokenized assembly file (see parse_file)"""
+
+    asm_functions: dict[str, asm.AssemblyFunction] = {}
+    wanted = None if functions is None else set(functions)
+
+    def add_fun(f: asm.AssemblyFunction) -> None:
+        asm_functions[function_key(f.name)] = f
+
+    # add labels and assembly instructions to current assembly function
+    # skip directives and labels outside of text section
+    current_function: Optional[asm.AssemblyFunction] = None
+    in_text_section = True
+    # whether we're in the body of a function we don't want to parse
+    in_skipped_function = False
+
+    while True:
+        # stop once we've parsed every function we want; if we're still in one of them,
+        # keep going in case it continues after some other section
+        if (
+            wanted is not None
+            and current_function is None
+            and wanted.issubset(asm_functions)
+        ):
+            break
+
+        try:
+            asm_item = parse_statement(
+                tokens,
+                skip_instructions=in_skipped_function or not in_text_section,
+            )
+        except StopIteration:
+            break  # end of file
+
+        if in_text_section:
+            # use directives to track current section but don't add them to parsed function
+            if isinstance(asm_item, Directive):
+                if isinstance(asm_item, LeaveTextSection):
+                    # leaving the text section finishes the current function
+                    if current_function:
+                        add_fun(current_function)
+
+                    in_text_section = False
+                # skip to next statement
+                continue
+
+            if asm_item is None:
+                # an instruction we skipped
+                continue
+
+            if isinstance(asm_item, asm.Label) and is_valid_c_identifier(asm_item):
+                # we've found start of a new function
+                # NOTE: this assumes that we're not using internal labels
+                # that could be C function names (which we shouldn't be doing,
+                # since it's a potential naming conflict)
+                if current_function:
+                    add_fun(current_function)
+                if wanted is None or function_key(asm_item) in wanted:
+                    current_function = asm.AssemblyFunction(
+                        name=asm_item, instructions=[]
+                    )
+                    in_skipped_function = False
+                else:
+                    current_function = None
+                    in_skipped_function = True
+
+            elif current_function is None:
+                if isinstance(asm_item, asm.Instruction):
+                    raise ParseError(
+                        f"instruction found outside of function: {asm_item}"
+                    )
+                # if it's a label, fine to be outside a function;
+                # it's just a static variable or something
+            else:
+                # add instruction to current function
+                current_function.instructions.append(asm_item)
+
+        elif isinstance(asm_item, EnterTextSection):
+            in_text_section = True
+
+        # if we're not in the text section and current statement doesn't put us back
+        # in the text section, just ignore it
 
     # we're done, append last function
     if current_function:
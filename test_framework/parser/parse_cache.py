@@ -0,0 +1,199 @@
+"""Memoize parsed assembly files, keyed by a hash of their contents
+
+The same assembly file is often parsed more than once: e.g. --collect-asm-metrics parses
+every file that a register allocation or TACKY optimization test then parses again to
+inspect its target function, and an optimization matrix or benchmark run often produces
+identical assembly for the same program under several configurations. ParseCache parses
+each distinct file once, keeps the most recently used results in memory, and can also
+store them on disk so later runs can reuse them.
+
+Parsed functions are shared by everyone who asks for them, so treat them as read-only.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Collection, Dict, Optional, Tuple
+
+from . import asm, parse, tokenize
+
+PARSER_DIR = Path(__file__).parent
+
+# how many parsed files to keep in memory
+DEFAULT_MAXSIZE = 32
+
+# default limit on the total size of the on-disk cache
+DEFAULT_MAX_DISK_BYTES = 256 * 2**20
+
+# maps function names to parsed functions
+Functions = Dict[str, asm.AssemblyFunction]
+
+# (hash of file contents, names of requested functions or None for all functions)
+Key = Tuple[str, Optional[Tuple[str, ...]]]
+
+
+def hash_parser() -> str:
+    """Hash the parser's source code, so we don't reuse results from an older parser"""
+    digest = hashlib.sha256()
+    for src in sorted(PARSER_DIR.glob("*.py")):
+        digest.update(src.name.encode() + b"\0" + src.read_bytes())
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """A cache of parsed assembly files
+
+    Entries are keyed by a SHA-256 hash of the file's contents, plus the functions that
+    were requested (see parse.parse_file). If we've already parsed every function in a
+    file, we can answer requests for any subset of them too.
+
+    The in-memory cache is a least-recently-used cache of up to maxsize entries.
+    If cache_dir is given, we also pickle each entry to a file in cache_dir; when the
+    files add up to more than max_disk_bytes, we delete the least recently used ones.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_MAXSIZE,
+        cache_dir: Optional[Path] = None,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    ) -> None:
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries: OrderedDict[Key, Functions] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.fingerprint = ""
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            self.fingerprint = hash_parser()
+
+    def parse_file(
+        self, filename: Path, functions: Optional[Collection[str]] = None
+    ) -> Functions:
+        """Parse an assembly file, or reuse the result of parsing an identical one
+
+        Args and return value are the same as parse.parse_file.
+        """
+        contents = Path(filename).read_bytes()
+        digest = hashlib.sha256(contents).hexdigest()
+        requested = None if functions is None else tuple(sorted(set(functions)))
+
+        cached = self.lookup((digest, requested))
+        if cached is None and requested is not None:
+            # if we parsed the whole file, we can use part of that result
+            everything = self.lookup((digest, None))
+            if everything is not None:
+                cached = {k: f for k, f in everything.items() if k in requested}
+        if cached is not None:
+            with self.lock:
+                self.hits += 1
+            return cached
+
+        with self.lock:
+            self.misses += 1
+        text = contents.decode("utf-8")
+        result = parse.parse_tokens(tokenize.tokenize(io.StringIO(text)), requested)
+        self.store((digest, requested), result)
+        return dict(result)
+
+    def lookup(self, key: Key) -> Optional[Functions]:
+        """Look up an entry in memory, then on disk"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return dict(self.entries[key])
+
+        path = self.entry_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                result: Functions = pickle.load(f)
+            # update the modification time, which we use to find the least recently used
+            # entries to evict
+            os.utime(path)
+        except (
+            OSError,
+            EOFError,
+            ValueError,
+            AttributeError,
+            ImportError,
+            pickle.UnpicklingError,
+        ):
+            # it's missing, or was written by an incompatible version of the parser
+            return None
+        self.remember(key, result)
+        return dict(result)
+
+    def store(self, key: Key, result: Functions) -> None:
+        """Add an entry to the cache"""
+        self.remember(key, result)
+        path = self.entry_path(key)
+        if path is None or self.cache_dir is None:
+            return
+        # write to a temporary file and then rename it,
+        # so concurrent test runs never see a partially-written entry
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict()
+
+    def remember(self, key: Key, result: Functions) -> None:
+        """Add an entry to the in-memory cache"""
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def entry_path(self, key: Key) -> Optional[Path]:
+        """Get the path to an entry in the on-disk cache (or None if there isn't one)"""
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha256(self.fingerprint.encode())
+        digest.update(key[0].encode())
+        digest.update(repr(key[1]).encode())
+        return self.cache_dir / f"{digest.hexdigest()}.pickle"
+
+    def evict(self) -> None:
+        """Delete the least recently used entries until cache_dir is small enough"""
+        assert self.cache_dir is not None  # placate mypy
+        entries = []
+        for path in self.cache_dir.glob("*.pickle"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # another process deleted it
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            total -= size
+
+
+# the cache used by the test framework; the test runner replaces this
+# to store parsed assembly on disk (see --parse-cache-dir)
+PARSE_CACHE = ParseCache()
+
+
+def parse_file(
+    filename: Path, functions: Optional[Collection[str]] = None
+) -> Functions:
+    """Parse an assembly file using PARSE_CACHE (see parse.parse_file)"""
+    return PARSE_CACHE.parse_file(filename, functions)
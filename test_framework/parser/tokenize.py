@@ -3,9 +3,8 @@ from __future__ import annotations
 
 import io
 import re
-from dataclasses import dataclass
 from enum import Enum, auto
-from typing import Generator
+from typing import Dict, Generator, NamedTuple
 
 
 class TokError(RuntimeError):
@@ -37,12 +36,34 @@ class TokType(Enum):
     STRING_LITERAL = auto()  # we don't actually track the values of these
 
 
-@dataclass
-class Token:
+class Token(NamedTuple):
+    # a named tuple rather than a dataclass because it's much cheaper to create,
+    # and large assembly files have millions of tokens
     tok_type: TokType
     tok_str: str
 
 
+# single-character tokens
+PUNCTUATION = {
+    ",": TokType.COMMA,
+    "(": TokType.OPEN_PAREN,
+    ")": TokType.CLOSE_PAREN,
+    "+": TokType.PLUS_SIGN,
+    "-": TokType.MINUS_SIGN,
+    ":": TokType.COLON,
+    "%": TokType.PERCENT,
+    "$": TokType.DOLLAR,
+    "@": TokType.AT,
+    "*": TokType.STAR,
+    ";": TokType.SEMICOLON,
+    "\n": TokType.NEWLINE,
+}
+
+# every occurrence of a single-character token is the same, so we share one Token for each
+PUNCTUATION_TOKENS: Dict[str, Token] = {
+    char: Token(tok_type, char) for char, tok_type in PUNCTUATION.items()
+}
+
 TOKENS = {
     # we recognize decimal and hexadecimal ints (not octal or binary)
     "INT": r"([0-9]+|0x[0-9a-f]+)\b",
@@ -55,22 +76,11 @@ TOKENS = {
     "SYMBOL": r"[\w.][\w.$]*",
     # NOTE: we accept \ followed by any digit as an escape sequence in a string literal
     "STRING_LITERAL": r'''"([^"\\\n]|\\.)*"''',
-    # single characters
-    "COMMA": r",",
-    "OPEN_PAREN": r"\(",
-    "CLOSE_PAREN": r"\)",
-    "PLUS_SIGN": r"\+",
-    "MINUS_SIGN": r"-",
-    "COLON": r":",
-    "PERCENT": r"%",
-    "DOLLAR": r"\$",
-    "AT": r"@",
-    "STAR": r"\*",
-    "SEMICOLON": r";",
-    "NEWLINE": r"\n",
+    # single characters (including newlines)
+    "PUNCTUATION": "[" + "".join(re.escape(char) for char in PUNCTUATION) + "]",
     # skip comments and whitespace
     # a comment matches anything from # to the end of the line, not counting the \n character
-    "SKIP": r"(#.*)|[ \r\t\f\v]",
+    "SKIP": r"(?:#.*|[ \r\t\f\v])+",
     # anything else is an error
     "ERROR": r".",
 }
@@ -80,12 +90,22 @@ TOKEN_PATTERN = re.compile(
     flags=re.IGNORECASE,
 )
 
+# map the group names in TOKEN_PATTERN that produce tokens with varying text to token types
+TOKEN_TYPES = {
+    "INT": TokType.INT,
+    "SYMBOL": TokType.SYMBOL,
+    "STRING_LITERAL": TokType.STRING_LITERAL,
+}
+
 
 def tokenize(input_file: io.TextIOBase) -> Generator[Token, None, None]:
     """Convert file object to token generator
     Also perform preprocessing: remove extra whitespace and comments
     Adapted from https://docs.python.org/3/library/re.html#writing-a-tokenizer
 
+    We read the whole file and scan it in a single pass, rather than line by line;
+    a regex scan over one big string is much faster than many scans over short ones.
+
     NOTE #1: does not support for non-ASCII Unicode characters
     NOTE #2: doesn't lex floats correctly (e.g. will parse .100 as a symbol
     and 100.0 as multiple tokens) This is okay because these contents only appear in directives,
@@ -94,18 +114,26 @@ def tokenize(input_file: io.TextIOBase) -> Generator[Token, None, None]:
 
     # TODO support /* */ comments?
 
-    for line in input_file:
-        for recognized_tok in re.finditer(TOKEN_PATTERN, line):
-            tok_type = recognized_tok.lastgroup  # group name
-            tok_value = recognized_tok.group()
-            if tok_type is None:
-                raise TokError(
-                    "Internal error: didn't match any token regex, including error.\n"
-                    f"Bad line: {line}"
-                )
-            if tok_type == "ERROR":
-                raise TokError(tok_value)
-            if tok_type == "SKIP":
-                # don't yield a token for whitespace or comments
-                continue
-            yield Token(TokType[tok_type], tok_value)
+    # bind these to locals to speed up the loop below
+    punctuation_tokens = PUNCTUATION_TOKENS
+    token_types = TOKEN_TYPES
+    make_token = Token
+
+    text = input_file.read()
+    for recognized_tok in TOKEN_PATTERN.finditer(text):
+        tok_type = recognized_tok.lastgroup  # group name
+        if tok_type == "PUNCTUATION":
+            yield punctuation_tokens[recognized_tok.group()]
+        elif tok_type in token_types:
+            yield make_token(token_types[tok_type], recognized_tok.group())
+        elif tok_type == "SKIP":
+            # don't yield a token for whitespace or comments
+            continue
+        elif tok_type == "ERROR":
+            raise TokError(recognized_tok.group())
+        else:
+            bad_line = text[recognized_tok.start() :].split("\n", 1)[0]
+            raise TokError(
+                "Internal error: didn't match any token regex, including error.\n"
+                f"Bad line: {bad_line}"
+            )
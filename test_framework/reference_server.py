@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Minimal implementation of the compiler server protocol (see server.py).
+
+It handles each request by running an ordinary compiler in a separate process,
+so it's no faster than not using --server at all. It's meant for testing the protocol,
+and as a starting point if you want to add server mode to your own compiler.
+
+Usage:
+    reference_server.py /path/to/compiler
+
+To run the test suite through it, use a wrapper script like this as the compiler under test:
+
+    #!/bin/sh
+    if [ "$1" = "--server" ]; then
+        exec python3 /path/to/reference_server.py /path/to/compiler
+    fi
+    exec /path/to/compiler "$@"
+"""
+
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+
+
+def serve(compiler: str) -> None:
+    """Handle requests from stdin until we reach the end of the input"""
+    for line in sys.stdin:
+        request = json.loads(line)
+        proc = subprocess.run(
+            [compiler] + request["options"] + [request["source"]],
+            capture_output=True,
+            check=False,
+            text=True,
+        )
+        reply = {
+            "returncode": proc.returncode,
+            "stdout": proc.stdout,
+            "stderr": proc.stderr,
+        }
+        print(json.dumps(reply), flush=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(f"usage: {sys.argv[0]} /path/to/compiler")
+    serve(sys.argv[1])
@@ -7,7 +7,7 @@ from pathlib import Path
 from typing import Callable, List, Mapping, NamedTuple, Union
 
 from . import basic
-from .parser import asm, parse
+from .parser import asm, parse_cache
 from .parser.asm import Opcode, Register
 from .tacky import common
 
@@ -42,7 +42,7 @@ def uses_stack(i: asm.AsmItem) -> bool:
 def get_spilled_operand_count(spill_instructions: List[asm.AsmItem]) -> int:
     """Count number of distinct stack operands in spill instructions"""
     spilled_operands = {
-        str(op)  # convert to string b/c Operands themselves are not hashable
+        op
         for i in spill_instructions
         for op in i.operands  # type: ignore
         if isinstance(op, asm.Memory) and op.base == Register.BP
@@ -62,13 +62,14 @@ class TestRegAlloc(basic.TestChapter):
         access the stack should both be below some upper bound
     """
 
-    def tearDown(self) -> None:
-        """Delete files produced during this test run (e.g. assembly and object files)
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Delete stray files in test_dir once all the tests have run (see TestChapter.tearDownClass)
 
         Don't delete the wrapper scripts!"""
         garbage_files = (
             f
-            for f in self.test_dir.rglob("*")
+            for f in cls.test_dir.rglob("*")
             if not f.is_dir()
             and f.suffix not in [".c", ".h"]
             and f.stem not in ["wrapper_osx", "wrapper_linux"]
@@ -78,6 +79,11 @@ class TestRegAlloc(basic.TestChapter):
         for f in garbage_files:
             f.unlink()
 
+    @classmethod
+    def get_dependencies(cls, program: Path) -> List[Path]:
+        """Every test in this chapter also depends on the wrapper script"""
+        return super().get_dependencies(program) + [WRAPPER_SCRIPT]
+
     def basic_test(self, program_path: Path) -> None:
         """Test that the compiled program behaves correctly but don't inspect the assembly code.
 
@@ -88,9 +94,11 @@ class TestRegAlloc(basic.TestChapter):
         the program behaves correctly, then parse the assembly file and perform further validation.
 
         Args:
-            program_path: Absolute path to C or assembly file to compile and run
+            program_path: Absolute path to C file to compile and run,
+                or to assembly file in the scratch directory that we already compiled
         """
-        extra_libs = basic.get_libs(program_path.with_suffix(".c")) + [WRAPPER_SCRIPT]
+        source_file = self.source_path(program_path).with_suffix(".c")
+        extra_libs = basic.get_libs(source_file) + [WRAPPER_SCRIPT]
         self.library_test_helper(program_path, extra_libs)
 
     def run_and_parse(
@@ -116,13 +124,13 @@ class TestRegAlloc(basic.TestChapter):
             self.invoke_compiler(program_path, cc_opt="-S").check_returncode()
         except subprocess.CalledProcessError as e:
             self.fail(f"Compilation failed:\n{e.stderr}")
-        asm_file = program_path.with_suffix(".s")
+        asm_file = self.scratch_path(program_path).with_suffix(".s")
 
         # make sure behavior is the same
         self.basic_test(asm_file)
 
         # make sure we actually performed the optimization
-        parsed_asm = parse.parse_file(asm_file)[target_fun]
+        parsed_asm = parse_cache.parse_file(asm_file, {target_fun})[target_fun]
 
         return parsed_asm
 
@@ -491,11 +499,13 @@ def configure_tests(
     else:
         subdirs = ["int_only", "all_types"]
 
-    all_tests = [p for subdir in subdirs for p in (TEST_DIR / subdir).rglob("*.c")]
+    all_tests = [
+        entry.path
+        for subdir in subdirs
+        for entry in basic.find_tests(TEST_DIR / subdir, extra_credit_flags)
+    ]
 
     for program in all_tests:
-        if basic.excluded_extra_credit(program, extra_credit_flags):
-            continue
         key = program.relative_to(TEST_DIR).with_suffix("")
         name = f"test_{key}"
         assert not getattr(
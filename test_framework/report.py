@@ -0,0 +1,479 @@
+"""Write machine-readable test results (JSON Lines or JUnit XML)"""
+
+from __future__ import annotations
+
+import json
+import re
+import statistics
+import traceback
+import unittest
+from abc import ABC, abstractmethod
+import xml.etree.ElementTree as ET
+from collections import Counter
+from dataclasses import asdict
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+from .basic import TEST_DIR, TestChapter
+from .parallel import ErrInfo
+from .timing import (
+    COMPILE,
+    LINK,
+    RESOURCE_EXCEEDED,
+    RUN,
+    TIMEOUT,
+    LimitExceeded,
+)
+
+# don't include more than this many characters of each test's stdout/stderr/error message
+MAX_OUTPUT_LEN = 4096
+
+JSON_LINES = "jsonl"
+JUNIT = "junit"
+FORMATS = [JSON_LINES, JUNIT]
+
+# how unittest describes a failed class or module fixture, e.g. "setUpClass (module.Class)"
+FIXTURE_DESCRIPTION = re.compile(r"(?P<fixture>\w+) \((?P<parent>.+)\)")
+
+# outcomes that mean a test didn't pass
+FAILING_OUTCOMES = ["fail", TIMEOUT, RESOURCE_EXCEEDED, "error", "unexpected_success"]
+
+
+def truncate(text: str) -> str:
+    if len(text) <= MAX_OUTPUT_LEN:
+        return text
+    return text[:MAX_OUTPUT_LEN] + f"\n[... {len(text) - MAX_OUTPUT_LEN} more characters]"
+
+
+def make_record(
+    test: unittest.TestCase, outcome: str, message: Optional[str]
+) -> Dict[str, Any]:
+    """Describe the result of a single test
+
+    Args:
+        test: the test that just finished
+        outcome: "pass", "fail", "timeout", "resource_exceeded", "error", "skip",
+            "expected_failure", or "unexpected_success"
+        message: error message or skip reason, if any
+    """
+    record: Dict[str, Any] = {"id": test.id(), "outcome": outcome}
+    if isinstance(test, TestChapter):
+        source = test.get_program().relative_to(TEST_DIR)
+        record["source"] = str(source)
+        # e.g. "chapter_20" -> 20
+        record["chapter"] = int(source.parts[0][len("chapter_") :])
+        record["stage"] = test.exit_stage or "run"
+        record["cached"] = test.cached
+        record["phases"] = [
+            {
+                "name": phase.name,
+                "wall_time": None
+                if phase.wall_time is None
+                else round(phase.wall_time, 6),
+                "cpu_time": None
+                if phase.cpu_time is None
+                else round(phase.cpu_time, 6),
+                "max_rss": phase.max_rss,
+                "returncode": phase.returncode,
+                "stdout": truncate(phase.stdout),
+                "stderr": truncate(phase.stderr),
+            }
+            for phase in getattr(test, "phases", [])
+        ]
+        asm_metrics = getattr(test, "asm_metrics", None)
+        if asm_metrics is not None:
+            record["asm_metrics"] = {
+                name: asdict(metrics) for name, metrics in asm_metrics.items()
+            }
+    if message is not None:
+        record["message"] = truncate(message)
+    return record
+
+
+def make_fixture_record(description: str, message: str) -> Dict[str, Any]:
+    """Describe an error in a class or module fixture, like setUpClass
+
+    Args:
+        description: how unittest describes the fixture, e.g. "setUpClass (module.Class)"
+        message: the error message
+    """
+    match = FIXTURE_DESCRIPTION.fullmatch(description)
+    # e.g. "module.Class.setUpClass", so it's grouped with the class's tests
+    test_id = description if match is None else f"{match['parent']}.{match['fixture']}"
+    return {"id": test_id, "outcome": "error", "message": truncate(message)}
+
+
+class Reporter(ABC):
+    """Base class for consumers of test results"""
+
+    @abstractmethod
+    def add(self, record: Dict[str, Any]) -> None:
+        """Consume the record for one test (see make_record)"""
+
+    def close(self) -> None:
+        pass
+
+
+class JsonLinesReporter(Reporter):
+    """Write one JSON object per test, as soon as each test finishes"""
+
+    def __init__(self, path: Path) -> None:
+        self.file: IO[str] = open(path, "w", encoding="utf-8")
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.file.write(json.dumps(record) + "\n")
+        # flush so other tools can follow the file while the tests are still running
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class JUnitReporter(Reporter):
+    """Write results in JUnit XML format, with one <testsuite> per test class.
+
+    Unlike JSON Lines, we can't write this until all the tests have finished,
+    since each <testsuite> element starts with the total number of tests, failures, etc.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.records: List[Dict[str, Any]] = []
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.records.append(record)
+
+    def close(self) -> None:
+        root = ET.Element("testsuites")
+        suites: Dict[str, ET.Element] = {}
+        for record in self.records:
+            classname, _, name = record["id"].rpartition(".")
+            suite = suites.get(classname)
+            if suite is None:
+                suite = ET.SubElement(root, "testsuite", name=classname)
+                suites[classname] = suite
+            phases = record.get("phases", [])
+            elapsed = sum(p["wall_time"] or 0.0 for p in phases)
+            case = ET.SubElement(
+                suite,
+                "testcase",
+                classname=classname,
+                name=name,
+                time=f"{elapsed:.3f}",
+            )
+            tag = {
+                "fail": "failure",
+                TIMEOUT: "failure",
+                RESOURCE_EXCEEDED: "failure",
+                "unexpected_success": "failure",
+                "error": "error",
+                "skip": "skipped",
+            }.get(record["outcome"])
+            if tag is not None:
+                message = record.get("message", "")
+                elt = ET.SubElement(case, tag, message=message.split("\n", 1)[0])
+                elt.text = message
+            if phases:
+                ET.SubElement(case, "system-out").text = "\n".join(
+                    f"{p['name']}: exit code {p['returncode']}"
+                    + ("" if p["wall_time"] is None else f", {p['wall_time']:.3f}s")
+                    for p in phases
+                )
+                stderr = "".join(p["stderr"] for p in phases)
+                if stderr:
+                    ET.SubElement(case, "system-err").text = stderr
+
+        for suite in suites.values():
+            cases = suite.findall("testcase")
+            suite.set("tests", str(len(cases)))
+            for tag, attr in [
+                ("failure", "failures"),
+                ("error", "errors"),
+                ("skipped", "skipped"),
+            ]:
+                suite.set(attr, str(sum(1 for c in cases if c.find(tag) is not None)))
+        ET.ElementTree(root).write(self.path, encoding="utf-8", xml_declaration=True)
+
+
+class DurationsReporter(Reporter):
+    """Print the slowest tests in each phase (compile, link, run) at the end of the test run"""
+
+    def __init__(self, count: int, stream: IO[str]) -> None:
+        self.count = count
+        self.stream = stream
+        # phase name -> list of (wall time, CPU time, test source or ID)
+        self.durations: Dict[str, List[Tuple[float, Optional[float], str]]] = {}
+
+    def add(self, record: Dict[str, Any]) -> None:
+        for phase in record.get("phases", []):
+            if phase["wall_time"] is None:
+                continue
+            self.durations.setdefault(phase["name"], []).append(
+                (
+                    phase["wall_time"],
+                    phase["cpu_time"],
+                    record.get("source", record["id"]),
+                )
+            )
+
+    def close(self) -> None:
+        for phase_name in [COMPILE, LINK, RUN]:
+            durations = self.durations.get(phase_name)
+            if not durations:
+                continue
+            durations.sort(key=lambda d: d[0], reverse=True)
+            total = sum(d[0] for d in durations)
+            print(
+                f"\nSlowest {phase_name} times ({len(durations)} total, {total:.2f}s wall):",
+                file=self.stream,
+            )
+            for wall_time, cpu_time, name in durations[: self.count]:
+                cpu = "   n/a" if cpu_time is None else f"{cpu_time:6.3f}"
+                print(
+                    f"{wall_time:8.3f}s wall {cpu}s cpu  {name}",
+                    file=self.stream,
+                )
+
+
+class AsmMetricsReporter(Reporter):
+    """Print a per-chapter summary of the assembly metrics each test recorded
+    (see --collect-asm-metrics) at the end of the test run"""
+
+    # metrics to sum over every function
+    TOTALS = [
+        "instructions",
+        "memory_operands",
+        "stack_accesses",
+        "pushes",
+        "pops",
+        "reg_to_reg_movs",
+    ]
+
+    def __init__(self, stream: IO[str]) -> None:
+        self.stream = stream
+        # chapter -> [number of tests, number of functions, totals..., total frame size]
+        self.chapters: Dict[int, List[int]] = {}
+        self.opcodes: Dict[int, Counter[str]] = {}
+
+    def add(self, record: Dict[str, Any]) -> None:
+        functions = record.get("asm_metrics")
+        if functions is None:
+            return
+        chapter = record["chapter"]
+        summary = self.chapters.setdefault(chapter, [0] * (len(self.TOTALS) + 3))
+        opcodes = self.opcodes.setdefault(chapter, Counter())
+        summary[0] += 1
+        for metrics in functions.values():
+            summary[1] += 1
+            for i, key in enumerate(self.TOTALS):
+                summary[i + 2] += metrics[key]
+            summary[-1] += metrics["frame_size"]
+            opcodes.update(metrics["opcodes"])
+
+    def close(self) -> None:
+        if not self.chapters:
+            return
+        headers = [
+            "chapter",
+            "tests",
+            "functions",
+            "insns",
+            "mem ops",
+            "stack",
+            "push",
+            "pop",
+            "reg movs",
+            "frame/fn",
+        ]
+        print(
+            "\nAssembly metrics by chapter (totals over all functions):",
+            file=self.stream,
+        )
+        print(
+            "  ".join(f"{h:>9}" for h in headers) + "  most common opcodes",
+            file=self.stream,
+        )
+        for chapter in sorted(self.chapters):
+            summary = self.chapters[chapter]
+            cells = [str(chapter)] + [str(n) for n in summary[:-1]]
+            cells.append(f"{summary[-1] / summary[1]:.1f}" if summary[1] else "-")
+            top = ", ".join(
+                f"{op} {count}" for op, count in self.opcodes[chapter].most_common(3)
+            )
+            print("  ".join(f"{c:>9}" for c in cells) + f"  {top}", file=self.stream)
+
+
+class CompilerMemoryReporter(Reporter):
+    """Print the compiler's peak memory usage in each chapter at the end of the test run,
+    and list every compilation that used more than some threshold"""
+
+    def __init__(self, stream: IO[str], threshold: Optional[int] = None) -> None:
+        """
+        Args:
+            stream: where to print the summary
+            threshold (optional): list compilations whose peak RSS exceeded this many bytes
+        """
+        self.stream = stream
+        self.threshold = threshold
+        # chapter -> list of (peak RSS in bytes, test source or ID)
+        self.chapters: Dict[int, List[Tuple[int, str]]] = {}
+
+    def add(self, record: Dict[str, Any]) -> None:
+        if "chapter" not in record:
+            return
+        for phase in record.get("phases", []):
+            if phase["name"] != COMPILE or phase.get("max_rss") is None:
+                continue
+            self.chapters.setdefault(record["chapter"], []).append(
+                (phase["max_rss"], record["source"])
+            )
+
+    def close(self) -> None:
+        if not self.chapters:
+            return
+        print("\nCompiler peak memory (RSS) by chapter:", file=self.stream)
+        print(
+            f"{'chapter':>9}  {'compiles':>9}  {'median MB':>9}  {'max MB':>9}  largest",
+            file=self.stream,
+        )
+        over_threshold: List[Tuple[int, str]] = []
+        for chapter in sorted(self.chapters):
+            usage = self.chapters[chapter]
+            largest, source = max(usage)
+            median = statistics.median(rss for rss, _ in usage)
+            print(
+                f"{chapter:>9}  {len(usage):>9}  {median / 2**20:>9.1f}  "
+                f"{largest / 2**20:>9.1f}  {source}",
+                file=self.stream,
+            )
+            if self.threshold is not None:
+                over_threshold.extend(u for u in usage if u[0] > self.threshold)
+        if over_threshold:
+            assert self.threshold is not None  # placate mypy
+            over_threshold.sort(reverse=True)
+            print(
+                f"\n{len(over_threshold)} compilation(s) used more than "
+                f"{self.threshold // 2**20} MB:",
+                file=self.stream,
+            )
+            for rss, source in over_threshold:
+                print(f"{rss / 2**20:9.1f} MB  {source}", file=self.stream)
+
+
+def make_reporter(path: Path, report_format: Optional[str]) -> Reporter:
+    """Create a reporter; if report_format isn't specified, guess it from the file extension"""
+    if report_format is None:
+        report_format = JUNIT if path.suffix == ".xml" else JSON_LINES
+    if report_format == JUNIT:
+        return JUnitReporter(path)
+    return JsonLinesReporter(path)
+
+
+def merge_reports(paths: List[Path], reporters: List[Reporter]) -> Tuple[str, bool]:
+    """Combine the JSON Lines reports from several shards of a test run (see --shard)
+
+    Args:
+        paths: the report from each shard
+        reporters: where to send every record from every report (e.g. to write a merged report)
+
+    Returns:
+        a summary of the combined results, and whether every test passed exactly once
+    """
+    outcomes: Counter[str] = Counter()
+    seen: Dict[str, Path] = {}
+    duplicates: List[str] = []
+    failures: List[str] = []
+    per_report: List[str] = []
+    for path in paths:
+        count = 0
+        wall_time = 0.0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                count += 1
+                wall_time += sum(
+                    phase["wall_time"] or 0.0 for phase in record.get("phases", [])
+                )
+                outcomes[record["outcome"]] += 1
+                if record["id"] in seen:
+                    duplicates.append(f"{record['id']} ({seen[record['id']]}, {path})")
+                else:
+                    seen[record["id"]] = path
+                if record["outcome"] in FAILING_OUTCOMES:
+                    failures.append(f"{record['id']}: {record['outcome']}")
+                for reporter in reporters:
+                    reporter.add(record)
+        per_report.append(f"  {path}: {count} tests, {wall_time:.2f}s in subprocesses")
+
+    counts = ", ".join(f"{n} {outcome}" for outcome, n in sorted(outcomes.items()))
+    lines = [
+        f"Merged {sum(outcomes.values())} test results from {len(paths)} report(s): "
+        + (counts or "no tests")
+    ]
+    lines.extend(per_report)
+    if failures:
+        lines.append(f"\n{len(failures)} test(s) didn't pass:")
+        lines.extend(f"  {f}" for f in failures)
+    if duplicates:
+        lines.append(f"\n{len(duplicates)} test(s) appear in more than one report:")
+        lines.extend(f"  {d}" for d in duplicates)
+    return "\n".join(lines), not failures and not duplicates
+
+
+class ReportingResult(unittest.TextTestResult):
+    """Print results like the usual text runner does, and send them to some Reporters too"""
+
+    def __init__(
+        self, *args: Any, reporters: List[Reporter], **kwargs: Any
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.reporters = reporters
+        self.outcome = "pass"
+        self.message: Optional[str] = None
+
+    def startTest(self, test: unittest.TestCase) -> None:
+        super().startTest(test)
+        self.outcome = "pass"
+        self.message = None
+
+    def addFailure(self, test: unittest.TestCase, err: ErrInfo) -> None:
+        super().addFailure(test, err)
+        if isinstance(err[1], LimitExceeded):
+            # distinguish tests that hung or ran out of resources from ordinary failures
+            self.outcome = err[1].outcome
+            self.message = str(err[1])
+        else:
+            self.outcome = "fail"
+            self.message = "".join(traceback.format_exception(*err))
+
+    def addError(self, test: unittest.TestCase, err: ErrInfo) -> None:
+        super().addError(test, err)
+        self.outcome = "error"
+        self.message = "".join(traceback.format_exception(*err))
+        if not isinstance(test, unittest.TestCase):
+            # a class or module fixture (e.g. setUpClass) failed; unittest reports this
+            # without calling startTest or stopTest, so this is our only chance to record it
+            self.report(make_fixture_record(test.id(), self.message))
+
+    def addSkip(self, test: unittest.TestCase, reason: str) -> None:
+        super().addSkip(test, reason)
+        self.outcome = "skip"
+        self.message = reason
+
+    def addExpectedFailure(self, test: unittest.TestCase, err: ErrInfo) -> None:
+        super().addExpectedFailure(test, err)
+        self.outcome = "expected_failure"
+
+    def addUnexpectedSuccess(self, test: unittest.TestCase) -> None:
+        super().addUnexpectedSuccess(test)
+        self.outcome = "unexpected_success"
+
+    def stopTest(self, test: unittest.TestCase) -> None:
+        super().stopTest(test)
+        self.report(make_record(test, self.outcome, self.message))
+
+    def report(self, record: Dict[str, Any]) -> None:
+        for reporter in self.reporters:
+            reporter.add(record)
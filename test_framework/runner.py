@@ -3,24 +3,46 @@
 from __future__ import annotations
 
 import argparse
+import functools
 import itertools
+import json
+import os
 import platform
 import subprocess
+import sys
 import unittest
 import warnings
 from functools import reduce
 from operator import ior
 from pathlib import Path
-from typing import Iterable, Optional, List, Type
+from typing import Iterable, Optional, List, Tuple, Type
 
 import test_framework
 import test_framework.basic
+import test_framework.parser.parse_cache
 import test_framework.regalloc
+import test_framework.report
 import test_framework.tacky.suite
 from test_framework.basic import ExtraCredit
+from test_framework.benchmark import DEFAULT_RUN_TIMEOUT as BENCHMARK_RUN_TIMEOUT
+from test_framework.benchmark import (
+    benchmark_compile,
+    benchmark_run,
+    build_benchmark_class,
+    compare_files,
+    format_summary,
+)
+from test_framework.cache import ResultCache
+from test_framework.changes import get_changed_files
+from test_framework.durations import DurationsDB, partition
+from test_framework.matrix import find_programs, format_matrix, optimization_matrix
+from test_framework.parallel import ParallelTestSuite, iter_tests
+from test_framework.parser.parse_cache import DEFAULT_MAX_DISK_BYTES, ParseCache
 from test_framework.regalloc import CHAPTER as REGALLOC_CHAPTER
+from test_framework.server import SERVER_OPTION, CompilerServerPool
 from test_framework.tacky.common import CHAPTER as TACKY_OPT_CHAPTER
 from test_framework.tacky.suite import Optimizations
+from test_framework.timing import ResourceLimits
 
 
 def get_optimization_flags(
@@ -75,6 +97,21 @@ def get_optimization_flags(
     raise NotImplementedError(f"Don't know how to handle option {optimization_opt}")
 
 
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse the argument to --shard, e.g. "2/4" -> (2, 4)"""
+    try:
+        index, count = (int(n) for n in value.split("/"))
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(
+            f"expected INDEX/COUNT (e.g. 2/4), got {value}"
+        ) from err
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            f"shard index must be between 1 and {count}, got {index}"
+        )
+    return index, count
+
+
 def parse_arguments() -> argparse.Namespace:
     """Parse command-line arguments"""
     parser = argparse.ArgumentParser()
@@ -83,7 +120,25 @@ def parse_arguments() -> argparse.Namespace:
         "--check-setup", action="store_true", help="Test your system configuration"
     )
 
-    # required arguments (if not use --check-setup)
+    parser.add_argument(
+        "--compare-benchmarks",
+        type=Path,
+        nargs=2,
+        metavar=("BASELINE", "CURRENT"),
+        help="Compare two results files from --benchmark-compile (or --benchmark-run), "
+        "and report any test programs that took significantly longer to compile (or run) "
+        "in CURRENT than in BASELINE",
+    )
+    parser.add_argument(
+        "--merge-reports",
+        type=Path,
+        nargs="+",
+        metavar="REPORT",
+        help="Combine the JSON Lines reports from each --shard of a test run, summarize them, "
+        "and check that no test appears twice. Use --report to write the combined report.",
+    )
+
+    # required arguments (if not use --check-setup, --compare-benchmarks, or --merge-reports)
     parser.add_argument(
         "cc", type=str, nargs="?", default=None, help="Path to your compiler"
     )
@@ -107,10 +162,31 @@ def parse_arguments() -> argparse.Namespace:
         action="store_true",
         help="Only run valid test programs (useful when testing backend changes)",
     )
+    changed_opts = parser.add_mutually_exclusive_group()
+    changed_opts.add_argument(
+        "--changed-only",
+        action="store_true",
+        help="Only run tests whose programs (or the libraries and headers they use) "
+        "have uncommitted changes, or are new files (useful when editing the test suite itself)",
+    )
+    changed_opts.add_argument(
+        "--since-commit",
+        metavar="SHA",
+        help="Only run tests whose programs (or the libraries and headers they use) "
+        "have changed since commit SHA, including uncommitted changes",
+    )
     parser.add_argument(
         "--failfast", "-f", action="store_true", help="Stop on first test failure"
     )
     parser.add_argument("--verbose", "-v", action="count", default=0)
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Run up to N tests at once (use 0 to run one test per CPU)",
+    )
     parser.add_argument(
         # by default, compile and run the program
         "--stage",
@@ -118,6 +194,18 @@ def parse_arguments() -> argparse.Namespace:
         default="run",
         choices=["lex", "parse", "validate", "tacky", "codegen", "run"],
     )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="When testing an intermediate stage, pass all of a chapter's test programs to the compiler "
+        "in a single invocation, if it supports batch mode (see test_framework/batch.py).",
+    )
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Start the compiler once per worker in server mode and send it compilation requests, "
+        "if it supports this (see test_framework/server.py).",
+    )
     parser.add_argument(
         "--expected-error-codes",
         type=int,
@@ -128,6 +216,168 @@ def parse_arguments() -> argparse.Namespace:
         "If not specified, invalid test cases pass if the compiler exits with any non-zero code. "
         "Used to distinguish between expected failures (i.e. rejecting an invalid source program) and unexpected failures (segfaults/internal errors).",
     )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        metavar="DIR",
+        help="Cache passing test results in DIR, and skip tests that passed in an earlier run "
+        "if the compiler under test, the test program, and the compiler options haven't changed.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="INDEX/COUNT",
+        help="Split the tests into COUNT shards and run only shard INDEX (from 1 to COUNT), "
+        "e.g. to spread a test run across several machines. Shards are balanced using the "
+        "durations in --durations-db, if it's given (which isn't updated when you use --shard); "
+        "every shard must use the same database and the same other options "
+        "so the shards don't overlap.",
+    )
+    parser.add_argument(
+        "--durations-db",
+        type=Path,
+        metavar="FILE",
+        help="Record how long each test takes in FILE, and use the durations from earlier runs "
+        "to start the slowest tests first. Prints the predicted and actual wall-clock time "
+        "for the whole run.",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        metavar="FILE",
+        help="Write each test's results, including how long each compile/link/run step took, "
+        "to FILE as the tests finish.",
+    )
+    parser.add_argument(
+        "--report-format",
+        choices=test_framework.report.FORMATS,
+        help="Format for --report: JSON Lines (one object per test) or JUnit XML. "
+        "Defaults to JUnit XML if FILE ends in .xml, JSON Lines otherwise.",
+    )
+    parser.add_argument(
+        "--durations",
+        type=int,
+        metavar="N",
+        help="At the end of the test run, list the N slowest tests in each phase "
+        "(compiling with your compiler, linking, and running the program), "
+        "with their wall-clock and CPU times.",
+    )
+    # limits on the compiler under test and the programs it compiles
+    parser.add_argument(
+        "--compile-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Fail any test where your compiler runs for longer than SECONDS (default: no limit)",
+    )
+    parser.add_argument(
+        "--run-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Fail any test where the compiled program runs for longer than SECONDS "
+        f"(default: {test_framework.basic.DEFAULT_RUN_TIMEOUT:g}, or "
+        f"{BENCHMARK_RUN_TIMEOUT:g} with --benchmark-run or --optimization-matrix)",
+    )
+    parser.add_argument(
+        "--max-compiler-memory",
+        type=int,
+        metavar="MB",
+        help="Limit your compiler's virtual memory to MB megabytes (with RLIMIT_AS)",
+    )
+    parser.add_argument(
+        "--max-compiler-cpu",
+        type=int,
+        metavar="SECONDS",
+        help="Limit your compiler's CPU time to SECONDS (with RLIMIT_CPU)",
+    )
+    parser.add_argument(
+        "--max-compiler-rss",
+        type=int,
+        metavar="MB",
+        help="Fail any test where your compiler's peak resident set size is over MB megabytes",
+    )
+    parser.add_argument(
+        "--warn-compiler-rss",
+        type=int,
+        metavar="MB",
+        help="At the end of the test run, list every compilation where your compiler's "
+        "peak resident set size was over MB megabytes, without failing those tests",
+    )
+    parser.add_argument(
+        "--compiler-rss-summary",
+        action="store_true",
+        help="At the end of the test run, print your compiler's median and peak "
+        "memory usage in each chapter (implied by --max-compiler-rss and --warn-compiler-rss)",
+    )
+    parser.add_argument(
+        "--collect-asm-metrics",
+        action="store_true",
+        help="After each passing test, compile its program to assembly and record metrics "
+        "for each function (instruction count, opcodes, memory operands, stack accesses, "
+        "push/pop, frame size, register-to-register moves). Prints a per-chapter summary "
+        "at the end; use --report to get the metrics for each function.",
+    )
+    parser.add_argument(
+        "--parse-cache-dir",
+        type=Path,
+        metavar="DIR",
+        help="Save parsed assembly code in DIR (from tests that inspect the assembly, "
+        "--collect-asm-metrics, and --optimization-matrix), and reuse it in later runs "
+        "whenever the compiler produces identical assembly.",
+    )
+    parser.add_argument(
+        "--parse-cache-size",
+        type=int,
+        default=DEFAULT_MAX_DISK_BYTES // 2**20,
+        metavar="MB",
+        help="Limit --parse-cache-dir to MB megabytes, deleting the least recently used "
+        "entries as needed (default: %(default)s)",
+    )
+    # compile-time and run-time benchmarks
+    benchmark_opts = parser.add_mutually_exclusive_group()
+    benchmark_opts.add_argument(
+        "--benchmark-compile",
+        action="store_true",
+        help="Instead of running the tests, measure how long your compiler takes to compile "
+        "each valid test program (up to --stage, or to assembly with -S if --stage isn't specified)",
+    )
+    benchmark_opts.add_argument(
+        "--benchmark-run",
+        action="store_true",
+        help="Instead of running the tests, compile each benchmark program "
+        "(tests/chapter_*/benchmarks) and measure how long the executables take to run",
+    )
+    benchmark_opts.add_argument(
+        "--optimization-matrix",
+        action="store_true",
+        help="Instead of running the tests, build the chapter 19 (and 20) test programs and "
+        "the benchmark programs with no optimizations, then with each TACKY optimization "
+        "enabled cumulatively, and show how much each optimization reduces instruction counts, "
+        "stack accesses, and run time. Builds up to --jobs programs at once.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        metavar="K",
+        help="With --benchmark-compile, --benchmark-run, or --optimization-matrix, "
+        "measure each program K times (default: 5)",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=1,
+        metavar="W",
+        help="With --benchmark-compile, --benchmark-run, or --optimization-matrix, "
+        "compile or run each program W times before measuring it (default: 1)",
+    )
+    parser.add_argument(
+        "--benchmark-output",
+        type=Path,
+        metavar="FILE",
+        help="With --benchmark-compile, --benchmark-run, or --optimization-matrix, "
+        "save the results as JSON to FILE "
+        "(to compare against later with --compare-benchmarks, except for --optimization-matrix)",
+    )
     parser.add_argument(
         "--keep-asm-on-failure",
         action="store_true",
@@ -251,11 +501,22 @@ def parse_arguments() -> argparse.Namespace:
             warnings.warn(
                 f"These options have no effect when combined with --check-setup: {', '.join(ignored_args)}."
             )
+    elif args.compare_benchmarks or args.merge_reports:
+        pass
     # if it's absent, need to specify compiler and chapter
     elif not (args.cc and args.chapter):
         parser.error("cc and --chapter are required")
 
-    if args.stage and args.stage != "run" and args.chapter >= TACKY_OPT_CHAPTER:
+    # --chapter isn't required with --check-setup, --compare-benchmarks, or --merge-reports,
+    # so it may be None here
+    chapter = args.chapter
+
+    if (
+        args.stage
+        and args.stage != "run"
+        and chapter is not None
+        and chapter >= TACKY_OPT_CHAPTER
+    ):
         # TODO better error message here
         parser.error(
             message=f"Testing intermediate stage not allowed with Part III tests (chapter {args.chapter})",
@@ -270,12 +531,59 @@ def parse_arguments() -> argparse.Namespace:
             "--extra-credit enables all extra-credit tests; ignoring other extra-credit options."
         )
 
-    if args.int_only and args.chapter < TACKY_OPT_CHAPTER:
+    if args.int_only and chapter is not None and chapter < TACKY_OPT_CHAPTER:
         warnings.warn("Option --int-only has no impact on Part I & Part II tests")
 
-    if args.no_coalescing and args.chapter < TACKY_OPT_CHAPTER:
+    if args.no_coalescing and chapter is not None and chapter < TACKY_OPT_CHAPTER:
         warnings.warn("Option --no-coalescing has no impact on Part I & Part II tests")
 
+    if args.batch and args.stage == "run":
+        warnings.warn("Option --batch has no impact unless --stage is specified")
+
+    if args.collect_asm_metrics and args.stage != "run":
+        warnings.warn(
+            "Option --collect-asm-metrics has no impact when --stage is specified"
+        )
+
+    if args.benchmark_run and args.stage != "run":
+        parser.error("--benchmark-run can't be combined with --stage")
+
+    if args.optimization_matrix:
+        if chapter is not None and chapter < TACKY_OPT_CHAPTER:
+            parser.error(
+                f"--optimization-matrix requires --chapter {TACKY_OPT_CHAPTER} or later"
+            )
+        if args.optimization:
+            parser.error(
+                "--optimization-matrix already tests each optimization level; "
+                "don't specify an optimization option"
+            )
+
+    if args.repeat < 1:
+        parser.error("--repeat must be a positive integer")
+
+    if args.warmup < 0:
+        parser.error("--warmup must be a non-negative integer")
+
+    for option in [
+        "compile_timeout",
+        "run_timeout",
+        "max_compiler_memory",
+        "max_compiler_cpu",
+        "max_compiler_rss",
+        "warn_compiler_rss",
+        "parse_cache_size",
+    ]:
+        value = getattr(args, option)
+        if value is not None and value <= 0:
+            parser.error(f"--{option.replace('_', '-')} must be positive")
+
+    if args.durations is not None and args.durations < 1:
+        parser.error("--durations must be a positive integer")
+
+    if args.jobs < 0:
+        parser.error("--jobs must be a non-negative integer")
+
     if args.expected_error_codes:
         out_of_range = [str(i) for i in args.expected_error_codes if i < 1 or i > 255]
         if out_of_range:
@@ -418,16 +726,7 @@ def is_valid_test_case(failure_case: unittest.TestCase) -> bool:
 
 def gen_assembly(failure_case: test_framework.basic.TestChapter) -> None:
     """Recompile failed test with -S option to generate assembly"""
-    # HACK: work backwards from test method name to determine name of file under test
-    # given fully qualified test name (e.g.
-    # test_framework.basic.TestChapter13.test_valid/special_values/infinity),
-    # get name of test method (e.g. test_valid/special_values/infinity)
-    test_method_name = failure_case.id().split(".")[-1]
-    # now remove "test_" prefix and add ".c" suffix to get e.g. valid/special_values/infinity.c
-    # (don't use removeprefix to support Python 3.8)
-    relative_src_path = (test_method_name[len("test_") :]) + ".c"
-    # finally, get absolute path to file under test
-    absolute_src_path = (failure_case.test_dir / relative_src_path).with_suffix(".c")
+    absolute_src_path = failure_case.get_program()
     # compile it with -S option (note that we don't need -lm or -c b/c we stop before assembly/linking)
     # if compilation fails, don't raise an error or print out stdout/stderr; we've already
     # reported that issue during test run
@@ -435,40 +734,14 @@ def gen_assembly(failure_case: test_framework.basic.TestChapter) -> None:
     subprocess.run(compiler_args, check=False, text=True, capture_output=True)
 
 
-def main() -> int:
-    """Main entry point for test runner"""
-    args = parse_arguments()
-    if args.check_setup:
-        success = check_setup()
-        if success:
-            return 0
-        return 1
-
-    compiler = Path(args.cc).resolve()
-
-    # merge list of extra-credit features into bitvector
-
-    if args.extra_credit is not None:
-        extra_credit: ExtraCredit = reduce(ior, args.extra_credit)
-    else:
-        extra_credit = ExtraCredit.NONE
-
-    if args.latest_only:
-        chapters: Iterable[int] = [args.chapter]
-    elif args.int_only:
-        # skip Part II chapters (11 - 18)
-        chapters = itertools.chain(
-            range(1, 11), range(TACKY_OPT_CHAPTER, args.chapter + 1)
-        )
-    else:
-        chapters = range(1, args.chapter + 1)
-
-    # construct options to pass to compiler under test
-    # including optimizations and options to stop after a particular stage
-    cc_options: list[str] = args.extra_cc_options
-    optimization_flags = get_optimization_flags(args.chapter, args.optimization)
-    cc_options.extend(optimization_flags)
-
+def build_test_suite(
+    args: argparse.Namespace,
+    compiler: Path,
+    chapters: Iterable[int],
+    cc_options: List[str],
+    extra_credit: ExtraCredit,
+) -> unittest.TestSuite:
+    """Construct the tests for every chapter we're testing"""
     # create a subclass of TestChapter for each chapter,
     # dynamically adding a test case for each source program
     # technique adapted from
@@ -514,12 +787,288 @@ def main() -> int:
         else:
             raise ValueError(f"There is no chapter {chapter}!")
 
+    return test_suite
+
+
+def run_optimization_matrix(
+    args: argparse.Namespace, compiler: Path, extra_credit: ExtraCredit
+) -> int:
+    """Build and measure programs at every cumulative optimization level (see matrix.py)
+
+    Register allocation can't be turned on or off from the command line,
+    so to measure what it buys, compare the results for two versions of the compiler.
+    """
+    levels = [("none", list(args.extra_cc_options))] + [
+        (name, args.extra_cc_options + get_optimization_flags(TACKY_OPT_CHAPTER, opt))
+        for name, opt in [
+            ("fold", Optimizations.CONSTANT_FOLD),
+            ("+unreachable", Optimizations.UNREACHABLE_CODE_ELIM),
+            ("+copy-prop", Optimizations.COPY_PROP),
+            ("+dse", Optimizations.DEAD_STORE_ELIM),
+        ]
+    ]
+    programs = find_programs(args.chapter, extra_credit, args.int_only)
+    results = optimization_matrix(
+        compiler,
+        programs,
+        levels,
+        repeat=args.repeat,
+        warmup=args.warmup,
+        jobs=args.jobs or os.cpu_count() or 1,
+        run_timeout=args.run_timeout or BENCHMARK_RUN_TIMEOUT,
+    )
+    print(format_matrix(results))
+    if args.benchmark_output:
+        with open(args.benchmark_output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if any(
+        "error" in level_result
+        for program_results in results["programs"].values()
+        for level_result in program_results.values()
+    ):
+        return 1
+    return 0
+
+
+def main() -> int:
+    """Main entry point for test runner"""
+    args = parse_arguments()
+    if args.check_setup:
+        success = check_setup()
+        if success:
+            return 0
+        return 1
+
+    if args.compare_benchmarks:
+        return compare_files(*args.compare_benchmarks)
+
+    if args.merge_reports:
+        merged_reporters: List[test_framework.report.Reporter] = []
+        if args.report:
+            merged_reporters.append(
+                test_framework.report.make_reporter(args.report, args.report_format)
+            )
+        try:
+            summary, success = test_framework.report.merge_reports(
+                args.merge_reports, merged_reporters
+            )
+        finally:
+            for reporter in merged_reporters:
+                reporter.close()
+        print(summary)
+        return 0 if success else 1
+
+    compiler = Path(args.cc).resolve()
+
+    # merge list of extra-credit features into bitvector
+
+    if args.extra_credit is not None:
+        extra_credit: ExtraCredit = reduce(ior, args.extra_credit)
+    else:
+        extra_credit = ExtraCredit.NONE
+
+    if args.latest_only:
+        chapters: Iterable[int] = [args.chapter]
+    elif args.int_only:
+        # skip Part II chapters (11 - 18)
+        chapters = itertools.chain(
+            range(1, 11), range(TACKY_OPT_CHAPTER, args.chapter + 1)
+        )
+    else:
+        chapters = range(1, args.chapter + 1)
+
+    if args.parse_cache_dir:
+        test_framework.parser.parse_cache.PARSE_CACHE = ParseCache(
+            cache_dir=args.parse_cache_dir.resolve(),
+            max_disk_bytes=args.parse_cache_size * 2**20,
+        )
+
+    if args.optimization_matrix:
+        return run_optimization_matrix(args, compiler, extra_credit)
+
+    # construct options to pass to compiler under test
+    # including optimizations and options to stop after a particular stage
+    cc_options: list[str] = args.extra_cc_options
+    optimization_flags = get_optimization_flags(args.chapter, args.optimization)
+    cc_options.extend(optimization_flags)
+
+    # don't batch-compile programs we're benchmarking, since we need to time each one separately
+    test_framework.basic.TestChapter.use_batch = args.batch and not (
+        args.benchmark_compile or args.benchmark_run
+    )
+    if args.server:
+        test_framework.basic.TestChapter.compiler_server = CompilerServerPool(
+            [compiler, SERVER_OPTION]
+        )
+
+    test_framework.basic.TestChapter.collect_asm_metrics = args.collect_asm_metrics
+    test_framework.basic.TestChapter.compile_timeout = args.compile_timeout
+    if args.run_timeout is not None:
+        test_framework.basic.TestChapter.run_timeout = args.run_timeout
+    elif args.benchmark_run:
+        test_framework.basic.TestChapter.run_timeout = BENCHMARK_RUN_TIMEOUT
+    if args.max_compiler_memory or args.max_compiler_cpu or args.max_compiler_rss:
+        test_framework.basic.TestChapter.compiler_limits = ResourceLimits(
+            memory=args.max_compiler_memory and args.max_compiler_memory * 2**20,
+            cpu_time=args.max_compiler_cpu,
+            max_rss=args.max_compiler_rss and args.max_compiler_rss * 2**20,
+        )
+
+    if args.cache_dir:
+        test_framework.basic.TestChapter.result_cache = ResultCache(
+            args.cache_dir.resolve(), compiler
+        )
+
+    if args.benchmark_run:
+        test_suite = unittest.TestSuite()
+        for chapter in chapters:
+            benchmark_class = build_benchmark_class(compiler, chapter, cc_options)
+            if benchmark_class is not None:
+                test_suite.addTest(
+                    unittest.defaultTestLoader.loadTestsFromTestCase(benchmark_class)
+                )
+    else:
+        test_suite = build_test_suite(
+            args, compiler, chapters, cc_options, extra_credit
+        )
+
+    if args.changed_only or args.since_commit:
+        baseline = args.since_commit or "HEAD"
+        try:
+            changed_files = get_changed_files(baseline)
+        except subprocess.CalledProcessError as err:
+            print(f"Can't find files changed since {baseline}:\n{err.stderr}")
+            return 1
+        test_framework.basic.TestChapter.changed_files = frozenset(changed_files)
+        test_suite = unittest.TestSuite(
+            t
+            for t in iter_tests(test_suite)
+            if not isinstance(t, test_framework.basic.TestChapter)
+            or t.is_affected(t.get_program())
+        )
+
+    durations_db = DurationsDB(args.durations_db) if args.durations_db else None
+    if args.shard:
+        index, count = args.shard
+        tests = list(iter_tests(test_suite))
+        test_ids = [t.id() for t in tests]
+        if durations_db is None:
+            estimates = [1.0] * len(tests)
+        else:
+            estimates, known = durations_db.estimate(test_ids)
+            if known == 0:
+                # we don't know how long any of these tests take, so balance by count
+                estimates = [1.0] * len(tests)
+        shards = partition(test_ids, estimates, count)
+        test_suite = unittest.TestSuite(
+            t for t, shard in zip(tests, shards) if shard == index - 1
+        )
+
+    if args.benchmark_compile or args.benchmark_run:
+        # only compile valid programs (invalid ones exercise error handling, not compile speed);
+        # benchmark them one at a time (regardless of --jobs) for more stable timings
+        benchmark_tests = [
+            t
+            for t in iter_tests(test_suite)
+            if isinstance(t, test_framework.basic.TestChapter)
+            and is_valid_test_case(t)
+        ]
+        progress = sys.stdout if args.verbose else None
+        if args.benchmark_run:
+            results = benchmark_run(
+                benchmark_tests,
+                repeat=args.repeat,
+                warmup=args.warmup,
+                progress=progress,
+            )
+            for program, error in results["errors"].items():
+                print(f"{program}: {error}", file=sys.stderr)
+        else:
+            results = benchmark_compile(
+                benchmark_tests,
+                repeat=args.repeat,
+                warmup=args.warmup,
+                stage=args.stage,
+                progress=progress,
+            )
+        print(format_summary(results))
+        if args.benchmark_output:
+            with open(args.benchmark_output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+        # a benchmark that computes the wrong answer is a test failure
+        return 1 if results.get("errors") else 0
+
+    # only batch-compile the tests we're about to run (see TestChapter.setUpClass)
+    test_framework.basic.TestChapter.selected_tests = frozenset(
+        t.id() for t in iter_tests(test_suite)
+    )
+
     # handle ctrl-C cleanly
     unittest.installHandler()
 
     # run it
+    jobs = args.jobs or os.cpu_count() or 1
+    if jobs > 1 or durations_db is not None:
+        test_suite = ParallelTestSuite(test_suite, jobs, durations_db)
     runner = unittest.TextTestRunner(verbosity=args.verbose, failfast=args.failfast)
-    result = runner.run(test_suite)
+    reporters: List[test_framework.report.Reporter] = []
+    if args.report:
+        reporters.append(
+            test_framework.report.make_reporter(args.report, args.report_format)
+        )
+    if args.durations:
+        reporters.append(
+            test_framework.report.DurationsReporter(args.durations, sys.stderr)
+        )
+    if args.collect_asm_metrics:
+        reporters.append(test_framework.report.AsmMetricsReporter(sys.stderr))
+    if args.compiler_rss_summary or args.max_compiler_rss or args.warn_compiler_rss:
+        rss_threshold = args.warn_compiler_rss or args.max_compiler_rss
+        reporters.append(
+            test_framework.report.CompilerMemoryReporter(
+                sys.stderr, rss_threshold * 2**20 if rss_threshold else None
+            )
+        )
+    if reporters:
+        runner.resultclass = functools.partial(
+            test_framework.report.ReportingResult, reporters=reporters
+        )
+    try:
+        result = runner.run(test_suite)
+    finally:
+        server = test_framework.basic.TestChapter.compiler_server
+        if server is not None:
+            server.close()
+        for reporter in reporters:
+            reporter.close()
+    if durations_db is not None:
+        assert isinstance(test_suite, ParallelTestSuite)  # placate mypy
+        if not args.shard:
+            # if every shard updated the database, later shards could be partitioned
+            # differently from earlier ones, so some tests would run twice and others never
+            durations_db.save()
+        if test_suite.actual_makespan is not None:
+            if test_suite.predicted_makespan is None:
+                prediction = "no durations recorded yet"
+            else:
+                prediction = (
+                    f"predicted {test_suite.predicted_makespan:.2f}s from "
+                    f"{test_suite.known_durations} recorded durations"
+                )
+            print(
+                f"Makespan on {jobs} worker(s): {test_suite.actual_makespan:.2f}s "
+                f"({prediction})",
+                file=sys.stderr,
+            )
+    cache = test_framework.basic.TestChapter.result_cache
+    if cache is not None:
+        print(f"Reused {cache.hits} cached result(s) from {args.cache_dir}")
+    if args.parse_cache_dir:
+        parse_cache = test_framework.parser.parse_cache.PARSE_CACHE
+        print(
+            f"Parsed {parse_cache.misses} assembly file(s) and reused "
+            f"{parse_cache.hits} from {args.parse_cache_dir}"
+        )
     if result.wasSuccessful():
         return 0
 
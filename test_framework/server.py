@@ -0,0 +1,274 @@
+"""Optional protocol to send compilation requests to a long-lived compiler process.
+
+Normally we start a new compiler process for every compilation. If your compiler
+is slow to start up (e.g. because it runs on a VM that needs to warm up), you can
+make it support a server mode instead. When you pass the --server option to the test script,
+it will start your compiler once per worker thread as:
+
+    /path/to/your_compiler --server
+
+and then send it requests on stdin, one JSON object per line:
+
+    {"source": "/path/to/file.c", "options": ["--parse"], "stage": "parse", "output": null}
+
+where:
+* "source" is the absolute path to the source file to compile
+* "options" are the command-line options the compiler would have been invoked with
+  (everything except the source file). These always determine what the compiler should do.
+* "stage" is the intermediate stage to stop after, or null when compiling a complete program
+  (provided for convenience, it's always one of the options too)
+* "output" is the path where we expect the compiler to write its output file
+  (an executable, or a .s or .o file if the options include -S or -c),
+  or null when testing an intermediate stage
+
+For each request, in order, the compiler should write one line to stdout with a JSON object containing
+the same exit code and error output it would have produced if it had been invoked from the command line:
+
+    {"returncode": 0, "stderr": ""}
+
+The object may also include "stdout" (which defaults to the empty string).
+The compiler should exit when it reaches the end of its input.
+
+If the compiler exits or writes an invalid reply before handling any requests successfully,
+we assume it doesn't support server mode and fall back to starting a new process for each compilation.
+If the server stops responding later on (e.g. because it crashes), we redo that compilation
+in a separate process, and start a new server for the next request.
+If a request takes longer than --compile-timeout, we kill the server, fail that test
+as a timeout, and start a new server for the next request.
+
+Anything the server writes to stderr is shown if it doesn't support server mode,
+and included in the results of a request that timed out.
+
+See reference_server.py for a minimal server that forwards each request to a separate process.
+"""
+
+from __future__ import annotations
+
+import json
+import queue
+import subprocess
+import sys
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Sequence, Union
+
+SERVER_OPTION = "--server"
+
+# how many lines of each server's error output to keep
+MAX_STDERR_LINES = 100
+
+# how long to wait for the threads reading a server's output to finish
+# after it exits, in seconds (if the server started subprocesses of its own
+# that are still running, they may keep its output pipes open)
+READER_JOIN_TIMEOUT = 1.0
+
+
+class CompilerServer:
+    """A single long-lived compiler process"""
+
+    def __init__(self, command: Sequence[Union[str, Path]]) -> None:
+        self.proc = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        # number of requests this server has handled successfully
+        self.handled = 0
+        # Background threads read the server's output, so we can stop waiting
+        # for a reply when a request times out, and so the server never blocks
+        # on a full stderr pipe. Each line of stdout is a reply; None means EOF.
+        self.replies: queue.Queue[Optional[str]] = queue.Queue()
+        self.stderr_lines: Deque[str] = deque(maxlen=MAX_STDERR_LINES)
+        self.readers = [
+            threading.Thread(target=self.read_replies, daemon=True),
+            threading.Thread(target=self.read_stderr, daemon=True),
+        ]
+        for reader in self.readers:
+            reader.start()
+
+    def read_replies(self) -> None:
+        assert self.proc.stdout is not None  # placate mypy
+        with self.proc.stdout:
+            for line in self.proc.stdout:
+                self.replies.put(line)
+        self.replies.put(None)
+
+    def read_stderr(self) -> None:
+        assert self.proc.stderr is not None  # placate mypy
+        with self.proc.stderr:
+            for line in self.proc.stderr:
+                self.stderr_lines.append(line)
+
+    def request(
+        self, msg: Dict[str, Any], timeout: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Send one request and wait for the reply.
+
+        Args:
+            msg: the request
+            timeout (optional): how long to wait for the reply, in seconds
+
+        Returns:
+            The parsed reply, or None if the server exited or sent an invalid reply
+
+        Raises:
+            subprocess.TimeoutExpired if there's no reply in time; we kill the server first
+        """
+        assert self.proc.stdin is not None
+        try:
+            self.proc.stdin.write(json.dumps(msg) + "\n")
+            self.proc.stdin.flush()
+        except OSError:  # e.g. BrokenPipeError if server already exited
+            return None
+        try:
+            line = self.replies.get(timeout=timeout)
+        except queue.Empty:
+            self.kill()
+            raise subprocess.TimeoutExpired(
+                self.proc.args, timeout or 0.0, stderr=self.error_output()
+            ) from None
+        if line is None:
+            return None
+        try:
+            reply = json.loads(line)
+            reply["returncode"] = int(reply["returncode"])
+        except (ValueError, TypeError, KeyError):
+            return None
+        self.handled += 1
+        return reply  # type: ignore[no-any-return]
+
+    def error_output(self) -> str:
+        """Get the last few lines the server wrote to stderr"""
+        return "".join(list(self.stderr_lines))
+
+    def kill(self) -> None:
+        """Kill the server and wait for it to exit"""
+        self.proc.kill()
+        self.wait()
+
+    def wait(self) -> None:
+        """Wait for the server to exit and for its output to be read"""
+        self.proc.wait()
+        for reader in self.readers:
+            reader.join(READER_JOIN_TIMEOUT)
+
+    def close(self) -> None:
+        """Tell the server to exit by closing its input, and wait for it"""
+        try:
+            if self.proc.stdin is not None:
+                self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=5.0)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self.wait()
+
+
+class CompilerServerPool:
+    """Start one compiler server per thread and dispatch compilation requests to it"""
+
+    def __init__(self, command: Sequence[Union[str, Path]]) -> None:
+        self.command = command
+        # False once we've determined that the compiler doesn't support server mode
+        self.supported = True
+        self.local = threading.local()
+        # every server we've started, so we can shut them all down at the end
+        self.servers: List[CompilerServer] = []
+        self.lock = threading.Lock()
+
+    def compile(
+        self,
+        args: Sequence[Union[str, Path]],
+        source: Path,
+        stage: Optional[str],
+        output: Optional[Path],
+        timeout: Optional[float] = None,
+    ) -> Optional[subprocess.CompletedProcess[str]]:
+        """Ask this thread's server to compile a file
+
+        Args:
+            args: full command to compile this file in a separate process,
+                i.e. compiler, then options, then the source file
+            source: absolute path to the source file
+            stage: the intermediate stage to stop after, or None
+            output: path where we expect the compiler to write its output file, if any
+            timeout (optional): how long to wait for the server to reply, in seconds
+
+        Returns:
+            the result of compilation, or None if the caller should compile this file
+            in a separate process instead
+
+        Raises:
+            subprocess.TimeoutExpired if the server didn't reply in time
+            (we'll start a new server for this thread's next request)
+        """
+        if not self.supported:
+            return None
+
+        server: Optional[CompilerServer] = getattr(self.local, "server", None)
+        if server is None:
+            try:
+                server = CompilerServer(self.command)
+            except OSError as err:
+                self.disable(str(err))
+                return None
+            self.local.server = server
+            with self.lock:
+                self.servers.append(server)
+
+        options = [str(a) for a in args[1:-1]]
+        request = {
+            "source": str(source),
+            "options": options,
+            "stage": stage,
+            "output": None if output is None else str(output),
+        }
+        try:
+            reply = server.request(request, timeout)
+        except subprocess.TimeoutExpired:
+            # the server is stuck, and has already been killed
+            self.local.server = None
+            raise
+        if reply is None:
+            self.local.server = None
+            server.close()
+            if server.handled == 0:
+                # this server never worked, so assume it never will
+                self.disable(server.error_output())
+            return None
+
+        return subprocess.CompletedProcess(
+            list(args),
+            reply["returncode"],
+            stdout=reply.get("stdout", ""),
+            stderr=reply.get("stderr", ""),
+        )
+
+    def disable(self, details: str = "") -> None:
+        """Stop using server mode, and say why
+
+        Args:
+            details: more information about why the server didn't work
+                (e.g. its error output)
+        """
+        with self.lock:
+            if self.supported:
+                self.supported = False
+                print(
+                    f"{self.command[0]} doesn't support {SERVER_OPTION}; starting a new process for each compilation",
+                    file=sys.stderr,
+                )
+                if details.strip():
+                    print(details.rstrip(), file=sys.stderr)
+
+    def close(self) -> None:
+        """Shut down every server"""
+        with self.lock:
+            for server in self.servers:
+                server.close()
+            self.servers.clear()
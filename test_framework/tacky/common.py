@@ -4,11 +4,11 @@ from __future__ import annotations
 
 from collections.abc import Callable
 from pathlib import Path
-from typing import List, Optional, Sequence
+from typing import Collection, List, Optional, Sequence
 
 
 from .. import basic
-from ..parser import asm, parse
+from ..parser import asm, parse_cache
 from ..parser.asm import Opcode, Register
 
 CHAPTER = 19
@@ -37,13 +37,16 @@ class TackyOptimizationTest(basic.TestChapter):
     * There are no invalid test programs for this chapter
     """
 
-    def run_and_parse_all(self, source_file: Path) -> dict[str, asm.AssemblyFunction]:
+    def run_and_parse_all(
+        self, source_file: Path, functions: Optional[Collection[str]] = None
+    ) -> dict[str, asm.AssemblyFunction]:
         """Compile and run a program, validate result, then return parsed assembly.
 
         The caller can then perform additional validation on the parsed assembly.
 
         Args:
             program_path: Absolute path to test program
+            functions: Names of the functions to parse (default: all of them)
 
         Returns: parsed assembly code for whole program
         """
@@ -58,14 +61,17 @@ class TackyOptimizationTest(basic.TestChapter):
         basic.print_stderr(
             compile_result
         )  # print compiler warnings even if it succeeded
-        asm_file = source_file.with_suffix(".s")
+        asm_file = self.scratch_path(source_file).with_suffix(".s")
         libs = basic.get_libs(source_file)
         # assemble/link asm_file, run it, and make sure it gives expected result
-        actual_result = basic.gcc_compile_and_run([asm_file] + libs, [])
+        actual_result = basic.gcc_compile_and_run(
+            [asm_file] + libs, [], self.phases, self.run_timeout
+        )
         self.validate_runs(source_file, actual_result)
+        self.record_asm_metrics(asm_file)
 
-        # now parse the assembly file and extract the function named "target"
-        return parse.parse_file(asm_file)
+        # now parse the assembly file
+        return parse_cache.parse_file(asm_file, functions)
 
     def run_and_parse(self, source_file: Path) -> asm.AssemblyFunction:
         """Compile and run a program, validate result, then return parsed assembly for 'target' function.
@@ -77,7 +83,7 @@ class TackyOptimizationTest(basic.TestChapter):
 
         Returns: parsed assembly code for whole program
         """
-        return self.run_and_parse_all(source_file)["target"]
+        return self.run_and_parse_all(source_file, {"target"})["target"]
 
     # methods used by dead store elimination and whole pipeline tests
     def store_eliminated_test(
@@ -91,7 +97,7 @@ class TackyOptimizationTest(basic.TestChapter):
             redundant_consts: any constants that were sources of mov instructions in the
                 original program but shouldn't be after dead store elimination
         """
-        redundant_operands = [asm.Immediate(c) for c in redundant_consts]
+        redundant_operands = {asm.Immediate(c) for c in redundant_consts}
 
         def is_dead_store(i: asm.AsmItem) -> bool:
             # returns true if we find _any_ instruction where redundant_const is source operand
@@ -2,10 +2,9 @@
 
 from __future__ import annotations
 
-import itertools
 from enum import Enum, auto, unique
 from pathlib import Path
-from typing import Callable, Iterable, List, Type, TypeVar
+from typing import Callable, List, Type, TypeVar
 
 from .. import basic
 from . import common, const_fold, copy_prop, dead_store_elim, pipeline, unreachable
@@ -53,23 +52,21 @@ def configure_tests(
     setattr(cls, "options", options)
     setattr(cls, "exit_stage", None)
 
-    tests: Iterable[Path]
     if cls == unreachable.TestUnreachableCodeElim:
         # no distinction b/t int_only and all_types
-        tests = cls.test_dir.rglob("*.c")
+        test_dirs = [cls.test_dir]
+    elif int_only:
+        test_dirs = [cls.test_dir / "int_only"]
     else:
-        tests = (cls.test_dir / "int_only").rglob("*.c")
-        if not int_only:
-            partii_tests = (cls.test_dir / "all_types").rglob("*.c")
-            tests = itertools.chain(tests, partii_tests)
-
-    for program in tests:
-        if basic.excluded_extra_credit(program, extra_credit_flags):
-            continue
-        key = program.relative_to(cls.test_dir).with_suffix("")
-        name = f"test_{key}"
-        assert not getattr(cls, name, None)  # sanity check - no duplicate tests
-        setattr(cls, name, test_maker(program))
+        test_dirs = [cls.test_dir / "int_only", cls.test_dir / "all_types"]
+
+    for test_dir in test_dirs:
+        for entry in basic.find_tests(test_dir, extra_credit_flags):
+            program = entry.path
+            key = program.relative_to(cls.test_dir).with_suffix("")
+            name = f"test_{key}"
+            assert not getattr(cls, name, None)  # sanity check - no duplicate tests
+            setattr(cls, name, test_maker(program))
 
 
 def build_tacky_test_suite(
@@ -0,0 +1,96 @@
+"""Tests for the batch compilation protocol"""
+
+from __future__ import annotations
+
+import sys
+import unittest
+from pathlib import Path
+from typing import Any, List, Type, cast
+from unittest.mock import patch
+
+from ..basic import ExtraCredit, TestChapter, build_test_class
+from ..batch import BATCH_OPTION, run_batch
+
+# stand-in compiler that accepts files whose names start with "valid" and rejects everything else
+BATCH_COMPILER = """
+import json, sys
+for line in sys.stdin:
+    ok = line.strip().split("/")[-1].startswith("valid")
+    print(json.dumps({"returncode": 0 if ok else 1, "stderr": "" if ok else "error"}))
+"""
+
+
+class RunBatchTest(unittest.TestCase):
+    files = [Path("/tmp/valid_a.c"), Path("/tmp/invalid_b.c"), Path("/tmp/valid_c.c")]
+
+    def test_results_in_order(self) -> None:
+        """We get one result per file, in the order we sent them"""
+        results = run_batch(
+            [sys.executable, "-c", BATCH_COMPILER, "--lex", BATCH_OPTION], self.files
+        )
+        assert results is not None  # placate mypy
+        self.assertEqual([r.returncode for r in results], [0, 1, 0])
+        self.assertEqual([r.stderr for r in results], ["", "error", ""])
+        # args don't include --batch but do include the source file
+        self.assertEqual(
+            results[1].args,
+            [sys.executable, "-c", BATCH_COMPILER, "--lex", self.files[1]],
+        )
+
+    def test_unsupported(self) -> None:
+        """We return None if the compiler fails or its output doesn't follow the protocol"""
+        not_json = "import sys; [print('ok') for _ in sys.stdin]"
+        too_few = """print('{"returncode": 0}')"""
+        for script in ["import sys; sys.exit(1)", not_json, too_few]:
+            with self.subTest(script=script):
+                self.assertIsNone(
+                    run_batch([sys.executable, "-c", script, BATCH_OPTION], self.files)
+                )
+
+
+class BatchSelectionTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_class = cast(
+            Type[TestChapter],
+            build_test_class(
+                Path(sys.executable),
+                1,
+                options=[],
+                stage="lex",
+                extra_credit_flags=ExtraCredit.NONE,
+                skip_invalid=False,
+                error_codes=[1],
+            ),
+        )
+        self.test_class.use_batch = True
+        self.test_ids = [
+            f"{self.test_class.__module__}.{self.test_class.__qualname__}.{name}"
+            for name in unittest.defaultTestLoader.getTestCaseNames(self.test_class)
+        ]
+        # every source file passed to run_batch
+        self.batched: List[Path] = []
+
+    def tearDown(self) -> None:
+        self.test_class.tearDownClass()
+        TestChapter.selected_tests = None
+
+    def fake_run_batch(self, _args: Any, source_files: List[Path]) -> None:
+        self.batched.extend(source_files)
+
+    def test_only_selected(self) -> None:
+        """Only batch-compile the tests we'll actually run (e.g. in this shard)"""
+        selected = self.test_ids[::2]
+        TestChapter.selected_tests = frozenset(selected)
+        with patch("test_framework.basic.run_batch", new=self.fake_run_batch):
+            self.test_class.setUpClass()
+        self.assertEqual(len(self.batched), len(selected))
+        self.assertEqual(
+            sorted(self.test_class.batch_dirs),
+            sorted(test_id.split(".")[-1] for test_id in selected),
+        )
+
+    def test_no_selection(self) -> None:
+        """Without a selection, batch-compile every test in the class"""
+        with patch("test_framework.basic.run_batch", new=self.fake_run_batch):
+            self.test_class.setUpClass()
+        self.assertEqual(len(self.batched), len(self.test_ids))
@@ -0,0 +1,83 @@
+"""Tests for benchmark statistics and the run-time benchmark programs"""
+
+from __future__ import annotations
+
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .. import basic
+from ..benchmark import (
+    build_benchmark_class,
+    compare,
+    mann_whitney_u,
+    percentile,
+    summarize,
+)
+
+
+def make_results(times: Dict[str, List[float]]) -> Dict[str, Any]:
+    programs: Dict[str, Dict[str, Any]] = {}
+    for prog, prog_times in times.items():
+        programs[prog] = {"times": prog_times}
+        programs[prog].update(summarize(prog_times))
+    return {"stage": "run", "programs": programs}
+
+
+class StatisticsTest(unittest.TestCase):
+    def test_percentile(self) -> None:
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50.5)
+        self.assertAlmostEqual(percentile(values, 95), 95.05)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+
+    def test_mann_whitney_u(self) -> None:
+        baseline = [1.0, 1.1, 0.9, 1.05, 0.95, 1.02]
+        slower = [t * 1.5 for t in baseline]
+        # clearly slower
+        self.assertLess(mann_whitney_u(baseline, slower), 0.01)
+        # clearly faster
+        self.assertGreater(mann_whitney_u(slower, baseline), 0.99)
+        # same distribution
+        self.assertGreater(mann_whitney_u(baseline, list(reversed(baseline))), 0.4)
+        # all values tied
+        self.assertEqual(mann_whitney_u([1.0] * 5, [1.0] * 5), 1.0)
+
+    def test_compare(self) -> None:
+        """Only flag slowdowns that are significant and large enough"""
+        noise = [1.0, 1.1, 0.9, 1.05, 0.95, 1.02]
+        baseline = make_results(
+            {"slow.c": noise, "same.c": noise, "tiny.c": noise, "gone.c": noise}
+        )
+        current = make_results(
+            {
+                "slow.c": [t * 2 for t in noise],
+                "same.c": noise,
+                # consistently slower, but by less than MIN_SLOWDOWN
+                "tiny.c": [t * 1.01 for t in noise],
+                "new.c": noise,
+            }
+        )
+        slowdowns, geomean = compare(baseline, current)
+        self.assertEqual([s[0] for s in slowdowns], ["slow.c"])
+        self.assertAlmostEqual(slowdowns[0][1], 2.0)
+        assert geomean is not None  # placate mypy
+        self.assertAlmostEqual(geomean, (2.0 * 1.0 * 1.01) ** (1 / 3))
+
+
+class BenchmarkProgramsTest(unittest.TestCase):
+    def test_benchmark_classes(self) -> None:
+        """Every benchmark program gets a test and has an expected result"""
+        programs = set(basic.TEST_DIR.glob("chapter_*/benchmarks/**/*.c"))
+        self.assertTrue(programs)
+        found = set()
+        for chapter in range(1, 21):
+            test_class = build_benchmark_class(Path("/bin/false"), chapter, [])
+            if test_class is None:
+                continue
+            for name in unittest.defaultTestLoader.getTestCaseNames(test_class):
+                program = test_class.program_for(name)
+                self.assertIn(f"chapter_{chapter}", program.parts)
+                self.assertIn(basic.get_props_key(program), basic.EXPECTED_RESULTS)
+                found.add(program)
+        self.assertEqual(found, {p.resolve() for p in programs})
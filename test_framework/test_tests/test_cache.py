@@ -0,0 +1,47 @@
+"""Tests for the result cache"""
+
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from ..cache import ResultCache
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        tmp_path = Path(self.tmpdir.name)
+        self.compiler = tmp_path / "cc"
+        self.compiler.write_text("#!/bin/sh\n")
+        self.program = tmp_path / "prog.c"
+        self.program.write_text("int main(void) { return 0; }\n")
+        self.cache = ResultCache(tmp_path / "cache", self.compiler)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_record_and_lookup(self) -> None:
+        """We find results we've recorded, and only those"""
+        key = self.cache.key(["test_prog", "None"], [self.program])
+        self.assertFalse(self.cache.lookup(key))
+        self.cache.record(key, "test_prog")
+        self.assertTrue(self.cache.lookup(key))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_key_depends_on_inputs(self) -> None:
+        """Changing the test's configuration or source files changes its key"""
+        key = self.cache.key(["test_prog", "None"], [self.program])
+        self.assertEqual(key, self.cache.key(["test_prog", "None"], [self.program]))
+        self.assertNotEqual(key, self.cache.key(["test_prog", "lex"], [self.program]))
+
+        self.program.write_text("int main(void) { return 1; }\n")
+        self.assertNotEqual(key, self.cache.key(["test_prog", "None"], [self.program]))
+
+    def test_key_depends_on_compiler(self) -> None:
+        """Changing the compiler under test invalidates every cache entry"""
+        key = self.cache.key(["test_prog"], [self.program])
+        self.compiler.write_text("#!/bin/bash\n")
+        new_cache = ResultCache(self.cache.cache_dir, self.compiler)
+        self.assertNotEqual(key, new_cache.key(["test_prog"], [self.program]))
@@ -0,0 +1,88 @@
+"""Tests for compiling helper files once per test run"""
+
+from __future__ import annotations
+
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, List
+from unittest.mock import patch
+
+from ..basic import HelperObjects
+
+HELPER = "int helper(void) { return 1; }\n"
+
+# the real subprocess.run, since the tests replace it
+run = subprocess.run
+
+
+class HelperObjectsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = Path(self.tmpdir.name) / "helper.c"
+        self.source.write_text(HELPER)
+        self.helpers = HelperObjects()
+        # every gcc command we run
+        self.commands: List[Any] = []
+        self.commands_lock = threading.Lock()
+
+    def tearDown(self) -> None:
+        if self.helpers.tmpdir is not None:
+            self.helpers.tmpdir.cleanup()
+        self.tmpdir.cleanup()
+
+    def run_gcc(self, args: Any, **kwargs: Any) -> subprocess.CompletedProcess[str]:
+        """Stand-in for subprocess.run that records each command,
+        and is slow enough that other threads ask for the same helper in the meantime"""
+        with self.commands_lock:
+            self.commands.append(args)
+        time.sleep(0.2)
+        return run(args, **kwargs)  # pylint: disable=subprocess-run-check
+
+    def test_compile_once(self) -> None:
+        """Concurrent requests for the same helper compile it only once"""
+        with patch("test_framework.basic.subprocess.run", new=self.run_gcc):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                objs = list(
+                    executor.map(lambda _: self.helpers.get(self.source, []), range(8))
+                )
+            # different options make a different object file
+            other = self.helpers.get(self.source, ["-O2"])
+        self.assertEqual(len(self.commands), 2)
+        self.assertEqual(len(set(objs)), 1)
+        self.assertTrue(objs[0].exists())
+        self.assertNotEqual(other, objs[0])
+
+    def test_failed_build(self) -> None:
+        """Report a helper that fails to compile, and try again next time"""
+        self.source.write_text("this isn't C")
+        with patch("test_framework.basic.subprocess.run", new=self.run_gcc):
+            with self.assertRaises(RuntimeError) as cm:
+                self.helpers.get(self.source, [])
+            self.assertIn("error", str(cm.exception))
+            self.assertEqual(self.helpers.objects, {})
+
+            self.source.write_text(HELPER)
+            obj = self.helpers.get(self.source, [])
+        self.assertEqual(len(self.commands), 2)
+        self.assertTrue(obj.exists())
+
+    def test_same_name(self) -> None:
+        """Helpers with the same file name get different object files,
+        even after one of them fails to compile and is retried"""
+        other_dir = Path(self.tmpdir.name) / "other"
+        other_dir.mkdir()
+        other = other_dir / "helper.c"
+        other.write_text("int other_helper(void) { return 2; }\n")
+
+        self.source.write_text("this isn't C")
+        with self.assertRaises(RuntimeError):
+            self.helpers.get(self.source, [])
+        self.source.write_text(HELPER)
+        objs = [self.helpers.get(other, []), self.helpers.get(self.source, [])]
+        self.assertNotEqual(objs[0], objs[1])
+        self.assertTrue(all(obj.exists() for obj in objs))
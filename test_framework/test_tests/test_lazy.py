@@ -0,0 +1,31 @@
+"""Tests for lazily-loaded collections"""
+
+from __future__ import annotations
+
+import unittest
+from typing import Dict, List
+
+from ..lazy import LazyMapping, LazySet
+
+
+class LazyTest(unittest.TestCase):
+    def test_load_on_first_use(self) -> None:
+        """We don't call the loader until we need the data, then only call it once"""
+        calls: List[str] = []
+
+        def load() -> Dict[str, int]:
+            calls.append("load")
+            return {"a": 1, "b": 2}
+
+        mapping = LazyMapping(load)
+        self.assertEqual(calls, [])
+        self.assertEqual(mapping["a"], 1)
+        self.assertEqual(mapping.get("c"), None)
+        self.assertEqual(sorted(mapping), ["a", "b"])
+        self.assertEqual(calls, ["load"])
+
+    def test_set(self) -> None:
+        lazy_set = LazySet(lambda: {"x", "y"})
+        self.assertIn("x", lazy_set)
+        self.assertNotIn("z", lazy_set)
+        self.assertEqual(len(lazy_set), 2)
@@ -0,0 +1,147 @@
+"""Tests for the test program manifest"""
+
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from .. import basic
+from ..manifest import (
+    CLIENT,
+    HELPER,
+    LIBRARY,
+    MANIFEST_NAME,
+    PROGRAM,
+    build_manifest,
+    load_manifest,
+)
+
+
+class ManifestTest(unittest.TestCase):
+    def test_up_to_date(self) -> None:
+        """test_manifest.json matches the programs in tests/"""
+        expected = build_manifest(basic.ROOT_DIR).to_json()
+        actual = (basic.ROOT_DIR / MANIFEST_NAME).read_text(encoding="utf-8")
+        self.assertEqual(
+            actual,
+            expected,
+            msg=f"{MANIFEST_NAME} is out of date; regenerate it with "
+            "'python3 -m test_framework.manifest'",
+        )
+
+    def test_metadata(self) -> None:
+        manifest = basic.MANIFEST.value
+        libraries = manifest.find(
+            basic.TEST_DIR.resolve() / "chapter_13" / "valid" / "libraries"
+        )
+        lib = next(p for p in libraries if p.path.name == "double_params_and_result.c")
+        self.assertEqual((lib.chapter, lib.kind, lib.role), (13, "valid", LIBRARY))
+        self.assertTrue(lib.requires_mathlib)
+        self.assertIn(
+            "chapter_13/valid/libraries/double_params_and_result_client.c",
+            lib.dependencies,
+        )
+        client = next(
+            p for p in libraries if p.path.name == "double_params_and_result_client.c"
+        )
+        self.assertEqual(client.role, CLIENT)
+        # the client shares the library's entry in test_properties.json
+        self.assertTrue(client.requires_mathlib)
+
+        # basic looks up each program's libraries in the manifest
+        self.assertEqual(
+            basic.get_libs(client.path), [basic.TEST_DIR / lib for lib in client.libs]
+        )
+        self.assertIn(
+            client.path.with_name("double_params_and_result.c"),
+            basic.get_dependencies(client.path),
+        )
+        self.assertTrue(basic.needs_mathlib(client.path) != basic.IS_OSX)
+
+        helpers = manifest.find(basic.TEST_DIR.resolve() / "chapter_20" / "helper_libs")
+        self.assertTrue(helpers)
+        self.assertTrue(all(p.role == HELPER for p in helpers))
+
+    def test_find_tests(self) -> None:
+        """find_tests matches walking the directory, minus extra credit and helpers"""
+        test_dir = basic.TEST_DIR.resolve() / "chapter_20"
+        expected = sorted(
+            p
+            for p in test_dir.rglob("*.c")
+            if "helper_libs" not in p.parts
+            and not basic.excluded_extra_credit(p, basic.ExtraCredit.BITWISE)
+        )
+        actual = [
+            p.path for p in basic.find_tests(test_dir, basic.ExtraCredit.BITWISE)
+        ]
+        self.assertEqual(actual, expected)
+        self.assertLess(
+            len(basic.find_tests(test_dir / "int_only", basic.ExtraCredit.ALL)),
+            len(actual),
+        )
+
+
+class LoadManifestTest(unittest.TestCase):
+    """Load a manifest for a tiny test suite"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmpdir.name)
+        libraries = self.root / "tests" / "chapter_1" / "valid" / "libraries"
+        libraries.mkdir(parents=True)
+        (libraries / "lib.c").write_text('#include "../util.h"\n')
+        (libraries / "lib_client.c").write_text("int main(void) { return 0; }\n")
+        (libraries.parent / "util.h").write_text("int util(void);\n")
+        (libraries.parent / "prog.c").write_text("int main(void) { return 0; }\n")
+        properties = {
+            "extra_credit_tests": {},
+            "requires_mathlib": ["chapter_1/valid/libraries/lib.c"],
+            "libs": {},
+            "assembly_libs": {},
+        }
+        (self.root / "test_properties.json").write_text(json.dumps(properties))
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def check(self) -> None:
+        manifest = load_manifest(self.root)
+        summary = [
+            (p.path.name, p.role, p.requires_mathlib, p.dependencies)
+            for p in manifest.programs
+        ]
+        self.assertEqual(
+            summary,
+            [
+                (
+                    "lib.c",
+                    LIBRARY,
+                    True,
+                    ("chapter_1/valid/libraries/lib_client.c", "chapter_1/valid/util.h"),
+                ),
+                (
+                    "lib_client.c",
+                    CLIENT,
+                    True,
+                    ("chapter_1/valid/libraries/lib.c", "chapter_1/valid/util.h"),
+                ),
+                ("prog.c", PROGRAM, False, ()),
+            ],
+        )
+
+    def test_round_trip(self) -> None:
+        (self.root / MANIFEST_NAME).write_text(build_manifest(self.root).to_json())
+        # delete a program, so we can tell we're using the saved manifest
+        (self.root / "tests" / "chapter_1" / "valid" / "prog.c").unlink()
+        self.check()
+
+    def test_missing(self) -> None:
+        """Without a manifest, index the test programs from scratch"""
+        self.check()
+
+    def test_old_version(self) -> None:
+        (self.root / MANIFEST_NAME).write_text('{"version": 0, "programs": []}')
+        with self.assertWarns(UserWarning):
+            self.check()
@@ -0,0 +1,102 @@
+"""Tests for the optimization matrix"""
+
+from __future__ import annotations
+
+import threading
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+from .. import basic
+from ..matrix import (
+    LevelResult,
+    find_programs,
+    format_matrix,
+    measure,
+    optimization_matrix,
+)
+from ..timing import TIMEOUT, LimitExceeded
+
+
+def level(instructions: int, stack_accesses: int, median: float) -> Dict[str, Any]:
+    return {
+        "instructions": instructions,
+        "stack_accesses": stack_accesses,
+        "times": [median],
+        "median": median,
+    }
+
+
+class MatrixTest(unittest.TestCase):
+    def test_find_programs(self) -> None:
+        programs = find_programs(19, basic.ExtraCredit.NONE, int_only=True)
+        keys = {str(p.relative_to(basic.TEST_DIR.resolve())) for p in programs}
+        self.assertIn("chapter_8/benchmarks/collatz.c", keys)
+        self.assertIn("chapter_19/whole_pipeline/int_only/dead_condition.c", keys)
+        # no Part II features, helper libraries, extra credit, or chapter 20 tests
+        self.assertNotIn("chapter_18/benchmarks/particles.c", keys)
+        for k in keys:
+            self.assertNotIn("all_types", k)
+            self.assertNotIn("helper_libs", k)
+            self.assertNotIn("extra_credit", k)
+            self.assertFalse(k.startswith("chapter_20"))
+
+    def test_format_matrix(self) -> None:
+        results = {
+            "levels": [{"name": "none", "options": []}, {"name": "fold", "options": []}],
+            "programs": {
+                "a.c": {"none": level(10, 4, 0.002), "fold": level(5, 2, 0.001)},
+                "b.c": {"none": level(10, 4, 0.002), "fold": {"error": "oops\nmore"}},
+            },
+        }
+        table = format_matrix(results)
+        # b.c failed at one level, so it's left out of the totals
+        self.assertIn("none: 10 insns, 4 stack, 2.0ms", table)
+        self.assertIn("fold: 5 insns (-50.0%), 2 stack (-50.0%), 1.0ms (-50.0%)", table)
+        self.assertIn("1 build(s) failed:\n  b.c (fold): oops", table)
+
+    def test_separate_scratch_dirs(self) -> None:
+        """Builds running at the same time never share a scratch directory"""
+        programs = find_programs(19, basic.ExtraCredit.NONE, int_only=True)[:3]
+        scratch_dirs: List[Path] = []
+        lock = threading.Lock()
+
+        def fake_build(
+            compiler: Path, options: List[str], program: Path, scratch_dir: Path
+        ) -> LevelResult:
+            with lock:
+                scratch_dirs.append(scratch_dir)
+            return LevelResult(error="not built")
+
+        with patch("test_framework.matrix.build", new=fake_build):
+            optimization_matrix(
+                Path("/bin/true"),
+                programs,
+                [("none", []), ("fold", ["--fold-constants"])],
+                repeat=1,
+                warmup=0,
+                jobs=4,
+                run_timeout=None,
+            )
+        self.assertEqual(len(scratch_dirs), 6)
+        self.assertEqual(len(set(scratch_dirs)), 6)
+
+    def test_run_timeout(self) -> None:
+        """Run each executable with the timeout we're given"""
+        [program] = [
+            p
+            for p in find_programs(19, basic.ExtraCredit.NONE, int_only=True)
+            if p.name == "collatz.c"
+        ]
+        timeouts: List[Any] = []
+
+        def fake_run_phase(*args: Any, timeout: Any = None, **kwargs: Any) -> Any:
+            timeouts.append(timeout)
+            raise LimitExceeded(TIMEOUT, "timed out")
+
+        result = LevelResult(exe=Path("/nonexistent"))
+        with patch("test_framework.matrix.run_phase", new=fake_run_phase):
+            measure(program, result, repeat=3, warmup=0, run_timeout=2.5)
+        self.assertEqual(timeouts, [2.5])
+        self.assertEqual(result.error, "timed out")
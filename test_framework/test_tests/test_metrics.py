@@ -0,0 +1,81 @@
+"""Tests for assembly metrics and the per-chapter metrics summary"""
+
+from __future__ import annotations
+
+import io
+import unittest
+from dataclasses import asdict
+
+from ..parser.asm import (
+    AssemblyFunction,
+    Immediate,
+    Instruction,
+    Label,
+    Memory,
+    Opcode,
+    Register,
+)
+from ..parser.metrics import FunctionMetrics, function_metrics
+from ..report import AsmMetricsReporter
+
+FUNCTION = AssemblyFunction(
+    name=Label("main"),
+    instructions=[
+        Instruction(Opcode.PUSH, [Register.BP]),
+        Instruction(Opcode.MOV, [Register.SP, Register.BP]),
+        Instruction(Opcode.SUB, [Immediate(16), Register.SP]),
+        Instruction(Opcode.MOV, [Immediate(2), Memory([-4], Register.BP)]),
+        Instruction(Opcode.LEA, [Memory([-8], Register.BP), Register.AX]),
+        Label(".Lloop"),
+        Instruction(Opcode.ADD, [Memory(["x"], Register.IP), Register.AX]),
+        Instruction(Opcode.MOV, [Register.AX, Register.CX]),
+        Instruction(Opcode.MOV, [Register.BP, Register.SP]),
+        Instruction(Opcode.POP, [Register.BP]),
+        Instruction(Opcode.RET, []),
+    ],
+)
+
+
+class MetricsTest(unittest.TestCase):
+    def test_function_metrics(self) -> None:
+        expected = FunctionMetrics(
+            instructions=10,
+            opcodes={
+                "push": 1,
+                "mov": 4,
+                "sub": 1,
+                "lea": 1,
+                "add": 1,
+                "pop": 1,
+                "ret": 1,
+            },
+            # lea doesn't access memory
+            memory_operands=2,
+            stack_accesses=1,
+            pushes=1,
+            pops=1,
+            frame_size=16,
+            # includes moving RSP to RBP and back
+            reg_to_reg_movs=3,
+        )
+        self.assertEqual(function_metrics(FUNCTION), expected)
+
+    def test_summary(self) -> None:
+        metrics = asdict(function_metrics(FUNCTION))
+        stream = io.StringIO()
+        reporter = AsmMetricsReporter(stream)
+        for chapter in [1, 1, 3]:
+            reporter.add(
+                {"id": "x", "chapter": chapter, "asm_metrics": {"main": metrics}}
+            )
+        # tests without metrics (e.g. cached or failed ones) are ignored
+        reporter.add({"id": "y", "chapter": 2})
+        reporter.close()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(
+            lines[3].split(),
+            ["1", "2", "2", "20", "4", "2", "2", "2", "6", "16.0"]
+            + ["mov", "8,", "push", "2,", "sub", "2"],
+        )
+        self.assertEqual(lines[4].split()[:2], ["3", "1"])
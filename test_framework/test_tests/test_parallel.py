@@ -0,0 +1,179 @@
+"""Tests for running tests in parallel"""
+
+from __future__ import annotations
+
+import io
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from typing import List, Tuple
+
+from ..durations import DurationsDB, longest_first, partition, predict_makespan
+from ..parallel import ParallelTestSuite
+
+
+class Dummies:
+    """Dummy test classes to run in parallel.
+    (Nested in another class so the test loader doesn't discover them.)"""
+
+    class Slow(unittest.TestCase):
+        """The first test finishes after everything else"""
+
+        def test_a_slow_pass(self) -> None:
+            time.sleep(0.2)
+
+        def test_b_fail(self) -> None:
+            self.fail("expected failure")
+
+    class Fast(unittest.TestCase):
+        def test_c_pass(self) -> None:
+            pass
+
+        def test_d_error(self) -> None:
+            raise RuntimeError("expected error")
+
+        @unittest.skip("expected skip")
+        def test_e_skip(self) -> None:
+            pass
+
+    class Cached(unittest.TestCase):
+        """Stands in for a TestChapter that reused a cached result (see --cache-dir)"""
+
+        cached = True
+
+        def test_f_cached(self) -> None:
+            pass
+
+
+def load(*classes: type) -> unittest.TestSuite:
+    suite = unittest.TestSuite()
+    for cls in classes:
+        suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(cls))
+    return suite
+
+
+def run_with(
+    suite: unittest.TestSuite, failfast: bool = False
+) -> Tuple[str, unittest.TestResult]:
+    stream = io.StringIO()
+    runner = unittest.TextTestRunner(stream=stream, verbosity=2, failfast=failfast)
+    result = runner.run(suite)
+    return stream.getvalue(), result
+
+
+class ParallelTestSuiteTest(unittest.TestCase):
+    def test_same_report_as_serial(self) -> None:
+        """Parallel and serial runs report the same results in the same order"""
+        serial_output, serial_result = run_with(load(Dummies.Slow, Dummies.Fast))
+        parallel_output, parallel_result = run_with(
+            ParallelTestSuite(load(Dummies.Slow, Dummies.Fast), jobs=4)
+        )
+
+        def summarize(output: str) -> List[str]:
+            # drop timing info
+            return [l for l in output.splitlines() if not l.startswith("Ran ")]
+
+        self.assertEqual(summarize(serial_output), summarize(parallel_output))
+        self.assertEqual(serial_result.testsRun, parallel_result.testsRun)
+        self.assertEqual(len(parallel_result.failures), 1)
+        self.assertEqual(len(parallel_result.errors), 1)
+        self.assertEqual(len(parallel_result.skipped), 1)
+
+    def test_failfast(self) -> None:
+        """With failfast, stop reporting results after the first failure"""
+        _, result = run_with(ParallelTestSuite(load(Dummies.Slow), jobs=2), failfast=True)
+        self.assertEqual(result.testsRun, 2)
+        self.assertEqual(len(result.failures), 1)
+
+
+class DurationsTest(unittest.TestCase):
+    def test_longest_first(self) -> None:
+        self.assertEqual(
+            longest_first(["a", "b", "c", "d"], [1.0, 3.0, 1.0, 2.0]),
+            ["b", "d", "a", "c"],
+        )
+
+    def test_predict_makespan(self) -> None:
+        # in the original order, the 4-second test starts last
+        self.assertEqual(predict_makespan([1.0, 1.0, 1.0, 1.0, 4.0], jobs=2), 6.0)
+        self.assertEqual(predict_makespan([4.0, 1.0, 1.0, 1.0, 1.0], jobs=2), 4.0)
+        self.assertEqual(predict_makespan([4.0, 1.0, 1.0, 1.0, 1.0], jobs=1), 8.0)
+
+    def test_partition(self) -> None:
+        test_ids = ["a", "b", "c", "d", "e", "f"]
+        # balanced by estimated duration, not by number of tests
+        self.assertEqual(
+            partition(test_ids, [6.0, 1.0, 2.0, 1.0, 1.0, 1.0], 2), [0, 1, 1, 1, 1, 1]
+        )
+        # without estimates, deal tests out in order of ID
+        self.assertEqual(partition(test_ids, [1.0] * 6, 4), [0, 1, 2, 3, 0, 1])
+        # independent of the order we found the tests in
+        shuffled = ["f", "b", "e", "a", "d", "c"]
+        estimates = [3.0, 1.0, 2.0, 5.0, 4.0, 1.0]
+        by_id = dict(zip(shuffled, partition(shuffled, estimates, 3)))
+        sorted_estimates = [estimates[shuffled.index(t)] for t in test_ids]
+        self.assertEqual(
+            partition(test_ids, sorted_estimates, 3), [by_id[t] for t in test_ids]
+        )
+
+    def test_partition_without_durations(self) -> None:
+        """With an empty durations database, every shard still gets some tests"""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DurationsDB(Path(tmp) / "durations.json")
+        test_ids = [f"test_{i}" for i in range(10)]
+        estimates, known = db.estimate(test_ids)
+        self.assertEqual((estimates, known), ([0.0] * 10, 0))
+        self.assertEqual(
+            partition(test_ids, estimates, 4), [0, 1, 2, 3, 0, 1, 2, 3, 0, 1]
+        )
+        # tests that take no time are spread evenly across the least-loaded shards
+        shards = partition(test_ids, [5.0] + [0.0] * 9, 4)
+        self.assertEqual(shards[0], 0)
+        self.assertEqual([shards[1:].count(s) for s in range(4)], [0, 3, 3, 3])
+
+    def test_db(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "durations.json"
+            # a missing or corrupt database is empty
+            self.assertIsNone(DurationsDB(path).get("a"))
+            path.write_text("not json")
+            db = DurationsDB(path)
+            self.assertIsNone(db.get("a"))
+
+            db.record("a", 2.0)
+            db.record("a", 4.0)  # smoothed with the previous estimate
+            db.record("b", 1.0)
+            db.save()
+            db = DurationsDB(path)
+            self.assertEqual(db.get("a"), 3.0)
+            # unknown tests get the median of the known ones
+            self.assertEqual(
+                db.estimate(["a", "b", "c", "d"]), ([3.0, 1.0, 2.0, 2.0], 2)
+            )
+
+    def test_slowest_first(self) -> None:
+        """With a durations database, start the slowest tests first
+        but still report results in the original order"""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DurationsDB(Path(tmp) / "durations.json")
+            suite = load(Dummies.Slow, Dummies.Fast, Dummies.Cached)
+            # run once to learn how long each test takes
+            run_with(ParallelTestSuite(suite, jobs=2, durations=db))
+            slow_test = next(t for t in db.durations if t.endswith("test_a_slow_pass"))
+            self.assertGreaterEqual(db.durations[slow_test], 0.2)
+            # don't record tests we skipped or didn't really run
+            for test_id in db.durations:
+                self.assertNotIn("test_e_skip", test_id)
+                self.assertNotIn("test_f_cached", test_id)
+
+            parallel = ParallelTestSuite(load(Dummies.Fast, Dummies.Slow), 2, db)
+            output, _ = run_with(parallel)
+            self.assertEqual(parallel.known_durations, 4)
+            assert parallel.predicted_makespan is not None  # placate mypy
+            assert parallel.actual_makespan is not None
+            self.assertGreaterEqual(parallel.predicted_makespan, 0.2)
+            self.assertGreaterEqual(parallel.actual_makespan, 0.2)
+            self.assertLess(
+                output.index("test_c_pass"), output.index("test_a_slow_pass")
+            )
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import re
 import unittest
 from pathlib import Path
 from unittest.mock import mock_open, patch
@@ -588,3 +589,92 @@ __foobar:
         )
         for expected in [foo_asm, bar_asm, foobar_asm, _foobar_asm]:
             self.assertExpectedAssembly(asm, expected, target_fun=expected.name[1:])
+
+    def test_long_statements(self) -> None:
+        """Parse instructions with many operands and directives with many arguments"""
+        operands = ", ".join(["8(%rbp,%rax,4)"] * 1000)
+        quads = ", ".join(["123"] * 1000)
+        asm = f"""
+    .data
+table:
+    .quad {quads}
+    .text
+main:
+    pushq {operands}
+    ret
+"""
+        expected = AssemblyFunction(
+            name=Label("main"),
+            instructions=[
+                Instruction(
+                    Opcode.PUSH, [Memory([8], Register.BP, Register.AX, 4)] * 1000
+                ),
+                Instruction(Opcode.RET, []),
+            ],
+        )
+        self.assertExpectedAssembly(asm, expected)
+
+    def test_parse_errors(self) -> None:
+        """Report malformed operands"""
+        for bad_asm, message in [
+            ("main:\n    movl (%rbp %rax), %eax\n", "after base register"),
+            ("main:\n    movl (%rbp,%rax,4, %eax\n", "Remaining tokens: [Token("),
+            ("main:\n    movl %eax %ecx\n", "Expected TokType.COMMA"),
+        ]:
+            with self.subTest(asm=bad_asm):
+                with patch("builtins.open", mock_open(read_data=bad_asm)):
+                    with self.assertRaisesRegex(parse.ParseError, re.escape(message)):
+                        parse.parse_file(Path("dummy.asm"))
+
+    def test_requested_functions(self) -> None:
+        """Only parse the functions we ask for"""
+        asm = """
+    .text
+helper:
+    movl (%rbp %rax), %eax # we can't parse this but we don't need to
+main:
+    movl $2, %eax
+    .section .rodata
+.Lconst:
+    .quad 1
+    .text
+    ret
+other:
+    movl ???
+"""
+        with patch("builtins.open", mock_open(read_data=asm)):
+            functions = parse.parse_file(Path("dummy.asm"), functions={"main"})
+        self.assertEqual(list(functions), ["main"])
+        self.assertEqual(functions["main"], self.BASIC_PROGRAM)
+        # without a list of functions, parse everything
+        with patch("builtins.open", mock_open(read_data=asm)):
+            with self.assertRaises(parse.ParseError):
+                parse.parse_file(Path("dummy.asm"))
+
+    def test_immutable_operands(self) -> None:
+        """Parsed operands and instructions can't be modified, and can go in sets"""
+        asm = """
+main:
+    movl %eax, -4(%rbp)
+    movl -4(%rbp), %ecx
+    movl %eax, -4(%rbp)
+"""
+        with patch("builtins.open", mock_open(read_data=asm)):
+            instructions = parse.parse_file(Path("dummy.asm"))["main"].instructions
+        self.assertEqual(len(set(instructions)), 2)
+        first = instructions[0]
+        assert isinstance(first, Instruction)  # placate mypy
+        self.assertEqual(
+            {op for i in instructions for op in i.operands},  # type: ignore
+            {Register.AX, Register.CX, Memory([Operator.MINUS, 4], Register.BP)},
+        )
+        # operand lists are stored as tuples, but still compare equal to
+        # instructions constructed from lists
+        self.assertEqual(
+            first,
+            Instruction(
+                Opcode.MOV, [Register.AX, Memory([Operator.MINUS, 4], Register.BP)]
+            ),
+        )
+        with self.assertRaises(AttributeError):
+            first.opcode = Opcode.ADD
@@ -0,0 +1,95 @@
+"""Tests for the parsed assembly cache"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from ..parser import parse
+from ..parser.parse_cache import ParseCache
+
+ASM = """
+    .text
+helper:
+    movl $1, %eax
+    ret
+main:
+    movl $2, %eax
+    ret
+"""
+
+
+class ParseCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmpdir.name)
+        self.asm_file = self.tmp_path / "prog.s"
+        self.asm_file.write_text(ASM)
+        self.platform_patcher = patch("sys.platform", new="linux")
+        self.platform_patcher.start()
+
+    def tearDown(self) -> None:
+        self.platform_patcher.stop()
+        self.tmpdir.cleanup()
+
+    def test_memoize(self) -> None:
+        """Parse each distinct file once"""
+        cache = ParseCache()
+        expected = parse.parse_file(self.asm_file)
+        self.assertEqual(cache.parse_file(self.asm_file), expected)
+
+        # a different file with the same contents
+        copy = self.tmp_path / "copy.s"
+        copy.write_text(ASM)
+        self.assertEqual(cache.parse_file(copy), expected)
+        # a subset of the functions we've already parsed
+        self.assertEqual(
+            cache.parse_file(copy, functions={"main"}), {"main": expected["main"]}
+        )
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        # changing the file's contents invalidates the cache
+        self.asm_file.write_text(ASM.replace("$2", "$3"))
+        self.assertNotEqual(cache.parse_file(self.asm_file), expected)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_lru(self) -> None:
+        """Keep only the most recently used entries in memory"""
+        cache = ParseCache(maxsize=1)
+        cache.parse_file(self.asm_file, functions={"main"})
+        cache.parse_file(self.asm_file, functions={"helper"})
+        cache.parse_file(self.asm_file, functions={"main"})
+        self.assertEqual((cache.hits, cache.misses), (0, 3))
+
+    def test_disk(self) -> None:
+        """Reuse results from another ParseCache with the same cache directory"""
+        cache_dir = self.tmp_path / "cache"
+        ParseCache(cache_dir=cache_dir).parse_file(self.asm_file)
+        cache = ParseCache(cache_dir=cache_dir)
+        self.assertEqual(
+            cache.parse_file(self.asm_file), parse.parse_file(self.asm_file)
+        )
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_evict(self) -> None:
+        """Delete the least recently used entries when the on-disk cache is too big"""
+        cache_dir = self.tmp_path / "cache"
+        ParseCache(cache_dir=cache_dir).parse_file(self.asm_file)
+        [entry] = cache_dir.glob("*.pickle")
+        # make sure this entry looks older than the next one
+        os.utime(entry, (0, 0))
+
+        other_file = self.tmp_path / "other.s"
+        other_file.write_text(ASM.replace("$2", "$3"))
+        cache = ParseCache(cache_dir=cache_dir, max_disk_bytes=entry.stat().st_size)
+        cache.parse_file(other_file)
+        self.assertFalse(entry.exists())
+        self.assertEqual(len(list(cache_dir.glob("*.pickle"))), 1)
+
+        cache = ParseCache(cache_dir=cache_dir)
+        cache.parse_file(other_file)
+        cache.parse_file(self.asm_file)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
@@ -144,6 +144,7 @@ def make_sanitize_test(program: Path) -> Callable[[SanitizerTest], None]:
 def configure_tests() -> None:
     valid_progs = itertools.chain(
         basic.TEST_DIR.glob("chapter_*/valid/**/*.c"),
+        basic.TEST_DIR.glob("chapter_*/benchmarks/**/*.c"),
         basic.TEST_DIR.glob("chapter_19/**/*.c"),
         basic.TEST_DIR.glob("chapter_20/all_types/**/*.c"),
         basic.TEST_DIR.glob("chapter_20/int_only/**/*.c"),
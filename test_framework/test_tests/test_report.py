@@ -0,0 +1,189 @@
+"""Tests for machine-readable test reports"""
+
+from __future__ import annotations
+
+import functools
+import io
+import json
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Type
+
+from ..report import (
+    CompilerMemoryReporter,
+    DurationsReporter,
+    ReportingResult,
+    make_reporter,
+    merge_reports,
+)
+
+
+class Dummies:
+    """Dummy tests to report on.
+    (Nested in another class so the test loader doesn't discover them.)"""
+
+    class Mixed(unittest.TestCase):
+        def test_a_pass(self) -> None:
+            pass
+
+        def test_b_fail(self) -> None:
+            self.fail("x" * 10000)
+
+        @unittest.skip("expected skip")
+        def test_c_skip(self) -> None:
+            pass
+
+    class BrokenSetUp(unittest.TestCase):
+        @classmethod
+        def setUpClass(cls) -> None:
+            raise RuntimeError("can't set up")
+
+        def test_never_runs(self) -> None:
+            pass
+
+
+def run_with_report(
+    path: Path, case: Type[unittest.TestCase] = Dummies.Mixed
+) -> None:
+    reporter = make_reporter(path, None)
+    runner = unittest.TextTestRunner(
+        stream=io.StringIO(),
+        resultclass=functools.partial(ReportingResult, reporters=[reporter]),
+    )
+    runner.run(unittest.defaultTestLoader.loadTestsFromTestCase(case))
+    reporter.close()
+
+
+class ReportTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_json_lines(self) -> None:
+        """Write one record per test, with truncated error messages"""
+        path = Path(self.tmpdir.name) / "report.jsonl"
+        run_with_report(path)
+        records = [json.loads(l) for l in path.read_text().splitlines()]
+        self.assertEqual(
+            [(r["id"].rpartition(".")[2], r["outcome"]) for r in records],
+            [("test_a_pass", "pass"), ("test_b_fail", "fail"), ("test_c_skip", "skip")],
+        )
+        self.assertIn("more characters", records[1]["message"])
+        self.assertLess(len(records[1]["message"]), 5000)
+        self.assertEqual(records[2]["message"], "expected skip")
+
+    def test_class_fixture_error(self) -> None:
+        """Record an error in setUpClass, which unittest reports outside of any test"""
+        path = Path(self.tmpdir.name) / "report.jsonl"
+        run_with_report(path, Dummies.BrokenSetUp)
+        [record] = [json.loads(l) for l in path.read_text().splitlines()]
+        self.assertEqual(record["outcome"], "error")
+        self.assertTrue(record["id"].endswith("Dummies.BrokenSetUp.setUpClass"))
+        self.assertIn("RuntimeError: can't set up", record["message"])
+
+    def test_junit(self) -> None:
+        """Write JUnit XML if the file name ends in .xml"""
+        path = Path(self.tmpdir.name) / "report.xml"
+        run_with_report(path)
+        suite = ET.parse(path).getroot().find("testsuite")
+        assert suite is not None  # placate mypy
+        self.assertEqual(suite.get("tests"), "3")
+        self.assertEqual(suite.get("failures"), "1")
+        self.assertEqual(suite.get("errors"), "0")
+        self.assertEqual(suite.get("skipped"), "1")
+
+
+class DurationsTest(unittest.TestCase):
+    def test_slowest_per_phase(self) -> None:
+        """List the slowest test in each phase"""
+        stream = io.StringIO()
+        reporter = DurationsReporter(1, stream)
+        for name, compile_time, run_time in [("a.c", 0.5, 0.3), ("b.c", 2.0, 0.1)]:
+            reporter.add(
+                {
+                    "id": name,
+                    "source": name,
+                    "phases": [
+                        {"name": "compile", "wall_time": compile_time, "cpu_time": 0.25},
+                        {"name": "run", "wall_time": run_time, "cpu_time": None},
+                    ],
+                }
+            )
+        reporter.close()
+        lines = stream.getvalue().splitlines()
+        # b.c has the slowest compile phase, a.c has the slowest run phase
+        self.assertEqual(
+            [l.split()[-1] for l in lines if l.endswith(".c")], ["b.c", "a.c"]
+        )
+        self.assertIn("Slowest compile times (2 total, 2.50s wall):", lines)
+
+
+class CompilerMemoryTest(unittest.TestCase):
+    def test_summary(self) -> None:
+        stream = io.StringIO()
+        reporter = CompilerMemoryReporter(stream, threshold=100 * 2**20)
+        for chapter, source, rss in [
+            (1, "chapter_1/a.c", 10),
+            (1, "chapter_1/b.c", 30),
+            (1, "chapter_1/c.c", 20),
+            (20, "chapter_20/force_spill.c", 400),
+        ]:
+            reporter.add(
+                {
+                    "id": source,
+                    "chapter": chapter,
+                    "source": source,
+                    "phases": [
+                        {"name": "compile", "max_rss": rss * 2**20},
+                        {"name": "run", "max_rss": 1000 * 2**20},
+                    ],
+                }
+            )
+        # no measurement (e.g. server mode)
+        reporter.add(
+            {
+                "id": "x",
+                "chapter": 1,
+                "source": "chapter_1/x.c",
+                "phases": [{"name": "compile", "max_rss": None}],
+            }
+        )
+        reporter.close()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[3].split(), ["1", "3", "20.0", "30.0", "chapter_1/b.c"])
+        self.assertEqual(lines[4].split()[:2], ["20", "1"])
+        # only compile phases count toward the threshold
+        self.assertEqual(lines[6], "1 compilation(s) used more than 100 MB:")
+        self.assertEqual(lines[7].split(), ["400.0", "MB", "chapter_20/force_spill.c"])
+
+
+class MergeReportsTest(unittest.TestCase):
+    def test_merge(self) -> None:
+        """Combine per-shard reports, and flag tests that didn't pass or ran twice"""
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [Path(tmp) / "shard1.jsonl", Path(tmp) / "shard2.jsonl"]
+            records = [
+                [{"id": "a", "outcome": "pass"}, {"id": "b", "outcome": "timeout"}],
+                [{"id": "c", "outcome": "pass"}, {"id": "a", "outcome": "pass"}],
+            ]
+            for path, shard in zip(paths, records):
+                path.write_text("".join(json.dumps(r) + "\n" for r in shard))
+            merged = Path(tmp) / "merged.jsonl"
+            reporter = make_reporter(merged, None)
+            summary, success = merge_reports(paths, [reporter])
+            reporter.close()
+            self.assertFalse(success)
+            self.assertIn("Merged 4 test results from 2 report(s): 3 pass, 1 timeout", summary)
+            self.assertIn("1 test(s) didn't pass:\n  b: timeout", summary)
+            self.assertIn("1 test(s) appear in more than one report:\n  a (", summary)
+            self.assertEqual(len(merged.read_text().splitlines()), 4)
+
+            # without the duplicate or the timeout, everything passed
+            paths[0].write_text(json.dumps(records[0][0]) + "\n")
+            paths[1].write_text(json.dumps(records[1][0]) + "\n")
+            _, success = merge_reports(paths, [])
+            self.assertTrue(success)
@@ -0,0 +1,105 @@
+"""Tests for the compiler server protocol"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List, Union
+
+from .. import reference_server
+from ..server import CompilerServerPool
+
+# stand-in compiler that echoes its arguments and exits with code 3
+ECHO_COMPILER = """#!/bin/sh
+echo "$@" >&2
+exit 3
+"""
+
+# stand-in server that answers its first request, then hangs
+HANGING_SERVER = """
+import json, sys, time
+sys.stdin.readline()
+print(json.dumps({"returncode": 0}), flush=True)
+if not sys.stdin.readline():
+    sys.exit()
+print("stuck!", file=sys.stderr, flush=True)
+time.sleep(60)
+"""
+
+
+class CompilerServerPoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.compiler = Path(self.tmpdir.name) / "cc"
+        self.compiler.write_text(ECHO_COMPILER)
+        self.compiler.chmod(0o755)
+        self.source = Path(self.tmpdir.name) / "foo.c"
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_reference_server(self) -> None:
+        """The reference server gives the same result as invoking the compiler directly"""
+        pool = CompilerServerPool(
+            [sys.executable, reference_server.__file__, self.compiler]
+        )
+        try:
+            for opt in ["--lex", "-S"]:
+                args: List[Union[str, Path]] = [
+                    self.compiler,
+                    "--fold-constants",
+                    opt,
+                    self.source,
+                ]
+                result = pool.compile(args, self.source, None, None)
+                assert result is not None  # placate mypy
+                self.assertEqual(result.args, args)
+                self.assertEqual(result.returncode, 3)
+                self.assertEqual(
+                    result.stderr, f"--fold-constants {opt} {self.source}\n"
+                )
+            # both requests went to the same server
+            self.assertEqual(len(pool.servers), 1)
+            self.assertEqual(pool.servers[0].handled, 2)
+        finally:
+            pool.close()
+
+    def test_unsupported(self) -> None:
+        """Fall back to separate processes if the compiler doesn't support server mode"""
+        pool = CompilerServerPool([self.compiler, "--server"])
+        try:
+            args: List[Union[str, Path]] = [self.compiler, "--lex", self.source]
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                self.assertIsNone(pool.compile(args, self.source, "lex", None))
+            self.assertFalse(pool.supported)
+            # show what the compiler printed when we tried to start the server
+            self.assertIn("--server", stderr.getvalue().splitlines()[-1])
+            # don't try to start another server
+            self.assertIsNone(pool.compile(args, self.source, "lex", None))
+            self.assertEqual(len(pool.servers), 1)
+        finally:
+            pool.close()
+
+    def test_timeout(self) -> None:
+        """Kill a server that doesn't reply in time, and start a new one"""
+        pool = CompilerServerPool([sys.executable, "-c", HANGING_SERVER])
+        try:
+            args: List[Union[str, Path]] = [self.compiler, "-S", self.source]
+            result = pool.compile(args, self.source, None, None, timeout=10.0)
+            assert result is not None  # placate mypy
+            self.assertEqual(result.returncode, 0)
+            with self.assertRaises(subprocess.TimeoutExpired) as cm:
+                pool.compile(args, self.source, None, None, timeout=0.5)
+            self.assertEqual(cm.exception.stderr, "stuck!\n")
+            self.assertIsNotNone(pool.servers[0].proc.poll())
+            # the next request goes to a new server
+            self.assertIsNotNone(pool.compile(args, self.source, None, None, 10.0))
+            self.assertEqual(len(pool.servers), 2)
+        finally:
+            pool.close()
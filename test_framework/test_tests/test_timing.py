@@ -0,0 +1,181 @@
+"""Tests for timeouts and resource limits on test subprocesses"""
+
+from __future__ import annotations
+
+import io
+import signal
+import subprocess
+import sys
+import unittest
+from typing import List, Optional
+
+from ..report import ReportingResult
+from ..timing import (
+    RESOURCE_EXCEEDED,
+    RUN,
+    TIMEOUT,
+    LimitExceeded,
+    Phase,
+    ResourceLimits,
+    run_phase,
+    run_with_rusage,
+)
+
+SLEEP = [sys.executable, "-c", "import time; time.sleep(30)"]
+BUSY_LOOP = [sys.executable, "-c", "while True: pass"]
+ALLOCATE = [sys.executable, "-c", "x = bytearray(2**30)"]
+ALLOCATE_64_MB = [sys.executable, "-c", "x = bytearray(64 * 2**20)"]
+
+
+class TimingTest(unittest.TestCase):
+    def test_timeout(self) -> None:
+        """Kill a phase that runs too long, but still record it"""
+        phases: List[Phase] = []
+        with self.assertRaises(LimitExceeded) as cm:
+            run_phase(RUN, SLEEP, phases, timeout=0.5)
+        self.assertEqual(cm.exception.outcome, TIMEOUT)
+        self.assertIn("timed out after 0.5 seconds", str(cm.exception))
+        self.assertEqual(len(phases), 1)
+        self.assertLess(phases[0].returncode, 0)
+
+    def test_timeout_output(self) -> None:
+        """Keep whatever a phase printed before we killed it"""
+        phases: List[Phase] = []
+        script = "import sys, time; print('started', flush=True); time.sleep(30)"
+        with self.assertRaises(LimitExceeded):
+            run_phase(RUN, [sys.executable, "-c", script], phases, timeout=0.5)
+        self.assertEqual(phases[0].stdout, "started\n")
+
+    def test_returncode(self) -> None:
+        """Get the same returncode and output as subprocess.run"""
+        scripts = [
+            "import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)",
+            "import os, signal; os.kill(os.getpid(), signal.SIGTERM)",
+        ]
+        for script in scripts:
+            with self.subTest(script=script):
+                args = [sys.executable, "-c", script]
+                proc, _ = run_with_rusage(args)
+                expected = subprocess.run(
+                    args, capture_output=True, text=True, check=False
+                )
+                self.assertEqual(proc.returncode, expected.returncode)
+                self.assertEqual(proc.stdout, expected.stdout)
+                self.assertEqual(proc.stderr, expected.stderr)
+
+    @unittest.skipIf(sys.platform == "win32", "setrlimit isn't available on Windows")
+    def test_cpu_limit(self) -> None:
+        with self.assertRaises(LimitExceeded) as cm:
+            run_phase(RUN, BUSY_LOOP, None, limits=ResourceLimits(cpu_time=1))
+        self.assertEqual(cm.exception.outcome, RESOURCE_EXCEEDED)
+        self.assertIn("CPU time limit of 1 seconds", str(cm.exception))
+
+    @unittest.skipIf(sys.platform == "win32", "setrlimit isn't available on Windows")
+    def test_memory_limit(self) -> None:
+        # Python raises MemoryError when the allocation fails
+        with self.assertRaises(LimitExceeded) as cm:
+            run_phase(RUN, ALLOCATE, None, limits=ResourceLimits(memory=256 * 2**20))
+        self.assertEqual(cm.exception.outcome, RESOURCE_EXCEEDED)
+        self.assertIn("memory limit of 256 MB", str(cm.exception))
+
+    @unittest.skipIf(sys.platform == "win32", "wait4 isn't available on Windows")
+    def test_max_rss(self) -> None:
+        """Record each phase's peak RSS, and fail it if it's over the limit"""
+        phases: List[Phase] = []
+        with self.assertRaises(LimitExceeded) as cm:
+            run_phase(
+                RUN,
+                ALLOCATE_64_MB,
+                phases,
+                limits=ResourceLimits(max_rss=32 * 2**20),
+            )
+        self.assertEqual(cm.exception.outcome, RESOURCE_EXCEEDED)
+        self.assertIn("over the limit of 32 MB", str(cm.exception))
+        max_rss = phases[0].max_rss
+        assert max_rss is not None  # placate mypy
+        self.assertGreater(max_rss, 64 * 2**20)
+
+    @unittest.skipIf(sys.platform == "win32", "setrlimit isn't available on Windows")
+    def test_cpu_limit_killed(self) -> None:
+        """Blame the CPU time limit for a process that ignores SIGXCPU and gets killed,
+        based on the CPU time wait4 reports"""
+        script = (
+            "import signal; signal.signal(signal.SIGXCPU, signal.SIG_IGN)\n"
+            "while True: pass"
+        )
+        phases: List[Phase] = []
+        with self.assertRaises(LimitExceeded) as cm:
+            run_phase(
+                RUN,
+                [sys.executable, "-c", script],
+                phases,
+                limits=ResourceLimits(cpu_time=1),
+            )
+        self.assertIn("CPU time limit of 1 seconds", str(cm.exception))
+        self.assertEqual(phases[0].returncode, -signal.SIGKILL)
+        cpu_time = phases[0].cpu_time
+        assert cpu_time is not None  # placate mypy
+        self.assertGreaterEqual(cpu_time, 1.9)
+
+    @unittest.skipIf(sys.platform == "win32", "wait4 isn't available on Windows")
+    def test_max_rss_per_process(self) -> None:
+        """Measure each process's own peak RSS, not the largest of all our children's"""
+        limits = ResourceLimits(max_rss=32 * 2**20)
+        with self.assertRaises(LimitExceeded):
+            run_phase(RUN, ALLOCATE_64_MB, None, limits=limits)
+        # a small process that runs after the big one is still within the limit
+        phases: List[Phase] = []
+        run_phase(RUN, [sys.executable, "-c", "pass"], phases, limits=limits)
+        max_rss = phases[0].max_rss
+        assert max_rss is not None  # placate mypy
+        self.assertLess(max_rss, 32 * 2**20)
+
+    @unittest.skipIf(sys.platform == "win32", "setrlimit isn't available on Windows")
+    def test_exceeded(self) -> None:
+        """Only blame a limit when there's evidence the process hit it"""
+        limits = ResourceLimits(memory=256 * 2**20, cpu_time=2)
+
+        def exceeded(
+            returncode: int, stderr: str = "", cpu_time: float = 0.1
+        ) -> Optional[str]:
+            proc = subprocess.CompletedProcess(["prog"], returncode, "", stderr)
+            return limits.exceeded(proc, cpu_time=cpu_time)
+
+        self.assertIn("CPU time limit", exceeded(-signal.SIGXCPU) or "")
+        self.assertIn("CPU time limit", exceeded(-signal.SIGKILL, cpu_time=3.0) or "")
+        self.assertIn("memory limit", exceeded(1, "MemoryError") or "")
+        self.assertIn("memory limit", exceeded(-signal.SIGABRT, "std::bad_alloc") or "")
+        # ordinary crashes and failures
+        self.assertIsNone(exceeded(-signal.SIGKILL))
+        self.assertIsNone(exceeded(-signal.SIGSEGV))
+        self.assertIsNone(exceeded(1, "error: invalid memory operand"))
+        self.assertIsNone(exceeded(0, "warning: out of memory, retrying"))
+
+    def test_within_limits(self) -> None:
+        proc = run_phase(
+            RUN,
+            [sys.executable, "-c", "print('hi')"],
+            None,
+            timeout=30,
+            limits=ResourceLimits(memory=2**30, cpu_time=30),
+        )
+        self.assertEqual(proc.stdout, "hi\n")
+
+
+class Dummies:
+    """Dummy tests to report on.
+    (Nested in another class so the test loader doesn't discover them.)"""
+
+    class Hangs(unittest.TestCase):
+        def test_hang(self) -> None:
+            run_phase(RUN, SLEEP, None, timeout=0.1)
+
+
+class ReportTimeoutTest(unittest.TestCase):
+    def test_outcome(self) -> None:
+        """Report tests that time out as "timeout" rather than "fail" """
+        result = ReportingResult(io.StringIO(), True, 0, reporters=[])
+        unittest.defaultTestLoader.loadTestsFromTestCase(Dummies.Hangs).run(result)
+        self.assertEqual(len(result.failures), 1)
+        self.assertEqual(result.outcome, TIMEOUT)
+        self.assertIn("timed out", result.message or "")
@@ -6,7 +6,7 @@ import io
 import unittest
 from typing import List
 
-from ..parser import tokenize
+from ..parser import bench, tokenize
 from ..parser.tokenize import Token, TokType
 
 newline = Token(TokType.NEWLINE, "\n")
@@ -206,3 +206,23 @@ main:
             newline,
         ]
         self.assertListEqual(actual_tokens, expected_tokens)
+
+    def test_whole_file(self) -> None:
+        """Tokenizing a whole file gives the same tokens as tokenizing each line"""
+        asm = bench.synthetic_assembly(10_000) + "    ret # no newline at end"
+        actual_tokens = list(tokenize.tokenize(io.StringIO(asm)))
+        expected_tokens = [
+            tok
+            for line in asm.splitlines(keepends=True)
+            for tok in tokenize.tokenize(io.StringIO(line))
+        ]
+        self.assertListEqual(actual_tokens, expected_tokens)
+        self.assertEqual(actual_tokens[-1], sym("ret"))
+
+    def test_shared_punctuation(self) -> None:
+        """Every single-character token of the same type is the same object"""
+        tokens = list(tokenize.tokenize(io.StringIO("(%rax,%rbx)\n(%rcx,%rdx)\n")))
+        self.assertIs(tokens[0], tokens[8])
+        self.assertIs(tokens[3], tokens[11])
+        self.assertIs(tokens[7], tokens[15])
+        self.assertEqual(tokens[3], Token(TokType.COMMA, ","))
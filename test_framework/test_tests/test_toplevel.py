@@ -25,6 +25,7 @@ from ..basic import (
     TEST_DIR,
     excluded_extra_credit,
     ExtraCredit,
+    TestDirs,
     build_test_class,
 )
 from ..tacky.dead_store_elim import STORE_ELIMINATED
@@ -62,9 +63,12 @@ def get_expected_test_count(
     """
 
     def should_include(f: Path) -> bool:
-        """Include a test file if it's not an extra-credit test or in any of excluded_dirs"""
+        """Include a test file if it's not an extra-credit test, a benchmark program
+        (we only run those with --benchmark-run), or in any of excluded_dirs"""
         if any(excluded in f.parts for excluded in excluded_dirs):
             return False
+        if TestDirs.BENCHMARKS in f.relative_to(TEST_DIR).parts:
+            return False
         return not excluded_extra_credit(f, ExtraCredit.NONE)
 
     count = 0
@@ -118,6 +122,19 @@ class TopLevelTest(unittest.TestCase):
                 f"--check-setup option failed.\nstderr:\n{err.stderr}\nstdout:\n{err.stdout}"
             )
 
+    def test_merge_reports_without_chapter(self) -> None:
+        """Options that only matter when running tests don't need --chapter"""
+        with tempfile.TemporaryDirectory() as tmp:
+            report = Path(tmp) / "report.jsonl"
+            report.write_text('{"id": "a.test_b", "outcome": "pass"}\n')
+            try:
+                merged = run_test_script(
+                    f"./test_compiler --merge-reports {report} --stage lex --int-only"
+                )
+            except subprocess.CalledProcessError as err:
+                self.fail(f"Test command failed with message {err.stderr}")
+        self.assertIn("Merged 1 test results", merged.stdout)
+
     def test_one_chapter(self) -> None:
         """We can run tests for a single chapter with --latest-only"""
         expected_test_count = get_expected_test_count(chapters=[2])
@@ -129,6 +146,17 @@ class TopLevelTest(unittest.TestCase):
         actual_test_count = get_test_count(testrun)
         self.assertEqual(expected_test_count, actual_test_count)
 
+    def test_parallel(self) -> None:
+        """Running tests in parallel with --jobs runs the same number of tests"""
+        expected_test_count = get_expected_test_count(chapters=[1, 2, 3])
+        try:
+            testrun = run_test_script("./test_compiler $NQCC --chapter 3 --jobs 4")
+        except subprocess.CalledProcessError as err:
+            self.fail(f"Test command failed with message {err.stderr}")
+
+        actual_test_count = get_test_count(testrun)
+        self.assertEqual(expected_test_count, actual_test_count)
+
     def test_multiple_chapters_intermediate(self) -> None:
         """We can test through an intermediate stage through multiple chapters"""
         expected_test_count = len(list((TEST_DIR / "chapter_1").rglob("*.c"))) + len(
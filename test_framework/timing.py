@@ -0,0 +1,398 @@
+"""Run the subprocesses that make up each test, and record how long each one took"""
+
+from __future__ import annotations
+
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, List, Optional, Sequence, Tuple, Union
+
+# setrlimit isn't available on Windows. We import it here rather than in
+# ResourceLimits.apply, which runs in the child process between fork and exec,
+# where importing a module isn't safe while other threads may hold the import lock.
+if sys.platform == "win32":
+    resource = None
+else:
+    import resource
+
+# Names of the phases of a test
+COMPILE = "compile"  # run the compiler under test
+LINK = "link"  # assemble and link with gcc
+RUN = "run"  # run the compiled program
+
+# Test outcomes (in reports) when a phase exceeds one of its limits
+TIMEOUT = "timeout"
+RESOURCE_EXCEEDED = "resource_exceeded"
+
+# Error messages that suggest a process ran out of memory (e.g. Python's MemoryError,
+# C++'s std::bad_alloc, Rust's "memory allocation of N bytes failed", strerror(ENOMEM),
+# and GCC's "virtual memory exhausted")
+OUT_OF_MEMORY_PATTERN = re.compile(
+    r"out of memory|cannot allocate|memory exhausted|MemoryError|bad_alloc"
+    r"|memory allocation of \d+ bytes failed",
+    re.IGNORECASE,
+)
+
+# How close to its CPU time limit a process killed by a signal needs to get before we
+# blame the limit, in seconds (the kernel only checks RLIMIT_CPU periodically,
+# so its accounting and the usage reported by wait4 can differ slightly)
+CPU_TIME_SLACK = 0.1
+
+
+@dataclass
+class Phase:
+    """Result of one subprocess in a test"""
+
+    name: str
+    args: List[str]
+    returncode: int
+    stdout: str
+    stderr: str
+    # elapsed wall-clock time, in seconds; None if we didn't run this phase on its own
+    # (e.g. compiling a batch of programs at once)
+    wall_time: Optional[float]
+    # user + system CPU time, in seconds, of the process and any children it waited for
+    # (e.g. the assembler and linker when the compiler driver invokes them);
+    # None if we couldn't measure it (e.g. the compiler ran in server mode)
+    cpu_time: Optional[float] = None
+    # peak resident set size, in bytes, of the process or the largest child it waited for;
+    # None if we couldn't measure it
+    max_rss: Optional[int] = None
+
+
+class LimitExceeded(AssertionError):
+    """A phase of a test took too long or used too many resources.
+
+    This is an AssertionError so the test counts as a failure rather than an error.
+    """
+
+    def __init__(self, outcome: str, message: str) -> None:
+        super().__init__(message)
+        # TIMEOUT or RESOURCE_EXCEEDED
+        self.outcome = outcome
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    """Limits on the resources a subprocess can use, applied with setrlimit"""
+
+    # maximum size of the process's virtual memory, in bytes (RLIMIT_AS)
+    memory: Optional[int] = None
+    # maximum CPU time, in seconds (RLIMIT_CPU); the process gets SIGXCPU when it runs out
+    cpu_time: Optional[int] = None
+    # maximum peak resident set size, in bytes. The OS doesn't enforce this
+    # (Linux ignores RLIMIT_RSS), so we check it after the process exits.
+    max_rss: Optional[int] = None
+
+    def apply(self) -> None:
+        """Set the limits for the current process.
+
+        Used as preexec_fn, so it runs in the child process between fork and exec.
+        It only makes system calls, which is safe even though other threads
+        may hold locks in the parent process.
+        """
+        if self.memory is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (self.memory, self.memory))
+        if self.cpu_time is not None:
+            # the soft limit sends SIGXCPU; the hard limit, one second later, sends SIGKILL
+            resource.setrlimit(
+                resource.RLIMIT_CPU, (self.cpu_time, self.cpu_time + 1)
+            )
+
+    def exceeded(
+        self,
+        proc: subprocess.CompletedProcess[str],
+        max_rss: Optional[int] = None,
+        cpu_time: Optional[float] = None,
+    ) -> Optional[str]:
+        """Check whether a process that ran under these limits was stopped by one of them,
+        or used more memory than we allow
+
+        We only blame a limit when there's evidence the process hit it, so ordinary
+        crashes are still reported as ordinary failures:
+        - CPU time: the process got SIGXCPU, or it was killed by a signal after using
+          (about) all of its CPU time.
+        - Memory: once a process hits RLIMIT_AS, allocations fail, and most programs then
+          crash or exit with an error message, so we look for an abnormal exit along
+          with an out-of-memory error message.
+
+        Args:
+            proc: the finished process
+            max_rss: its peak resident set size in bytes, if known
+            cpu_time: the user + system CPU time it used in seconds, if known
+
+        Returns:
+            a description of the limit it exceeded, or None if it didn't exceed any limit
+        """
+        if self.cpu_time is not None and (
+            proc.returncode == -signal.SIGXCPU
+            or (
+                proc.returncode < 0
+                and cpu_time is not None
+                and cpu_time >= self.cpu_time - CPU_TIME_SLACK
+            )
+        ):
+            return f"exceeded CPU time limit of {self.cpu_time} seconds"
+        if (
+            self.memory is not None
+            and proc.returncode != 0
+            and OUT_OF_MEMORY_PATTERN.search(proc.stderr or "")
+        ):
+            return f"probably exceeded memory limit of {self.memory // 2**20} MB"
+        if self.max_rss is not None and max_rss is not None and max_rss > self.max_rss:
+            return (
+                f"used {max_rss / 2**20:.1f} MB of memory (peak RSS), "
+                f"over the limit of {self.max_rss // 2**20} MB"
+            )
+        return None
+
+
+def get_max_rss(rusage: Any) -> int:
+    """Get the peak resident set size from a resource.struct_rusage, in bytes"""
+    if sys.platform == "darwin":
+        # macOS reports it in bytes
+        return int(rusage.ru_maxrss)
+    # Linux (and the BSDs) report it in kilobytes
+    return int(rusage.ru_maxrss) * 1024
+
+
+def exit_code(status: int) -> int:
+    """Convert a wait status from os.wait4 to a returncode, the way subprocess does:
+    the exit status if the process exited normally, or -N if it was killed by signal N
+    (os.waitstatus_to_exitcode does this, but it's not available in Python 3.8)"""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def read_output(stream: IO[str], output: List[str]) -> None:
+    """Read a stream until EOF and append its contents to output (runs in its own thread)"""
+    output.append(stream.read())
+
+
+def wait_with_rusage(proc: subprocess.Popen[str], deadline: Optional[float]) -> Any:
+    """Reap a child process with os.wait4, which gives us its resource usage,
+    and set proc.returncode so subprocess knows it has exited.
+
+    We can't let subprocess reap it, since it uses os.waitpid, which throws away the
+    resource usage. resource.getrusage(RUSAGE_CHILDREN) wouldn't work either, since
+    it's shared by every child of this process, including other tests running in parallel.
+
+    Args:
+        proc: the child process
+        deadline: time.monotonic() value to give up at, or None to wait indefinitely
+
+    Returns:
+        the child's resource.struct_rusage
+
+    Raises:
+        subprocess.TimeoutExpired if the process is still running at the deadline
+    """
+    if deadline is None:
+        _, status, rusage = os.wait4(proc.pid, 0)
+    else:
+        # like Popen.wait with a timeout: poll, backing off up to 50 ms between attempts
+        delay = 0.0005
+        while True:
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+            if pid == proc.pid:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(proc.args, 0)
+            delay = min(delay * 2, remaining, 0.05)
+            time.sleep(delay)
+    proc.returncode = exit_code(status)
+    return rusage
+
+
+def run_with_rusage(
+    args: Sequence[Union[str, Path]],
+    timeout: Optional[float] = None,
+    **kwargs: Any,
+) -> Tuple[subprocess.CompletedProcess[str], Optional[Any]]:
+    """Like subprocess.run(args, capture_output=True, text=True, check=False),
+    but also return the process's resource usage (or None if it's not available)"""
+    if not hasattr(os, "wait4"):  # not available on Windows
+        completed = subprocess.run(
+            args, capture_output=True, text=True, check=False, timeout=timeout, **kwargs
+        )
+        return completed, None
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        **kwargs,
+    ) as proc:
+        # Popen.communicate would reap the child itself, so we read its output in
+        # separate threads (as communicate does on Windows) and then reap it with wait4
+        stdout: List[str] = []
+        stderr: List[str] = []
+        readers = [
+            threading.Thread(target=read_output, args=(stream, output), daemon=True)
+            for (stream, output) in [(proc.stdout, stdout), (proc.stderr, stderr)]
+        ]
+        for reader in readers:
+            reader.start()
+        try:
+            # wait for the process to close its output (usually on exit), then reap it
+            for reader in readers:
+                reader.join(None if deadline is None else deadline - time.monotonic())
+                if reader.is_alive():
+                    raise subprocess.TimeoutExpired(proc.args, 0)
+            rusage = wait_with_rusage(proc, deadline)
+        except subprocess.TimeoutExpired:
+            # same as subprocess.run: kill it, and report whatever output it produced
+            proc.kill()
+            for reader in readers:
+                reader.join()
+            raise subprocess.TimeoutExpired(
+                proc.args, timeout or 0, "".join(stdout), "".join(stderr)
+            ) from None
+        except:  # including KeyboardInterrupt
+            proc.kill()
+            for reader in readers:
+                reader.join()
+            raise
+    completed = subprocess.CompletedProcess(
+        proc.args, proc.returncode, "".join(stdout), "".join(stderr)
+    )
+    return completed, rusage
+
+
+def output_text(output: Union[str, bytes, None]) -> str:
+    """Get a process's captured output as text
+
+    TimeoutExpired declares its output as bytes, but run_with_rusage
+    captures it as text, so this just placates mypy (and handles None).
+    """
+    if isinstance(output, bytes):
+        return output.decode(errors="replace")
+    return output or ""
+
+
+def record_phase(
+    name: str,
+    proc: subprocess.CompletedProcess[str],
+    phases: Optional[List[Phase]],
+    wall_time: Optional[float] = None,
+    cpu_time: Optional[float] = None,
+    max_rss: Optional[int] = None,
+) -> None:
+    """Add the result of a subprocess to a test's list of phases
+
+    Args:
+        name: which phase this is (COMPILE, LINK, or RUN)
+        proc: the result of this phase
+        phases: list to add it to; if None, don't record anything
+        wall_time: how long it took, if known
+        cpu_time: how much CPU time it used, if known
+        max_rss: its peak resident set size in bytes, if known
+    """
+    if phases is None:
+        return
+    args = proc.args if isinstance(proc.args, list) else [proc.args]
+    phases.append(
+        Phase(
+            name=name,
+            args=[str(a) for a in args],
+            returncode=proc.returncode,
+            stdout=proc.stdout or "",
+            stderr=proc.stderr or "",
+            wall_time=wall_time,
+            cpu_time=cpu_time,
+            max_rss=max_rss,
+        )
+    )
+
+
+def timed_out(
+    name: str,
+    args: Sequence[Union[str, Path]],
+    exc: subprocess.TimeoutExpired,
+    phases: Optional[List[Phase]],
+    wall_time: float,
+) -> LimitExceeded:
+    """Record a phase that we killed because it ran for too long
+
+    Args:
+        name: which phase this is (COMPILE, LINK, or RUN)
+        args: the command we ran (or sent to a compiler server)
+        exc: the exception we got when it timed out
+        phases: list of phases to add the result to; if None, don't record anything
+        wall_time: how long we waited before killing it
+
+    Returns:
+        an exception to raise
+    """
+    killed = subprocess.CompletedProcess(
+        list(args),
+        -signal.SIGKILL,
+        output_text(exc.stdout),
+        output_text(exc.stderr),
+    )
+    record_phase(name, killed, phases, wall_time)
+    command = " ".join(str(a) for a in args)
+    return LimitExceeded(
+        TIMEOUT, f"{name} timed out after {exc.timeout} seconds: {command}"
+    )
+
+
+def run_phase(
+    name: str,
+    args: Sequence[Union[str, Path]],
+    phases: Optional[List[Phase]],
+    check: bool = False,
+    timeout: Optional[float] = None,
+    limits: Optional[ResourceLimits] = None,
+    **kwargs: Any,
+) -> subprocess.CompletedProcess[str]:
+    """Run one phase of a test in a subprocess, capturing its output, and record the result.
+
+    Args:
+        name: which phase this is (COMPILE, LINK, or RUN)
+        args: command to run
+        phases: list of phases to add the result to; if None, don't record anything
+        check: raise CalledProcessError if the command fails
+        timeout (optional): kill the command if it runs for longer than this many seconds
+        limits (optional): resource limits to run the command under
+        **kwargs: other arguments to subprocess.Popen
+            (output is always captured as text)
+
+    Returns:
+        the result of running the command
+
+    Raises:
+        LimitExceeded if the command timed out or exceeded one of its resource limits
+    """
+    if limits is not None:
+        kwargs["preexec_fn"] = limits.apply
+    command = " ".join(str(a) for a in args)
+    start = time.perf_counter()
+    try:
+        proc, rusage = run_with_rusage(args, timeout=timeout, **kwargs)
+    except subprocess.TimeoutExpired as exc:
+        raise timed_out(name, args, exc, phases, time.perf_counter() - start) from exc
+    wall_time = time.perf_counter() - start
+    cpu_time = None if rusage is None else rusage.ru_utime + rusage.ru_stime
+    max_rss = None if rusage is None else get_max_rss(rusage)
+    record_phase(name, proc, phases, wall_time, cpu_time, max_rss)
+    if limits is not None:
+        problem = limits.exceeded(proc, max_rss, cpu_time)
+        if problem is not None:
+            raise LimitExceeded(
+                RESOURCE_EXCEEDED,
+                f"{name} {problem}: {command}\n{proc.stderr or ''}",
+            )
+    if check:
+        proc.check_returncode()
+    return proc
@@ -0,0 +1,27 @@
+/* Benchmark: generate ten million pseudorandom numbers with the
+ * Park-Miller "minimal standard" generator, using long arithmetic
+ * so the intermediate products don't overflow */
+
+long next(long seed) {
+    return seed * 48271l % 2147483647l;
+}
+
+int main(void) {
+    long seed = 1l;
+    long sum = 0l;
+    long max = 0l;
+    for (int i = 0; i < 10000000; i = i + 1) {
+        seed = next(seed);
+        sum = sum + seed;
+        if (seed > max)
+            max = seed;
+    }
+
+    if (seed != 893153735l)
+        return 1;
+    if (sum != 10733765480732131l)
+        return 2;
+    if (max != 2147483605l)
+        return 3;
+    return 0;
+}
@@ -0,0 +1,23 @@
+/* Benchmark: compute a polynomial rolling hash over a long sequence of values.
+ * Unsigned arithmetic wraps around, so the hash is well-defined even though
+ * it overflows constantly. */
+
+unsigned int hash_step(unsigned int hash, unsigned int value) {
+    return hash * 31u + value;
+}
+
+int main(void) {
+    unsigned int hash = 0u;
+    unsigned long wide_hash = 0ul;
+    for (unsigned int i = 0u; i < 20000000u; i = i + 1u) {
+        unsigned int value = i % 251u;
+        hash = hash_step(hash, value);
+        wide_hash = wide_hash * 1000003ul + value;
+    }
+
+    if (hash != 2942961253u)
+        return 1;
+    if (wide_hash != 11405298128336831357ul)
+        return 2;
+    return 0;
+}
@@ -0,0 +1,36 @@
+/* Benchmark: approximate pi by integrating 4 / (1 + x^2) from 0 to 1
+ * with the midpoint rule, then refine square roots with Newton's method */
+
+double integrate(int intervals) {
+    double width = 1.0 / intervals;
+    double sum = 0.0;
+    for (int i = 0; i < intervals; i = i + 1) {
+        double x = (i + 0.5) * width;
+        sum = sum + 4.0 / (1.0 + x * x);
+    }
+    return sum * width;
+}
+
+double newton_sqrt(double x) {
+    double guess = x;
+    for (int i = 0; i < 40; i = i + 1) {
+        guess = (guess + x / guess) / 2.0;
+    }
+    return guess;
+}
+
+int main(void) {
+    double pi = integrate(5000000);
+    double error = pi - 3.141592653589793;
+    if (error < -1e-9 || error > 1e-9)
+        return 1;
+
+    double sum_of_roots = 0.0;
+    for (int i = 1; i <= 100000; i = i + 1) {
+        sum_of_roots = sum_of_roots + newton_sqrt(i);
+    }
+    error = sum_of_roots - 21082008.973917928;
+    if (error < -1e-3 || error > 1e-3)
+        return 2;
+    return 0;
+}
@@ -0,0 +1,40 @@
+/* Benchmark: multiply two 200x200 integer matrices,
+ * indexing into multi-dimensional arrays in the innermost loop */
+
+int a[200][200];
+int b[200][200];
+int product[200][200];
+
+int main(void) {
+    for (int i = 0; i < 200; i = i + 1) {
+        for (int j = 0; j < 200; j = j + 1) {
+            a[i][j] = (7 * i + 3 * j) % 11 - 5;
+            b[i][j] = (i * i + j) % 13 - 6;
+        }
+    }
+
+    for (int i = 0; i < 200; i = i + 1) {
+        for (int j = 0; j < 200; j = j + 1) {
+            int sum = 0;
+            for (int k = 0; k < 200; k = k + 1) {
+                sum = sum + a[i][k] * b[k][j];
+            }
+            product[i][j] = sum;
+        }
+    }
+
+    long checksum = 0;
+    long trace = 0;
+    for (int i = 0; i < 200; i = i + 1) {
+        trace = trace + product[i][i];
+        for (int j = 0; j < 200; j = j + 1) {
+            checksum = checksum + product[i][j] * (i * 200 + j);
+        }
+    }
+
+    if (checksum != -2490348)
+        return 1;
+    if (trace != -76)
+        return 2;
+    return 0;
+}
@@ -0,0 +1,29 @@
+/* Benchmark: find the primes below two million with the sieve of Eratosthenes,
+ * several times over, streaming through a large static array */
+
+int composite[2000000];
+
+int count_primes(int limit) {
+    for (int i = 0; i < limit; i = i + 1) {
+        composite[i] = 0;
+    }
+    int count = 0;
+    for (int i = 2; i < limit; i = i + 1) {
+        if (!composite[i]) {
+            count = count + 1;
+            for (long multiple = (long)i * i; multiple < limit;
+                 multiple = multiple + i) {
+                composite[multiple] = 1;
+            }
+        }
+    }
+    return count;
+}
+
+int main(void) {
+    for (int round = 0; round < 3; round = round + 1) {
+        if (count_primes(2000000) != 148933)
+            return round + 1;
+    }
+    return 0;
+}
@@ -0,0 +1,30 @@
+/* Benchmark: follow a cycle of pointers through a large heap-allocated array.
+ * Consecutive cells in the cycle are far apart, so nearly every load misses the cache. */
+
+void *calloc(unsigned long nmemb, unsigned long size);
+void free(void *ptr);
+
+int main(void) {
+    int cell_count = 1048576;  // 2^20 cells
+    int stride = 479001;       // odd, so the cycle visits every cell
+    void **cells = calloc(cell_count, sizeof(void *));
+    if (!cells)
+        return 1;
+
+    // cells[i] points to cells[(i + stride) % cell_count]
+    for (int i = 0; i < cell_count; i = i + 1) {
+        cells[i] = &cells[(i + stride) % cell_count];
+    }
+
+    void **current = cells;
+    for (int step = 0; step < 2000000; step = step + 1) {
+        current = (void **)*current;
+    }
+
+    // after n steps we should be at cell (n * stride) % cell_count
+    long position = current - cells;
+    free(cells);
+    if (position != 2000000l * stride % cell_count)
+        return 2;
+    return 0;
+}
@@ -0,0 +1,95 @@
+/* Benchmark: build a binary search tree out of heap-allocated nodes,
+ * then search it and traverse it recursively */
+
+void *malloc(unsigned long size);
+void free(void *ptr);
+
+struct node {
+    long key;
+    struct node *left;
+    struct node *right;
+};
+
+struct node *insert(struct node *root, long key) {
+    struct node *new_node = malloc(sizeof(struct node));
+    new_node->key = key;
+    new_node->left = 0;
+    new_node->right = 0;
+    if (!root)
+        return new_node;
+
+    struct node *parent = root;
+    while (1) {
+        if (key < parent->key) {
+            if (!parent->left) {
+                parent->left = new_node;
+                return root;
+            }
+            parent = parent->left;
+        } else {
+            if (!parent->right) {
+                parent->right = new_node;
+                return root;
+            }
+            parent = parent->right;
+        }
+    }
+}
+
+int contains(struct node *root, long key) {
+    while (root) {
+        if (key == root->key)
+            return 1;
+        root = key < root->key ? root->left : root->right;
+    }
+    return 0;
+}
+
+long sum_keys(struct node *root) {
+    if (!root)
+        return 0;
+    return root->key + sum_keys(root->left) + sum_keys(root->right);
+}
+
+int height(struct node *root) {
+    if (!root)
+        return 0;
+    int left = height(root->left);
+    int right = height(root->right);
+    return 1 + (left > right ? left : right);
+}
+
+void free_tree(struct node *root) {
+    if (root) {
+        free_tree(root->left);
+        free_tree(root->right);
+        free(root);
+    }
+}
+
+int main(void) {
+    struct node *root = 0;
+    long seed = 12345l;
+    for (int i = 0; i < 200000; i = i + 1) {
+        seed = seed * 48271l % 2147483647l;
+        root = insert(root, seed % 1000000l);
+    }
+
+    // look up every key in [0, 1000000)
+    int found = 0;
+    for (long key = 0l; key < 1000000l; key = key + 1l) {
+        found = found + contains(root, key);
+    }
+
+    long sum = sum_keys(root);
+    int tree_height = height(root);
+    free_tree(root);
+
+    if (found != 181054)
+        return 1;
+    if (sum != 100101983089l)
+        return 2;
+    if (tree_height != 50)
+        return 3;
+    return 0;
+}
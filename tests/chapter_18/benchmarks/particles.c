@@ -0,0 +1,60 @@
+/* Benchmark: simulate particles bouncing around a box,
+ * updating an array of structures on every time step */
+
+struct vector {
+    double x;
+    double y;
+};
+
+struct particle {
+    struct vector position;
+    struct vector velocity;
+    long bounces;
+};
+
+struct particle particles[1000];
+
+void step(struct particle *p, double dt) {
+    p->position.x = p->position.x + p->velocity.x * dt;
+    p->position.y = p->position.y + p->velocity.y * dt;
+    if (p->position.x < 0.0 || p->position.x > 100.0) {
+        p->velocity.x = -p->velocity.x;
+        p->bounces = p->bounces + 1;
+    }
+    if (p->position.y < 0.0 || p->position.y > 100.0) {
+        p->velocity.y = -p->velocity.y;
+        p->bounces = p->bounces + 1;
+    }
+}
+
+int main(void) {
+    for (int i = 0; i < 1000; i = i + 1) {
+        struct particle *p = &particles[i];
+        p->position.x = (i % 97) + 1.5;
+        p->position.y = (i % 89) + 2.5;
+        p->velocity.x = (i % 13) - 6.25;
+        p->velocity.y = (i % 7) - 3.125;
+        p->bounces = 0;
+    }
+
+    for (int t = 0; t < 10000; t = t + 1) {
+        for (int i = 0; i < 1000; i = i + 1) {
+            step(&particles[i], 0.01);
+        }
+    }
+
+    long total_bounces = 0;
+    double energy = 0.0;
+    for (int i = 0; i < 1000; i = i + 1) {
+        struct vector v = particles[i].velocity;
+        total_bounces = total_bounces + particles[i].bounces;
+        energy = energy + 0.5 * (v.x * v.x + v.y * v.y);
+    }
+
+    if (total_bounces != 4981)
+        return 1;
+    // bouncing doesn't change speed, so energy is conserved exactly
+    if (energy != 9027.4375)
+        return 2;
+    return 0;
+}
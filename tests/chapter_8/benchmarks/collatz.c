@@ -0,0 +1,33 @@
+/* Benchmark: count the steps each starting value below 100000 takes to reach 1
+ * under the Collatz map, using nothing but loops and integer arithmetic.
+ * (Every value along these trajectories fits in an int.) */
+
+int main(void) {
+    int total_steps = 0;
+    int longest = 0;
+    int longest_start = 0;
+    for (int start = 1; start < 100000; start = start + 1) {
+        int n = start;
+        int steps = 0;
+        while (n != 1) {
+            if (n % 2 == 0)
+                n = n / 2;
+            else
+                n = 3 * n + 1;
+            steps = steps + 1;
+        }
+        total_steps = total_steps + steps;
+        if (steps > longest) {
+            longest = steps;
+            longest_start = start;
+        }
+    }
+
+    if (total_steps != 10753712)
+        return 1;
+    if (longest != 350)
+        return 2;
+    if (longest_start != 77031)
+        return 3;
+    return 0;
+}
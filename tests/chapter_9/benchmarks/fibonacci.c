@@ -0,0 +1,14 @@
+/* Benchmark: compute Fibonacci numbers with naive recursion,
+ * which makes millions of function calls */
+
+int fib(int n) {
+    if (n < 2)
+        return n;
+    return fib(n - 1) + fib(n - 2);
+}
+
+int main(void) {
+    if (fib(34) != 5702887)
+        return 1;
+    return 0;
+}